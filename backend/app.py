@@ -1,90 +1,53 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
+import hmac
+import io
+import json
+import os
 import random
 import re
 import string
 from datetime import datetime, timedelta
 from collections import Counter
+from dataclasses import replace
+from functools import wraps
+
+from availability import BLOCKING_STATUSES
+from cache import RevisionedMemo, SearchCache
+from catalog import LazyCatalog, load_catalog
+from expiry import HoldExpiryScheduler
+from metrics import Metrics, record_scan
+from models import Reservation
+from pricing import calculate_prices
+from repository import normalize_email
+from storage import create_storage, hold_expired
 
 app = Flask(__name__)
 CORS(app)
 
-# In-memory stores
-reservations = []
-room_status = {}
-estadias = []
-
-hotels = [
-    {
-        "id": 1,
-        "name": "Hotel Central",
-        "city": "Buenos Aires",
-        "rooms": [
-            {
-                "type": "Single",
-                "name": "Single",
-                "capacity": {"adults": 1, "children": 0, "babies": 0},
-                "rates": {"adult": 100.0, "child": 100.0, "baby": 0.0},
-            },
-            {
-                "type": "Doble",
-                "name": "Doble",
-                "capacity": {"adults": 2, "children": 1, "babies": 0},
-                "rates": {"adult": 150.0, "child": 75.0, "baby": 0.0},
-            },
-            {
-                "type": "Suite",
-                "name": "Suite",
-                "capacity": {"adults": 3, "children": 2, "babies": 1},
-                "rates": {"adult": 250.0, "child": 125.0, "baby": 0.0},
-            },
-        ],
-        "offers": [
-            {
-                "name": "Niños gratis temporada baja",
-                "description": "Niños gratis en temporada baja",
-                "start": "01/05/2025",
-                "end": "31/08/2025",
-                "children_discount": 1.0,
-            }
-        ],
-    },
-    {
-        "id": 2,
-        "name": "Hotel Playa",
-        "city": "Mar del Plata",
-        "rooms": [
-            {
-                "type": "Single",
-                "name": "Single",
-                "capacity": {"adults": 1, "children": 0, "babies": 0},
-                "rates": {"adult": 90.0, "child": 90.0, "baby": 0.0},
-            },
-            {
-                "type": "Doble",
-                "name": "Doble",
-                "capacity": {"adults": 2, "children": 1, "babies": 0},
-                "rates": {"adult": 140.0, "child": 70.0, "baby": 0.0},
-            },
-            {
-                "type": "Suite",
-                "name": "Suite",
-                "capacity": {"adults": 3, "children": 2, "babies": 1},
-                "rates": {"adult": 220.0, "child": 110.0, "baby": 0.0},
-            },
-        ],
-        "offers": [
-            {
-                "name": "Promo bebés con cuna",
-                "description": "Bebés con cuna sin cargo",
-                "start": "01/03/2025",
-                "end": "31/12/2025",
-                "baby_discount": 1.0,
-            }
-        ],
-    },
-]
+# Reservations, room status and stays (in-memory unless DREAMSTAY_STORAGE says otherwise).
+# Completed and cancelled reservations move to storage.archive, out of the live set.
+storage = create_storage()
+storage.archive_terminal()
+
+# Unpaid holds expire after DREAMSTAY_HOLD_TTL seconds (0 keeps them forever)
+hold_expiry = HoldExpiryScheduler(storage, ttl=float(os.environ.get("DREAMSTAY_HOLD_TTL", 1800)))
+hold_expiry.schedule_pending()
+
+# Search responses, invalidated per hotel and date range when occupancy changes in this
+# worker, and dropped on lookup when storage.occupancy_version() says another worker wrote.
+search_cache = SearchCache(
+    maxsize=int(os.environ.get("DREAMSTAY_SEARCH_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("DREAMSTAY_SEARCH_CACHE_TTL", 30)),
+)
+# Stay quotes (active offers + price), keyed by the catalog revision
+price_memo = RevisionedMemo(maxsize=int(os.environ.get("DREAMSTAY_PRICE_MEMO_SIZE", 4096)))
+
+# Opt-in latency/call-count metrics served at /metrics (DREAMSTAY_METRICS=1)
+metrics = Metrics.from_env()
+if metrics.enabled:
+    metrics.init_app(app)
 
 CITY_REGEX = re.compile(r"^[0-9A-Za-zÀ-ÿ ]+$")
 NAME_REGEX = re.compile(r"^[A-Za-zÀ-ÿ ]+$")
@@ -92,6 +55,7 @@ EMAIL_REGEX = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 CARD_REGEX = re.compile(r"^[0-9]{13,19}$")
 CVV_REGEX = re.compile(r"^[0-9]{3,4}$")
 EXP_REGEX = re.compile(r"^(0[1-9]|1[0-2])\/([0-9]{2})$")
+CONFIRMATION_CODE_REGEX = re.compile(r"^[A-Z0-9]{4,32}$")
 
 
 def is_valid_city(city: str) -> bool:
@@ -106,10 +70,6 @@ def is_valid_email(value: str) -> bool:
     return bool(EMAIL_REGEX.fullmatch(value or ""))
 
 
-def normalize_email(value: str) -> str:
-    return str(value or "").strip().lower()
-
-
 def is_valid_expiration(value: str) -> bool:
     match = EXP_REGEX.fullmatch(value or "")
     if not match:
@@ -140,34 +100,40 @@ def format_date_output(date_obj: datetime) -> str:
     return date_obj.strftime("%d/%m/%Y")
 
 
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+# Hotel catalog, read from DREAMSTAY_CATALOG (hotels.json next to this file by
+# default) on first use. With DREAMSTAY_CATALOG_CACHE set it is also compiled into
+# a binary cache keyed by the file hash, kept in that private (0700) directory
+CATALOG_PATH = os.environ.get(
+    "DREAMSTAY_CATALOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "hotels.json")
+)
+catalog = LazyCatalog(
+    lambda: load_catalog(CATALOG_PATH, parse_date, os.environ.get("DREAMSTAY_CATALOG_CACHE"))
+)
+
+
 def get_room(hotel_name, room_type):
-    for hotel in hotels:
-        if hotel["name"] == hotel_name:
-            for room in hotel["rooms"]:
-                if room["type"] == room_type:
-                    return hotel, room
-    return None, None
+    return catalog.room(hotel_name, room_type)
 
 
-def dates_overlap(start1, end1, start2, end2):
-    return start1 < end2 and start2 < end1
+def available_units(hotel_name, room_type, start, end, ignore_code=None):
+    return storage.available_units(
+        hotel_name,
+        room_type,
+        to_date(start),
+        to_date(end),
+        catalog.units(hotel_name, room_type),
+        ignore_code,
+    )
 
 
 def is_room_available(hotel_name, room_type, start, end, ignore_code=None):
-    key = (hotel_name, room_type)
-    if room_status.get(key) == "Ocupada":
-        return False
-    for reservation in reservations:
-        if reservation["hotel"] != hotel_name or reservation["room_type"] != room_type:
-            continue
-        if ignore_code and reservation["confirmation_code"] == ignore_code:
-            continue
-        if reservation.get("status") in ("confirmada", "ocupada"):
-            res_start = parse_date(reservation["checkin"])
-            res_end = parse_date(reservation["checkout"])
-            if res_start and res_end and dates_overlap(res_start, res_end, start, end):
-                return False
-    return True
+    return available_units(hotel_name, room_type, start, end, ignore_code) > 0
 
 
 def format_capacity(capacity: dict) -> str:
@@ -188,65 +154,150 @@ def normalize_counts(adults: int, children: int, babies: int) -> dict:
     return {"adult": adults, "child": children, "baby": babies}
 
 
+def blocking_span(reservation):
+    if reservation is None or reservation.status not in BLOCKING_STATUSES:
+        return None
+    return (reservation.hotel, reservation.room_type, reservation.checkin, reservation.checkout)
+
+
+def invalidate_searches(previous_span, reservation):
+    """
+    Descarta las búsquedas cacheadas que dependen de la ocupación que una
+    reserva bloqueaba antes (`previous_span`) o bloquea ahora.
+    """
+    current_span = blocking_span(reservation)
+    if previous_span == current_span:
+        return
+    for span in (previous_span, current_span):
+        if span is not None:
+            hotel_name, _, start, end = span
+            search_cache.invalidate(hotel_name, start, end)
+
+
 def get_active_offers(hotel, start, end):
-    active = []
-    for offer in hotel.get("offers", []):
-        offer_start = parse_date(offer.get("start"))
-        offer_end = parse_date(offer.get("end"))
-        if not offer_start or not offer_end:
-            continue
-        offer_end_exclusive = offer_end + timedelta(days=1)
-        if dates_overlap(offer_start, offer_end_exclusive, start, end):
-            active.append(offer)
-    return active
+    return catalog.active_offers(hotel["name"], to_date(start), to_date(end))
 
 
-def calculate_price(room, counts, nights, offers):
-    counts_copy = {
-        "adult": int(counts.get("adult", 0)),
-        "child": int(counts.get("child", 0)),
-        "baby": int(counts.get("baby", 0)),
-    }
-    rates = room.get("rates", {})
-    adult_rate = float(rates.get("adult", room.get("price", 0.0)))
-    child_rate = float(rates.get("child", adult_rate * 0.5))
-    baby_rate = float(rates.get("baby", 0.0))
-
-    applied_offers = []
-    for offer in offers:
-        applied = False
-        if offer.get("adult_discount"):
-            adult_rate = max(adult_rate * (1 - float(offer["adult_discount"])), 0.0)
-            applied = True
-        if offer.get("children_discount"):
-            child_rate = max(child_rate * (1 - float(offer["children_discount"])), 0.0)
-            applied = True
-        if offer.get("baby_discount"):
-            baby_rate = max(baby_rate * (1 - float(offer["baby_discount"])), 0.0)
-            applied = True
-        if applied:
-            applied_offers.append(offer.get("description") or offer.get("name"))
-
-    subtotal_per_night = (
-        adult_rate * counts_copy["adult"]
-        + child_rate * counts_copy["child"]
-        + baby_rate * counts_copy["baby"]
-    )
-    total = subtotal_per_night * nights
+def quote_price(hotel, room, counts, start, end):
+    """
+    Precio de una estadía (detalle y ofertas aplicadas) sumando la tarifa
+    de cada noche en el calendario de tarifas, memoizado por habitación,
+    huéspedes y fechas. Cambiar tarifas u ofertas incrementa la revisión del
+    catálogo e invalida todo lo memoizado.
+    """
+    start, end = to_date(start), to_date(end)
+    key = (hotel["name"], room["type"], counts["adult"], counts["child"], counts["baby"], start, end)
 
-    detail = {
-        "nights": nights,
-        "counts": counts_copy,
-        "per_night": {
-            "adult": round(adult_rate, 2),
-            "child": round(child_rate, 2),
-            "baby": round(baby_rate, 2),
-        },
-        "subtotal_per_night": round(subtotal_per_night, 2),
-        "total": round(total, 2),
+    def compute():
+        return catalog.rate_calendar(hotel["name"], room["type"]).quote(counts, start, end)
+
+    return price_memo.get_or_compute(catalog.revision, key, compute)
+
+
+def format_room_result(room, units_left, price_detail, applied_offers):
+    return {
+        "name": room.get("name", room["type"]),
+        "type": room["type"],
+        "capacity": format_capacity(room["capacity"]),
+        "capacity_breakdown": room["capacity"],
+        "state": "Disponible",
+        "available_units": units_left,
+        "price_per_night": price_detail["subtotal_per_night"],
+        "price": price_detail["total"],
+        "offer": ", ".join(applied_offers) if applied_offers else None,
+        "price_detail": price_detail,
     }
 
-    return detail, applied_offers
+
+FLEX_MAX_DAYS = 7
+
+
+def flexible_search(hotels, room_type, counts, checkin, checkout, flex_days, today):
+    """
+    Búsqueda con fechas flexibles: evalúa cada combinación de entrada en
+    checkin ± flex_days y salida en checkout ± flex_days, y devuelve por
+    hotel la ventana más barata (por noche) de cada habitación disponible.
+
+    Cada habitación lee una sola vez la ocupación por noche de todo el
+    rango y la disponibilidad de cada ventana sale de la suma prefija de
+    noches completas, en O(1); el precio de cada ventana, de la diferencia
+    de dos precios acumulados desde el inicio del rango con el calendario de
+    tarifas. Solo la ventana elegida de cada habitación se cotiza completa.
+    """
+    checkins = [
+        checkin + timedelta(days=offset)
+        for offset in range(-flex_days, flex_days + 1)
+        if checkin + timedelta(days=offset) >= today
+    ]
+    checkouts = [checkout + timedelta(days=offset) for offset in range(-flex_days, flex_days + 1)]
+    windows = [(start, end) for start in checkins for end in checkouts if end > start]
+    span_start, span_end = checkins[0], checkouts[-1]
+    span_days = [span_start + timedelta(days=offset) for offset in range((span_end - span_start).days + 1)]
+    positions = [((start - span_start).days, (end - span_start).days) for start, end in windows]
+    # A igual precio por noche gana la ventana más cercana a lo pedido
+    distances = [abs((start - checkin).days) + abs((end - checkout).days) for start, end in windows]
+
+    guests = (counts["adult"], counts["child"], counts["baby"])
+    results = []
+    for hotel in hotels:
+        rooms = []
+        for room in hotel["rooms"]:
+            if room_type != "Todos" and room["type"] != room_type:
+                continue
+            key = (hotel["name"], room["type"])
+            max_adults, max_children, max_babies = catalog.capacities[key]
+            if counts["adult"] > max_adults or counts["child"] > max_children or counts["baby"] > max_babies:
+                continue
+
+            units = catalog.units(*key)
+            nightly = storage.nightly_occupancy(hotel["name"], room["type"], span_start, span_end)
+            full_nights = [0]
+            for occupied in nightly:
+                full_nights.append(full_nights[-1] + (occupied >= units))
+            # Precio acumulado desde el inicio del rango hasta cada día
+            rate_calendar = catalog.rate_calendar(*key)
+            cumulative = [rate_calendar.total(guests, span_start, day) for day in span_days]
+
+            best = None
+            for index, (first, last) in enumerate(positions):
+                if full_nights[last] != full_nights[first]:
+                    continue
+                per_night = (cumulative[last] - cumulative[first]) / (last - first)
+                rank = (per_night, distances[index], windows[index][0])
+                if best is None or rank < best[0]:
+                    best = (rank, index)
+            if best is None:
+                continue
+
+            start, end = windows[best[1]]
+            first, last = positions[best[1]]
+            price_detail, applied_offers = quote_price(hotel, room, counts, start, end)
+            result = format_room_result(room, units - max(nightly[first:last]), price_detail, applied_offers)
+            result["checkin"] = format_date_output(start)
+            result["checkout"] = format_date_output(end)
+            result["nights"] = (end - start).days
+            rooms.append(result)
+
+        if rooms:
+            rooms.sort(key=lambda item: (item["price_per_night"], item["price"]))
+            best_room = rooms[0]
+            results.append(
+                {
+                    "hotel": hotel["name"],
+                    "city": hotel["city"],
+                    "offers": [
+                        offer.get("description") or offer.get("name")
+                        for offer in catalog.active_offers(hotel["name"], span_start, span_end)
+                    ],
+                    "rooms": rooms,
+                    "checkin": best_room["checkin"],
+                    "checkout": best_room["checkout"],
+                    "nights": best_room["nights"],
+                }
+            )
+
+    results.sort(key=lambda item: item["rooms"][0]["price_per_night"])
+    return results
 
 
 @app.route("/api/hotels/search", methods=["POST", "GET"])
@@ -263,6 +314,7 @@ def search_hotels():
             "children": request.args.get("children", 0),
             "babies": request.args.get("babies", 0),
             "tzOffset": request.args.get("tzOffset"),
+            "flex_days": request.args.get("flexDays", 0),
         }
 
     errors = []
@@ -300,8 +352,7 @@ def search_hotels():
         errors.append("La fecha de salida debe ser posterior a la de entrada.")
 
     room_type = data.get("room_type") or "Single"
-    available_types = {room["type"] for hotel in hotels for room in hotel["rooms"]}
-    if room_type != "Todos" and room_type not in available_types:
+    if room_type != "Todos" and room_type not in catalog.room_types:
         errors.append("Tipo de habitación inválido.")
 
     try:
@@ -317,22 +368,21 @@ def search_hotels():
     if children < 0 or babies < 0:
         errors.append("No se permiten valores negativos en niños o bebés.")
 
-    if room_type != "Todos" and room_type in available_types:
-        selected_capacity = None
-        for hotel in hotels:
-            for room in hotel["rooms"]:
-                if room["type"] == room_type:
-                    selected_capacity = room["capacity"]
-                    break
-            if selected_capacity:
-                break
-        if selected_capacity:
-            if (
-                adults > selected_capacity["adults"]
-                or children > selected_capacity["children"]
-                or babies > selected_capacity["babies"]
-            ):
-                errors.append("La habitación seleccionada no admite la cantidad de huéspedes indicada.")
+    if room_type != "Todos" and room_type in catalog.room_types:
+        selected_capacity = catalog.type_capacity[room_type]
+        if (
+            adults > selected_capacity["adults"]
+            or children > selected_capacity["children"]
+            or babies > selected_capacity["babies"]
+        ):
+            errors.append("La habitación seleccionada no admite la cantidad de huéspedes indicada.")
+
+    try:
+        flex_days = int(data.get("flex_days") or 0)
+    except (TypeError, ValueError):
+        flex_days = -1
+    if not 0 <= flex_days <= FLEX_MAX_DAYS:
+        errors.append(f"Los días de flexibilidad deben ser un número entero entre 0 y {FLEX_MAX_DAYS}.")
 
     if errors:
         return jsonify({"errors": errors}), 400
@@ -340,52 +390,84 @@ def search_hotels():
     counts = normalize_counts(adults, children, babies)
     nights = max((d_checkout - d_checkin).days, 1)
 
-    results = []
-    for hotel in hotels:
-        if hotel["city"].lower() != city.lower():
-            continue
+    cache_key = (
+        catalog.revision,
+        city.casefold(),
+        d_checkin.date(),
+        d_checkout.date(),
+        room_type,
+        adults,
+        children,
+        babies,
+        flex_days,
+    )
+    # Tomada antes de calcular: si otro worker escribe mientras tanto, la entrada ya nace vieja
+    occupancy_version = storage.occupancy_version()
+    cached = search_cache.get(cache_key, occupancy_version)
+    if cached is not None:
+        return jsonify(cached)
+
+    if flex_days:
+        hotels = catalog.hotels_in_city(city)
+        results = flexible_search(
+            hotels, room_type, counts, d_checkin.date(), d_checkout.date(), flex_days, today.date()
+        )
+        search_cache.put(
+            cache_key,
+            results,
+            [hotel["name"] for hotel in hotels],
+            max(d_checkin.date() - timedelta(days=flex_days), today.date()),
+            d_checkout.date() + timedelta(days=flex_days),
+            occupancy_version,
+        )
+        return jsonify(results)
 
+    # Primero se filtran las habitaciones disponibles y luego se cotizan todas en un lote
+    candidates = []
+    hotel_offers = []
+    for hotel in catalog.hotels_in_city(city):
         hotel_active_offers = get_active_offers(hotel, d_checkin, d_checkout)
-        offer_labels = [offer.get("description") or offer.get("name") for offer in hotel_active_offers]
+        hotel_offers.append((hotel, hotel_active_offers))
 
-        available_rooms = []
         for room in hotel["rooms"]:
             if room_type != "Todos" and room["type"] != room_type:
                 continue
 
-            capacity = room["capacity"]
-            if (
-                counts["adult"] > capacity["adults"]
-                or counts["child"] > capacity["children"]
-                or counts["baby"] > capacity["babies"]
-            ):
+            max_adults, max_children, max_babies = catalog.capacities[(hotel["name"], room["type"])]
+            if counts["adult"] > max_adults or counts["child"] > max_children or counts["baby"] > max_babies:
                 continue
 
-            if not is_room_available(hotel["name"], room["type"], d_checkin, d_checkout):
+            units_left = available_units(hotel["name"], room["type"], d_checkin, d_checkout)
+            if not units_left:
                 continue
 
-            price_detail, applied_offers = calculate_price(room, counts, nights, hotel_active_offers)
-
-            room_entry = {
-                "name": room.get("name", room["type"]),
-                "type": room["type"],
-                "capacity": format_capacity(capacity),
-                "capacity_breakdown": capacity,
-                "state": "Disponible",
-                "price_per_night": price_detail["subtotal_per_night"],
-                "price": price_detail["total"],
-                "offer": ", ".join(applied_offers) if applied_offers else None,
-                "price_detail": price_detail,
-            }
-            available_rooms.append(room_entry)
+            candidates.append((hotel["name"], room, units_left))
 
+    # Sin pasar por la memoización de quote_price: cada búsqueda la llenaría de estadías sueltas
+    batch = calculate_prices(
+        [catalog.rate_calendar(hotel_name, room["type"]) for hotel_name, room, _ in candidates],
+        [counts] * len(candidates),
+        [d_checkin.date()] * len(candidates),
+        [d_checkout.date()] * len(candidates),
+    )
+
+    rooms_by_hotel = {}
+    for index, (hotel_name, room, units_left) in enumerate(candidates):
+        price_detail, applied_offers = batch.detail(index)
+        rooms_by_hotel.setdefault(hotel_name, []).append(
+            format_room_result(room, units_left, price_detail, applied_offers)
+        )
+
+    results = []
+    for hotel, hotel_active_offers in hotel_offers:
+        available_rooms = rooms_by_hotel.get(hotel["name"])
         if available_rooms:
             available_rooms.sort(key=lambda item: item["price_per_night"])
             results.append(
                 {
                     "hotel": hotel["name"],
                     "city": hotel["city"],
-                    "offers": offer_labels,
+                    "offers": [offer.get("description") or offer.get("name") for offer in hotel_active_offers],
                     "rooms": available_rooms,
                     "nights": nights,
                 }
@@ -394,9 +476,22 @@ def search_hotels():
     if results:
         results.sort(key=lambda item: item["rooms"][0]["price_per_night"])
 
+    search_cache.put(
+        cache_key,
+        results,
+        [hotel["name"] for hotel, _ in hotel_offers],
+        d_checkin.date(),
+        d_checkout.date(),
+        occupancy_version,
+    )
     return jsonify(results)
 
 
+@app.route("/api/search-cache/stats", methods=["GET"])
+def search_cache_stats():
+    return jsonify(search_cache.stats())
+
+
 # 🔹 NUEVA RUTA para que el frontend pueda listar habitaciones de un hotel
 @app.route("/api/hotels/<hotel_name>/rooms", methods=["GET"])
 def get_hotel_rooms(hotel_name):
@@ -411,10 +506,7 @@ def get_hotel_rooms(hotel_name):
     d_checkout = parse_date(checkout_str) if checkout_str else None
 
     # Buscar hotel por nombre (case-insensitive)
-    hotel = next(
-        (h for h in hotels if h["name"].lower() == hotel_name.lower()),
-        None,
-    )
+    hotel = catalog.hotel_casefold(hotel_name)
 
     if not hotel:
         return jsonify({"error": "Hotel no encontrado"}), 404
@@ -422,20 +514,19 @@ def get_hotel_rooms(hotel_name):
     rooms_list = []
     for room in hotel["rooms"]:
         # Si hay fechas, calculamos disponibilidad real; si no, asumimos disponible
-        available = True
+        disponibles = catalog.units(hotel["name"], room["type"])
         if d_checkin and d_checkout:
-            available = is_room_available(
+            disponibles = available_units(
                 hotel["name"],
                 room["type"],
                 d_checkin,
                 d_checkout,
             )
 
-        estado = "disponible" if available else "ocupada"
+        estado = "disponible" if disponibles else "ocupada"
 
         # Usamos la tarifa de adulto como precio por noche de referencia
-        rates = room.get("rates", {})
-        precio_por_noche = float(rates.get("adult", room.get("price", 0.0)))
+        precio_por_noche = catalog.rates[(hotel["name"], room["type"])][0]
 
         rooms_list.append(
             {
@@ -444,65 +535,120 @@ def get_hotel_rooms(hotel_name):
                 "capacidad": room["capacity"],  # {adults, children, babies}
                 "precio_por_noche": round(precio_por_noche, 2),
                 "estado": estado,
+                "disponibles": disponibles,
             }
         )
 
     return jsonify(rooms_list)
 
 
-@app.route("/api/reservations", methods=["POST", "OPTIONS"])
-def make_reservation():
-    if request.method == "OPTIONS":
-        return "", 204
+MAX_CALENDAR_DAYS = 366
 
-    data = request.json or {}
-    contact_email_raw = str(data.get("contact_email", "")).strip()
-    if not contact_email_raw:
-        return jsonify({"error": "El correo electronico de contacto es obligatorio"}), 400
-    if not is_valid_email(contact_email_raw):
-        return jsonify({"error": "El correo electronico de contacto tiene un formato invalido"}), 400
-    required_fields = ["hotel", "room_type", "checkin", "checkout", "guests"]
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Falta el campo {field}"}), 400
 
-    hotel_name = data["hotel"]
-    room_type = data["room_type"]
-    hotel, room = get_room(hotel_name, room_type)
-    if not hotel or not room:
-        return jsonify({"error": "Hotel o tipo de habitación inválido"}), 400
+@app.route("/api/hotels/<hotel_name>/calendar", methods=["GET"])
+def get_hotel_calendar(hotel_name):
+    """
+    Disponibilidad y precio por noche de cada tipo de habitación para cada
+    día de [from, to), en formato columnar: una fila por tipo de habitación
+    y una columna por noche, alineadas con `dates`.
+    """
+    hotel = catalog.hotel_casefold(hotel_name)
+    if not hotel:
+        return jsonify({"error": "Hotel no encontrado"}), 404
 
-    d_checkin = parse_date(data["checkin"])
-    d_checkout = parse_date(data["checkout"])
-    if not d_checkin or not d_checkout or d_checkout <= d_checkin:
+    d_from = parse_date(request.args.get("from"))
+    d_to = parse_date(request.args.get("to"))
+    if not d_from or not d_to or d_to <= d_from:
         return jsonify({"error": "Fechas inválidas"}), 400
+    d_from, d_to = d_from.date(), d_to.date()
+    days = (d_to - d_from).days
+    if days > MAX_CALENDAR_DAYS:
+        return jsonify({"error": f"El calendario admite como máximo {MAX_CALENDAR_DAYS} días"}), 400
+
+    try:
+        counts = normalize_counts(
+            int(request.args.get("adults", 1)),
+            int(request.args.get("children", 0)),
+            int(request.args.get("babies", 0)),
+        )
+    except (TypeError, ValueError):
+        return jsonify({"error": "La cantidad de huéspedes debe ser un número entero positivo."}), 400
+    if counts["adult"] < 1 or counts["child"] < 0 or counts["baby"] < 0:
+        return jsonify({"error": "Debe haber al menos un adulto y los conteos no pueden ser negativos."}), 400
+
+    day_list = [d_from + timedelta(days=offset) for offset in range(days)]
+    guests = (counts["adult"], counts["child"], counts["baby"])
+
+    room_types, units, available, prices = [], [], [], []
+    for room in hotel["rooms"]:
+        key = (hotel["name"], room["type"])
+        room_units = catalog.units(*key)
+        occupancy = storage.nightly_occupancy(hotel["name"], room["type"], d_from, d_to)
+
+        max_adults, max_children, max_babies = catalog.capacities[key]
+        fits = counts["adult"] <= max_adults and counts["child"] <= max_children and counts["baby"] <= max_babies
+
+        rate_calendar = catalog.rate_calendar(*key)
+        row_prices = [round(rate_calendar.total(guests, day, day + timedelta(days=1)), 2) for day in day_list]
 
-    guests = data.get("guests", [])
+        room_types.append(room["type"])
+        units.append(room_units)
+        available.append([max(room_units - used, 0) if fits else 0 for used in occupancy])
+        prices.append(row_prices)
+
+    return jsonify(
+        {
+            "hotel": hotel["name"],
+            "from": format_date_output(d_from),
+            "to": format_date_output(d_to),
+            "dates": [format_date_output(day) for day in day_list],
+            "room_types": room_types,
+            "units": units,
+            "available": available,
+            "price_per_night": prices,
+        }
+    )
+
+
+def generate_confirmation_code():
+    while True:
+        code = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        if not storage.has_reservation(code) and code not in storage.archive:
+            return code
+
+
+def process_guests(guests):
+    """
+    Valida la lista de huéspedes y los clasifica por edad.
+    Devuelve (huéspedes procesados, conteos, None) o (None, None, error).
+    """
     if not isinstance(guests, list) or not guests:
-        return jsonify({"error": "Debe haber al menos un huésped"}), 400
+        return None, None, "Debe haber al menos un huésped"
 
     counts = Counter()
     processed_guests = []
     today = datetime.now().date()
 
     for idx, guest in enumerate(guests, start=1):
+        if not isinstance(guest, dict):
+            return None, None, f"Los datos del huésped {idx} son inválidos"
         name = str(guest.get("name", "")).strip()
         birth_raw = str(guest.get("birth", "")).strip()
 
         if not name:
-            return jsonify({"error": f"El nombre del huésped {idx} es obligatorio"}), 400
+            return None, None, f"El nombre del huésped {idx} es obligatorio"
         if not is_valid_name(name):
-            return jsonify({"error": f"El nombre del huésped {idx} solo admite letras y espacios"}), 400
+            return None, None, f"El nombre del huésped {idx} solo admite letras y espacios"
 
         birth_date = parse_date(birth_raw)
         if not birth_date:
-            return jsonify({"error": f"La fecha de nacimiento del huésped {idx} debe tener formato dd/mm/yyyy"}), 400
+            return None, None, f"La fecha de nacimiento del huésped {idx} debe tener formato dd/mm/yyyy"
 
         age = today.year - birth_date.year - (
             (today.month, today.day) < (birth_date.month, birth_date.day)
         )
         if age < 0:
-            return jsonify({"error": f"La fecha de nacimiento del huésped {idx} no puede ser futura"}), 400
+            return None, None, f"La fecha de nacimiento del huésped {idx} no puede ser futura"
 
         if age >= 18:
             category = "adult"
@@ -522,9 +668,41 @@ def make_reservation():
         )
 
     counts_dict = normalize_counts(counts.get("adult", 0), counts.get("child", 0), counts.get("baby", 0))
+    return processed_guests, counts_dict, None
+
+
+def build_reservation(data, status="pendiente_pago", confirmation_code=None):
+    """
+    Valida los datos de una reserva nueva y arma el registro con su precio,
+    sin verificar disponibilidad. Devuelve (reserva, None) o (None, error).
+    """
+    contact_email_raw = str(data.get("contact_email", "")).strip()
+    if not contact_email_raw:
+        return None, "El correo electronico de contacto es obligatorio"
+    if not is_valid_email(contact_email_raw):
+        return None, "El correo electronico de contacto tiene un formato invalido"
+    required_fields = ["hotel", "room_type", "checkin", "checkout", "guests"]
+    for field in required_fields:
+        if field not in data:
+            return None, f"Falta el campo {field}"
+
+    hotel_name = data["hotel"]
+    room_type = data["room_type"]
+    hotel, room = get_room(hotel_name, room_type)
+    if not hotel or not room:
+        return None, "Hotel o tipo de habitación inválido"
+
+    d_checkin = parse_date(data["checkin"])
+    d_checkout = parse_date(data["checkout"])
+    if not d_checkin or not d_checkout or d_checkout <= d_checkin:
+        return None, "Fechas inválidas"
+
+    processed_guests, counts_dict, error = process_guests(data.get("guests", []))
+    if error:
+        return None, error
 
     if counts_dict["adult"] == 0:
-        return jsonify({"error": "Debe haber al menos un adulto en la reserva"}), 400
+        return None, "Debe haber al menos un adulto en la reserva"
 
     capacity = room["capacity"]
     if (
@@ -532,37 +710,200 @@ def make_reservation():
         or counts_dict["child"] > capacity["children"]
         or counts_dict["baby"] > capacity["babies"]
     ):
-        return jsonify({"error": "La cantidad de huéspedes excede la capacidad de la habitación seleccionada"}), 400
+        return None, "La cantidad de huéspedes excede la capacidad de la habitación seleccionada"
+
+    nights = max((d_checkout - d_checkin).days, 1)
+    price_detail, applied_offers = quote_price(hotel, room, counts_dict, d_checkin, d_checkout)
+
+    reservation = Reservation(
+        confirmation_code=confirmation_code or generate_confirmation_code(),
+        hotel=hotel_name,
+        room_type=room_type,
+        room_name=room.get("name", room_type),
+        contact_email=contact_email_raw,
+        checkin=d_checkin.date(),
+        checkout=d_checkout.date(),
+        guests=processed_guests,
+        price_detail=price_detail,
+        total=price_detail["total"],
+        offer=", ".join(applied_offers) if applied_offers else None,
+        offers=list(applied_offers),
+        counts=counts_dict,
+        nights=nights,
+        status=status,
+        expires_at=hold_expiry.deadline() if status == "pendiente_pago" else None,
+    )
+    return reservation, None
+
+
+@app.route("/api/reservations", methods=["POST", "OPTIONS"])
+def make_reservation():
+    if request.method == "OPTIONS":
+        return "", 204
+
+    data = request.json or {}
+    reservation, error = build_reservation(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    if not is_room_available(hotel_name, room_type, d_checkin, d_checkout):
+    if not storage.reserve(reservation, catalog.units(reservation.hotel, reservation.room_type)):
         return jsonify({"error": "La habitación seleccionada no tiene disponibilidad para esas fechas"}), 400
+    invalidate_searches(None, reservation)
+    hold_expiry.schedule(reservation)
+    return jsonify(reservation.to_dict())
 
-    nights = max((d_checkout - d_checkin).days, 1)
-    hotel_active_offers = get_active_offers(hotel, d_checkin, d_checkout)
-    price_detail, applied_offers = calculate_price(room, counts_dict, nights, hotel_active_offers)
-
-    confirmation_code = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
-
-    reservation = {
-        "confirmation_code": confirmation_code,
-        "hotel": hotel_name,
-        "room_type": room_type,
-        "room_name": room.get("name", room_type),
-        "contact_email": contact_email_raw,
-        "checkin": format_date_output(d_checkin),
-        "checkout": format_date_output(d_checkout),
-        "guests": processed_guests,
-        "price_detail": price_detail,
-        "total": price_detail["total"],
-        "offer": ", ".join(applied_offers) if applied_offers else None,
-        "offers": applied_offers,
-        "counts": counts_dict,
-        "nights": nights,
-        "status": "pendiente_pago",
+
+IMPORT_STATUSES = ("confirmada", "pendiente_pago")
+IMPORT_READ_BUFFER = 1 << 16
+IMPORT_REJECTIONS = {
+    "duplicada": "Ya existe una reserva con ese codigo de confirmacion",
+    "sin_disponibilidad": "La habitación seleccionada no tiene disponibilidad para esas fechas",
+}
+
+
+def parse_import_line(raw, imported_at):
+    """Convierte una línea NDJSON de la importación en (reserva, None) o (None, error)."""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None, "La linea no es un JSON valido"
+    if not isinstance(data, dict):
+        return None, "Cada linea debe ser un objeto JSON"
+
+    status = data.get("status") or "confirmada"
+    if status not in IMPORT_STATUSES:
+        return None, f"El estado {status} no se admite en la importacion"
+
+    code = str(data.get("confirmation_code") or "").strip().upper()
+    if code and not CONFIRMATION_CODE_REGEX.fullmatch(code):
+        return None, "El codigo de confirmacion solo admite letras y numeros (4 a 32)"
+
+    reservation, error = build_reservation(data, status=status, confirmation_code=code or None)
+    if error:
+        return None, error
+    if status == "confirmada":
+        # El pago se cobró en el canal de origen: se registra su procedencia
+        reservation.payment = {
+            "channel": str(data.get("channel") or "importacion"),
+            "imported_at": imported_at,
+        }
+    return reservation, None
+
+
+# Bulk import/export between systems require this secret in X-Sync-Token;
+# without DREAMSTAY_SYNC_TOKEN both endpoints are disabled
+SYNC_TOKEN = os.environ.get("DREAMSTAY_SYNC_TOKEN") or None
+
+
+def require_sync_token(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if SYNC_TOKEN is None:
+            return jsonify({"error": "La sincronizacion esta deshabilitada (DREAMSTAY_SYNC_TOKEN)"}), 404
+        token = request.headers.get("X-Sync-Token", "")
+        if not hmac.compare_digest(token.encode(), SYNC_TOKEN.encode()):
+            return jsonify({"error": "Token de sincronizacion invalido"}), 401
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@app.route("/api/reservations/import", methods=["POST"])
+@require_sync_token
+def import_reservations():
+    """
+    Alta masiva de reservas desde un cuerpo NDJSON (una reserva por línea,
+    con los mismos campos que POST /api/reservations más status,
+    confirmation_code y channel opcionales). La disponibilidad de todo el
+    lote se verifica de una vez contra el almacenamiento. Por defecto la
+    importación es todo o nada; con partial=1 se guardan las filas válidas.
+    """
+    all_or_nothing = request.args.get("partial") not in ("1", "true")
+    imported_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    reservations = []
+    line_numbers = []
+    errors = []
+    # El stream crudo de werkzeug lee de a un byte por línea; el buffer lo evita
+    body = io.BufferedReader(request.stream, IMPORT_READ_BUFFER)
+    for line_number, raw in enumerate(body, start=1):
+        if not raw.strip():
+            continue
+        reservation, error = parse_import_line(raw, imported_at)
+        if error:
+            errors.append({"line": line_number, "error": error})
+            continue
+        reservations.append(reservation)
+        line_numbers.append(line_number)
+
+    # Los códigos del archivo siguen tomados aunque ya no estén vivos
+    archived = storage.archive.existing(item.confirmation_code for item in reservations)
+    if archived:
+        kept = []
+        for reservation, line_number in zip(reservations, line_numbers):
+            if reservation.confirmation_code in archived:
+                errors.append({"line": line_number, "error": IMPORT_REJECTIONS["duplicada"]})
+            else:
+                kept.append((reservation, line_number))
+        reservations = [reservation for reservation, _ in kept]
+        line_numbers = [line_number for _, line_number in kept]
+
+    if errors and all_or_nothing:
+        return jsonify({"imported": 0, "errors": errors}), 400
+
+    units_by_key = {
+        key: catalog.units(*key) for key in {(item.hotel, item.room_type) for item in reservations}
     }
+    rejected = storage.bulk_reserve(reservations, units_by_key, all_or_nothing)
+    for index, reason in rejected.items():
+        errors.append({"line": line_numbers[index], "error": IMPORT_REJECTIONS[reason]})
+    errors.sort(key=lambda item: item["line"])
+    if rejected and all_or_nothing:
+        return jsonify({"imported": 0, "errors": errors}), 400
+
+    # Una sola invalidación por hotel sobre el rango que cubre el lote
+    spans = {}
+    for index, reservation in enumerate(reservations):
+        if index in rejected:
+            continue
+        hold_expiry.schedule(reservation)
+        span = blocking_span(reservation)
+        if span is not None:
+            hotel_name, _, start, end = span
+            low, high = spans.get(hotel_name, (start, end))
+            spans[hotel_name] = (min(low, start), max(high, end))
+    for hotel_name, (start, end) in spans.items():
+        search_cache.invalidate(hotel_name, start, end)
 
-    reservations.append(reservation)
-    return jsonify(reservation)
+    return jsonify({"imported": len(reservations) - len(rejected), "errors": errors})
+
+
+@app.route("/api/reservations/export", methods=["GET"])
+@require_sync_token
+def export_reservations():
+    """
+    Exporta las reservas como NDJSON, una por línea en el mismo formato que
+    devuelve la API, generando la respuesta a medida que se envía: primero
+    las vivas y después las archivadas. Filtros opcionales: hotel y status.
+    """
+    hotel_name = request.args.get("hotel") or None
+    status = request.args.get("status") or None
+
+    def generate():
+        scanned = 0
+        for reservation in storage.iter_reservations():
+            scanned += 1
+            if hotel_name is not None and reservation.hotel != hotel_name:
+                continue
+            if status is not None and reservation.status != status:
+                continue
+            yield json.dumps(reservation.to_dict(), ensure_ascii=False) + "\n"
+        record_scan("export", scanned)
+        # El archivo filtra en la base: solo se leen las que se exportan
+        for reservation in storage.archive.iter_reservations(hotel_name, status):
+            yield json.dumps(reservation.to_dict(), ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 @app.route("/api/reservations/search", methods=["POST", "OPTIONS"])
@@ -573,7 +914,6 @@ def search_reservation():
     data = request.json or {}
     code = str(data.get("code", "")).strip().upper()
     email_raw = str(data.get("email", "")).strip()
-    email_normalized = email_raw.lower()
 
     if not code:
         return jsonify({"error": "El codigo de reserva es obligatorio"}), 400
@@ -582,22 +922,15 @@ def search_reservation():
     if not is_valid_email(email_raw):
         return jsonify({"error": "El correo electronico tiene un formato invalido"}), 400
 
-    reservation = next(
-        (
-            res
-            for res in reservations
-            if res["confirmation_code"] == code
-            and str(res.get("contact_email", "")).strip().lower() == email_normalized
-        ),
-        None,
-    )
+    # Las reservas completadas o canceladas solo están en el archivo
+    reservation = storage.find_reservation(code, email_raw) or storage.archive.find(code, email_raw)
 
     if not reservation:
         return jsonify(
             {"error": "No se encontro una reserva asociada a los datos ingresados."}
         ), 404
 
-    response_payload = reservation.copy()
+    response_payload = reservation.to_dict()
     return jsonify({"reservation": response_payload})
 
 
@@ -613,17 +946,9 @@ def cancel_reservation():
     if not code or not email:
         return jsonify({"error": "Debe proporcionar codigo de reserva y correo de contacto."}), 400
 
-    reservation = next(
-        (
-            res
-            for res in reservations
-            if res["confirmation_code"] == code
-            and normalize_email(res.get("contact_email")) == email
-        ),
-        None,
-    )
+    reservation = storage.find_reservation(code, email)
 
-    if not reservation or reservation.get("status") != "confirmada":
+    if not reservation or reservation.status != "confirmada":
         return (
             jsonify({"error": "No encontramos una reserva confirmada con los datos ingresados."}),
             404,
@@ -631,23 +956,26 @@ def cancel_reservation():
 
     refund_amount = 0.0
     policy = "sin reembolso"
-    checkin = parse_date(reservation.get("checkin"))
     now = datetime.now()
-    if checkin:
-        checkin_dt = datetime.combine(checkin, datetime.min.time())
-        if checkin_dt - now >= timedelta(hours=24):
-            refund_amount = reservation.get("total", 0.0)
-            policy = "reembolso total"
-
-    reservation["status"] = "cancelada"
-    reservation["cancellation"] = {
+    checkin_dt = datetime.combine(reservation.checkin, datetime.min.time())
+    if checkin_dt - now >= timedelta(hours=24):
+        refund_amount = reservation.total
+        policy = "reembolso total"
+
+    previous_span = blocking_span(reservation)
+    reservation.status = "cancelada"
+    reservation.cancellation = {
         "refunded": refund_amount,
         "policy": policy,
         "cancelled_at": now.strftime("%Y-%m-%d %H:%M:%S"),
     }
 
-    key = (reservation["hotel"], reservation["room_type"])
-    room_status[key] = "Disponible"
+    if storage.archive_reservation(reservation, expected_status="confirmada") is None:
+        return (
+            jsonify({"error": "No encontramos una reserva confirmada con los datos ingresados."}),
+            404,
+        )
+    invalidate_searches(previous_span, reservation)
 
     message = (
         "Reserva cancelada con exito. Se emitio "
@@ -657,7 +985,7 @@ def cancel_reservation():
     return jsonify(
         {
             "message": message,
-            "reservation": reservation,
+            "reservation": reservation.to_dict(),
             "refund": {"amount": refund_amount, "policy": policy},
         }
     )
@@ -696,17 +1024,11 @@ def process_payment():
     if errors:
         return jsonify({"errors": errors}), 400
 
-    reservation = next(
-        (
-            res
-            for res in reservations
-            if res["confirmation_code"] == code
-            and normalize_email(res.get("contact_email")) == email
-        ),
-        None,
-    )
+    reservation = storage.find_reservation(code, email)
+    paid_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    if not reservation or reservation.get("status") != "pendiente_pago":
+    # Una retención vencida no se cobra aunque el hilo todavía no la haya dado de baja
+    if not reservation or reservation.status != "pendiente_pago" or hold_expired(reservation, paid_at):
         return (
             jsonify(
                 {"error": "No encontramos una reserva pendiente de pago con el codigo ingresado."}
@@ -714,12 +1036,11 @@ def process_payment():
             404,
         )
 
-    amount = reservation.get("total")
+    amount = reservation.total
     last4 = card_number_raw[-4:]
-    paid_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     receipt = {
-        "confirmation_code": reservation["confirmation_code"],
+        "confirmation_code": reservation.confirmation_code,
         "amount": amount,
         "currency": "ARS",
         "paid_at": paid_at,
@@ -728,13 +1049,20 @@ def process_payment():
         "receipt_email": receipt_email,
     }
 
-    reservation["status"] = "confirmada"
-    reservation["payment"] = receipt
+    previous_span = blocking_span(reservation)
+    reservation = replace(reservation, status="confirmada", payment=receipt, expires_at=None)
+    units = catalog.units(reservation.hotel, reservation.room_type)
+    if not storage.reserve(reservation, units, expected_status="pendiente_pago"):
+        return (
+            jsonify({"error": "La habitación ya no tiene disponibilidad para las fechas de esta reserva."}),
+            409,
+        )
+    invalidate_searches(previous_span, reservation)
 
     return jsonify(
         {
             "message": "Pago realizado con exito. Tu reserva quedo confirmada.",
-            "reservation": reservation,
+            "reservation": reservation.to_dict(),
             "receipt": receipt,
         }
     )
@@ -752,47 +1080,37 @@ def modify_reservation():
     if not code or not email:
         return jsonify({"error": "Debe proporcionar codigo y correo para modificar la reserva."}), 400
 
-    reservation = next(
-        (
-            res
-            for res in reservations
-            if res["confirmation_code"] == code
-            and normalize_email(res.get("contact_email")) == email
-        ),
-        None,
-    )
+    reservation = storage.find_reservation(code, email)
 
-    if not reservation or reservation.get("status") != "confirmada":
+    if not reservation or reservation.status != "confirmada":
         return (
             jsonify({"error": "No encontramos una reserva confirmada con los datos ingresados."}),
             404,
         )
 
-    original_checkin = parse_date(reservation.get("checkin"))
-    if not original_checkin:
-        return jsonify({"error": "La reserva no tiene fechas validas para modificar."}), 400
+    original_checkin = reservation.checkin
     if datetime.combine(original_checkin, datetime.min.time()) - datetime.now() < timedelta(hours=24):
         return (
             jsonify({"error": "No es posible modificar la reserva dentro de las 24 horas previas al check-in."}),
             400,
         )
 
-    new_checkin = parse_date(data.get("checkin") or reservation.get("checkin"))
-    new_checkout = parse_date(data.get("checkout") or reservation.get("checkout"))
+    new_checkin = to_date(parse_date(data["checkin"])) if data.get("checkin") else reservation.checkin
+    new_checkout = to_date(parse_date(data["checkout"])) if data.get("checkout") else reservation.checkout
     if not new_checkin or not new_checkout or new_checkout <= new_checkin:
         return jsonify({"error": "Fechas invalidas para la modificacion."}), 400
 
-    hotel_name = reservation["hotel"]
-    new_room_type = data.get("room_type") or reservation["room_type"]
+    hotel_name = reservation.hotel
+    new_room_type = data.get("room_type") or reservation.room_type
     hotel, room = get_room(hotel_name, new_room_type)
     if not hotel or not room:
         return jsonify({"error": "Tipo de habitacion invalido para el hotel seleccionado."}), 400
 
-    counts_payload = data.get("counts") or reservation.get("counts") or {}
+    counts_payload = data.get("counts") or reservation.counts or {}
     try:
-        adult_count = int(counts_payload.get("adult", reservation["counts"].get("adult", 1)))
-        child_count = int(counts_payload.get("child", reservation["counts"].get("child", 0)))
-        baby_count = int(counts_payload.get("baby", reservation["counts"].get("baby", 0)))
+        adult_count = int(counts_payload.get("adult", reservation.counts.get("adult", 1)))
+        child_count = int(counts_payload.get("child", reservation.counts.get("child", 0)))
+        baby_count = int(counts_payload.get("baby", reservation.counts.get("baby", 0)))
     except (TypeError, ValueError):
         return jsonify({"error": "Los conteos de huespedes deben ser numeros enteros."}), 400
 
@@ -808,16 +1126,15 @@ def modify_reservation():
         return jsonify({"error": "La cantidad de huespedes excede la capacidad de la habitacion seleccionada."}), 400
 
     if not is_room_available(
-        hotel_name, new_room_type, new_checkin, new_checkout, ignore_code=reservation["confirmation_code"]
+        hotel_name, new_room_type, new_checkin, new_checkout, ignore_code=reservation.confirmation_code
     ):
         return jsonify({"error": "No hay disponibilidad para los parametros seleccionados."}), 409
 
     counts_dict = normalize_counts(adult_count, child_count, baby_count)
     nights = max((new_checkout - new_checkin).days, 1)
-    offers = get_active_offers(hotel, new_checkin, new_checkout)
-    price_detail, applied_offers = calculate_price(room, counts_dict, nights, offers)
+    price_detail, applied_offers = quote_price(hotel, room, counts_dict, new_checkin, new_checkout)
     new_total = price_detail["total"]
-    current_total = reservation.get("total", 0)
+    current_total = reservation.total
     difference = new_total - current_total
     new_checkin_dt = datetime.combine(new_checkin, datetime.min.time())
     more_than_24 = new_checkin_dt - datetime.now() >= timedelta(hours=24)
@@ -845,21 +1162,28 @@ def modify_reservation():
     if preview_only:
         return jsonify({"preview": summary})
 
-    reservation["room_type"] = new_room_type
-    reservation["room_name"] = room.get("name", new_room_type)
-    reservation["checkin"] = format_date_output(new_checkin)
-    reservation["checkout"] = format_date_output(new_checkout)
-    reservation["counts"] = counts_dict
-    reservation["nights"] = nights
-    reservation["price_detail"] = price_detail
-    reservation["total"] = new_total
-    reservation["offer"] = ", ".join(applied_offers) if applied_offers else None
-    reservation["modification"] = {
-        "modified_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "difference": difference,
-        "payment_action": payment_action,
-        "refund_amount": refund_amount,
-    }
+    previous_span = blocking_span(reservation)
+    reservation = replace(
+        reservation,
+        room_type=new_room_type,
+        room_name=room.get("name", new_room_type),
+        checkin=new_checkin,
+        checkout=new_checkout,
+        counts=counts_dict,
+        nights=nights,
+        price_detail=price_detail,
+        total=new_total,
+        offer=", ".join(applied_offers) if applied_offers else None,
+        modification={
+            "modified_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "difference": difference,
+            "payment_action": payment_action,
+            "refund_amount": refund_amount,
+        },
+    )
+    if not storage.reserve(reservation, catalog.units(hotel_name, new_room_type), expected_status="confirmada"):
+        return jsonify({"error": "No hay disponibilidad para los parametros seleccionados."}), 409
+    invalidate_searches(previous_span, reservation)
 
     message = "Reserva actualizada correctamente."
     if payment_action == "charge":
@@ -869,7 +1193,7 @@ def modify_reservation():
     elif payment_action == "no_refund":
         message = "La reserva fue actualizada sin reembolso por realizarse dentro de las 24 h."
 
-    return jsonify({"message": message, "reservation": reservation, "summary": summary})
+    return jsonify({"message": message, "reservation": reservation.to_dict(), "summary": summary})
 
 
 @app.route("/api/price-preview", methods=["POST", "OPTIONS"])
@@ -914,9 +1238,7 @@ def price_preview():
         return jsonify({"error": "La cantidad de huéspedes excede la capacidad de la habitación seleccionada"}), 400
 
     counts = normalize_counts(adult_count, child_count, baby_count)
-    nights = max((d_checkout - d_checkin).days, 1)
-    hotel_active_offers = get_active_offers(hotel, d_checkin, d_checkout)
-    price_detail, applied_offers = calculate_price(room, counts, nights, hotel_active_offers)
+    price_detail, applied_offers = quote_price(hotel, room, counts, d_checkin, d_checkout)
 
     return jsonify(
         {
@@ -926,6 +1248,11 @@ def price_preview():
     )
 
 
+@app.route("/api/price-preview/stats", methods=["GET"])
+def price_preview_stats():
+    return jsonify(price_memo.stats())
+
+
 @app.route("/api/checkin", methods=["POST", "OPTIONS"])
 def checkin():
     if request.method == "OPTIONS":
@@ -936,28 +1263,42 @@ def checkin():
     if not code:
         return jsonify({"error": "Debe proporcionar el código de confirmación"}), 400
 
-    reservation = next((r for r in reservations if r["confirmation_code"] == code), None)
-    if not reservation or reservation["status"] != "confirmada":
+    reservation = storage.get_reservation(code)
+    if not reservation or reservation.status != "confirmada":
         return jsonify({"error": "No se puede realizar el check-in sin una reserva confirmada"}), 400
 
-    checkin_date = parse_date(reservation["checkin"])
-    if checkin_date and datetime.now() < datetime.combine(checkin_date, datetime.min.time()):
+    if datetime.now() < datetime.combine(reservation.checkin, datetime.min.time()):
         return jsonify({"error": "La fecha de check-in no puede ser anterior a la reservada"}), 400
 
-    key = (reservation["hotel"], reservation["room_type"])
-    if room_status.get(key) == "Ocupada":
+    room_number = storage.assign_room(
+        reservation.hotel,
+        reservation.room_type,
+        catalog.room_numbers.get((reservation.hotel, reservation.room_type), ()),
+    )
+    if room_number is None:
         return jsonify({"error": "La habitación ya está ocupada"}), 400
 
-    room_status[key] = "Ocupada"
-    reservation["status"] = "ocupada"
-    reservation["checkin_real"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    previous_span = blocking_span(reservation)
+    reservation = replace(
+        reservation,
+        room_number=room_number,
+        status="ocupada",
+        checkin_real=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    units = catalog.units(reservation.hotel, reservation.room_type)
+    # Si entretanto la cancelaron o ya hicieron el check-in, la habitación vuelve a quedar libre
+    if not storage.reserve(reservation, units, expected_status="confirmada"):
+        storage.release_room(reservation.hotel, reservation.room_type, room_number)
+        return jsonify({"error": "No se puede realizar el check-in sin una reserva confirmada"}), 409
+    invalidate_searches(previous_span, reservation)
 
     return jsonify(
         {
             "message": "Check-in realizado",
-            "hotel": reservation["hotel"],
-            "room_type": reservation["room_type"],
-            "checkin": reservation["checkin_real"],
+            "hotel": reservation.hotel,
+            "room_type": reservation.room_type,
+            "room_number": reservation.room_number,
+            "checkin": reservation.checkin_real,
         }
     )
 
@@ -972,44 +1313,112 @@ def checkout():
     if not code:
         return jsonify({"error": "Debe proporcionar el código de confirmación"}), 400
 
-    reservation = next((r for r in reservations if r["confirmation_code"] == code), None)
-    if not reservation or reservation.get("status") != "ocupada":
+    reservation = storage.get_reservation(code)
+    if not reservation or reservation.status != "ocupada":
         return jsonify({"error": "La habitación no se encuentra ocupada, no se puede realizar el check-out"}), 400
 
     checkout_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    reservation["status"] = "completada"
-    reservation["checkout_real"] = checkout_time
+    previous_span = blocking_span(reservation)
+    reservation.status = "completada"
+    reservation.checkout_real = checkout_time
+    # Solo el primero de dos check-outs simultáneos archiva, libera y registra la estadía
+    if storage.archive_reservation(reservation, expected_status="ocupada") is None:
+        return jsonify({"error": "La habitación no se encuentra ocupada, no se puede realizar el check-out"}), 400
+    invalidate_searches(previous_span, reservation)
 
-    key = (reservation["hotel"], reservation["room_type"])
-    room_status[key] = "Disponible"
+    if reservation.room_number is not None:
+        storage.release_room(reservation.hotel, reservation.room_type, reservation.room_number)
 
-    estadias.append(
+    storage.add_estadia(
         {
-            "confirmation_code": reservation["confirmation_code"],
-            "hotel": reservation["hotel"],
-            "room_type": reservation["room_type"],
-            "guests": reservation["guests"],
-            "checkin": reservation.get("checkin_real"),
+            "confirmation_code": reservation.confirmation_code,
+            "hotel": reservation.hotel,
+            "room_type": reservation.room_type,
+            "room_number": reservation.room_number,
+            "guests": reservation.guests,
+            "checkin": reservation.checkin_real,
             "checkout": checkout_time,
-            "total": reservation["total"],
-            "price_detail": reservation.get("price_detail"),
-            "offers": reservation.get("offers"),
+            "total": reservation.total,
+            "price_detail": reservation.price_detail,
+            "offers": reservation.offers,
         }
     )
 
     return jsonify(
         {
             "message": "Check-out realizado",
-            "hotel": reservation["hotel"],
-            "room_type": reservation["room_type"],
+            "hotel": reservation.hotel,
+            "room_type": reservation.room_type,
+            "room_number": reservation.room_number,
             "checkout": checkout_time,
         }
     )
 
 
+ESTADIAS_DEFAULT_LIMIT = 100
+ESTADIAS_MAX_LIMIT = 1000
+
+
 @app.route("/api/estadias", methods=["GET"])
 def get_estadias():
-    return jsonify(estadias)
+    """
+    Historial de estadías paginado por cursor. Filtros opcionales: hotel,
+    room_type y from/to (estadías que se solapan con esos días). Con
+    format=ndjson se transmite una estadía por línea, sin límite por defecto,
+    generando la respuesta a medida que se envía.
+    """
+    stream = request.args.get("format") == "ndjson"
+    try:
+        after_id = int(request.args.get("cursor") or 0)
+        limit_raw = request.args.get("limit")
+        limit = int(limit_raw) if limit_raw else (None if stream else ESTADIAS_DEFAULT_LIMIT)
+    except ValueError:
+        return jsonify({"error": "cursor y limit deben ser números enteros"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit debe ser un número entero positivo"}), 400
+    if limit is not None and not stream:
+        limit = min(limit, ESTADIAS_MAX_LIMIT)
+
+    filters = {
+        "hotel_name": request.args.get("hotel") or None,
+        "room_type": request.args.get("room_type") or None,
+    }
+    for arg, name in (("from", "start"), ("to", "end")):
+        raw = request.args.get(arg)
+        if raw:
+            parsed = parse_date(raw)
+            if not parsed:
+                return jsonify({"error": f"El parametro {arg} debe tener formato dd/mm/yyyy"}), 400
+            filters[name] = parsed.date().isoformat()
+
+    rows = storage.iter_estadias(after_id, **filters)
+
+    if stream:
+        def generate():
+            for count, (_, estadia) in enumerate(rows, start=1):
+                yield json.dumps(estadia, ensure_ascii=False) + "\n"
+                if limit is not None and count >= limit:
+                    break
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    items = []
+    next_cursor = None
+    for estadia_id, estadia in rows:
+        if len(items) == limit:
+            next_cursor = str(last_id)
+            break
+        items.append(estadia)
+        last_id = estadia_id
+
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if not metrics.enabled:
+        return jsonify({"error": "Las metricas estan deshabilitadas (DREAMSTAY_METRICS=1)"}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/")
@@ -1017,5 +1426,15 @@ def home():
     return "DreamStay Backend - Flask API"
 
 
+if metrics.enabled:
+    # Se cuentan las llamadas de las funciones del camino caliente; las rutas
+    # las buscan como globales del módulo, así que ven las versiones envueltas
+    parse_date = metrics.counted(parse_date)
+    available_units = metrics.counted(available_units)
+    is_room_available = metrics.counted(is_room_available)
+    quote_price = metrics.counted(quote_price)
+    calculate_prices = metrics.counted(calculate_prices)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
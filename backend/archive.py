@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+from models import Reservation
+from repository import normalize_email
+
+TERMINAL_STATUSES = ("completada", "cancelada")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_reservations (
+    confirmation_code TEXT PRIMARY KEY,
+    hotel TEXT NOT NULL,
+    contact_email TEXT NOT NULL,
+    status TEXT NOT NULL,
+    archived_at TEXT NOT NULL,
+    -- JSON compacto de la reserva comprimido con zlib
+    data BLOB NOT NULL
+);
+"""
+# Una reserva terminal no cambia más: si ya está archivada (p. ej. un
+# reintento tras una caída entre el archivo y la baja) se conserva la primera
+_INSERT = """
+INSERT OR IGNORE INTO archived_reservations (confirmation_code, hotel, contact_email, status, archived_at, data)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+_SELECT = "SELECT data FROM archived_reservations WHERE confirmation_code = ?"
+_SELECT_BY_EMAIL = "SELECT data FROM archived_reservations WHERE confirmation_code = ? AND contact_email = ?"
+_SELECT_EXISTING = "SELECT confirmation_code FROM archived_reservations WHERE confirmation_code IN ({})"
+_COUNT = "SELECT COUNT(*) FROM archived_reservations"
+# Menor que el límite de parámetros por sentencia de SQLite (999 en versiones viejas)
+_CHUNK = 500
+
+
+def _encode(reservation):
+    return zlib.compress(json.dumps(reservation.to_dict(), ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def _decode(blob):
+    return Reservation.from_dict(json.loads(zlib.decompress(blob)))
+
+
+class ReservationArchive:
+    """
+    Almacén frío de solo agregado para las reservas que llegaron a un
+    estado terminal (completada o cancelada): una tabla SQLite con la
+    reserva comprimida y las columnas necesarias para buscarla por código
+    y correo o filtrarla al exportar. El almacenamiento vivo queda solo con
+    las reservas sobre las que todavía se puede operar.
+
+    Las escrituras son poco frecuentes y las lecturas por clave primaria,
+    así que alcanza con una conexión por proceso protegida por un lock.
+    Con `path=":memory:"` el archivo vive en la memoria del proceso.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        # Tras un fork el hijo abre su propia conexión, salvo en memoria,
+        # donde la base es la copia que heredó
+        if self._conn is None or (self._pid != os.getpid() and self.path != ":memory:"):
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute(_COUNT).fetchone()[0]
+
+    def __contains__(self, code):
+        with self._lock:
+            return self._connection().execute(_SELECT, (code,)).fetchone() is not None
+
+    def append(self, reservations):
+        archived_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [
+            (
+                reservation.confirmation_code,
+                reservation.hotel,
+                normalize_email(reservation.contact_email),
+                reservation.status,
+                archived_at,
+                _encode(reservation),
+            )
+            for reservation in reservations
+        ]
+        with self._lock, self._connection() as conn:
+            conn.executemany(_INSERT, rows)
+
+    def get(self, code):
+        with self._lock:
+            row = self._connection().execute(_SELECT, (code,)).fetchone()
+        return _decode(row[0]) if row is not None else None
+
+    def find(self, code, email):
+        """Reserva archivada con ese código cuyo correo de contacto coincide (normalizado)."""
+        with self._lock:
+            row = self._connection().execute(_SELECT_BY_EMAIL, (code, normalize_email(email))).fetchone()
+        return _decode(row[0]) if row is not None else None
+
+    def existing(self, codes):
+        """Subconjunto de `codes` que ya está archivado."""
+        codes = list(codes)
+        found = set()
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(codes), _CHUNK):
+                chunk = codes[start:start + _CHUNK]
+                query = _SELECT_EXISTING.format(",".join("?" * len(chunk)))
+                found.update(row[0] for row in conn.execute(query, chunk))
+        return found
+
+    def iter_reservations(self, hotel_name=None, status=None):
+        """Reservas archivadas en orden de archivo, filtradas por hotel y estado."""
+        clauses = ["rowid > ?"]
+        params = []
+        for clause, value in (("hotel = ?", hotel_name), ("status = ?", status)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        query = "SELECT rowid, data FROM archived_reservations WHERE {} ORDER BY rowid LIMIT ?".format(
+            " AND ".join(clauses)
+        )
+        # De a tandas, para no retener el lock mientras se consume el iterador
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._connection().execute(query, [last, *params, _CHUNK]).fetchall()
+            if not rows:
+                return
+            for _, data in rows:
+                yield _decode(data)
+            last = rows[-1][0]
@@ -0,0 +1,330 @@
+import random
+from array import array
+
+from metrics import record_scan
+
+# Estados de reserva que bloquean la habitación en el calendario
+BLOCKING_STATUSES = ("confirmada", "ocupada")
+
+
+def peak_occupancy(stays, start, end):
+    """
+    Máxima cantidad de estadías simultáneas dentro de [start, end).
+    `stays` son pares (checkin, checkout) que ya se solapan con el rango.
+    """
+    events = []
+    for stay_start, stay_end in stays:
+        events.append((max(stay_start, start), 1))
+        events.append((min(stay_end, end), -1))
+    # Con fechas iguales, las salidas (-1) se procesan antes que las entradas
+    events.sort()
+    current = peak = 0
+    for _, delta in events:
+        current += delta
+        if current > peak:
+            peak = current
+    return peak
+
+
+class _Node:
+    __slots__ = ("start", "end", "code", "priority", "max_end", "left", "right")
+
+    def __init__(self, start, end, code):
+        self.start = start
+        self.end = end
+        self.code = code
+        self.priority = random.random()
+        self.max_end = end
+        self.left = None
+        self.right = None
+
+    def key(self):
+        return (self.start, self.end, self.code)
+
+    def update(self):
+        max_end = self.end
+        if self.left is not None and self.left.max_end > max_end:
+            max_end = self.left.max_end
+        if self.right is not None and self.right.max_end > max_end:
+            max_end = self.right.max_end
+        self.max_end = max_end
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    node.update()
+    pivot.update()
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    node.update()
+    pivot.update()
+    return pivot
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.key() < node.key():
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            node = _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            node = _rotate_left(node)
+    node.update()
+    return node
+
+
+def _delete(node, key):
+    if node is None:
+        return None
+    node_key = node.key()
+    if key < node_key:
+        node.left = _delete(node.left, key)
+    elif key > node_key:
+        node.right = _delete(node.right, key)
+    else:
+        if node.left is None:
+            return node.right
+        if node.right is None:
+            return node.left
+        if node.left.priority > node.right.priority:
+            node = _rotate_right(node)
+            node.right = _delete(node.right, key)
+        else:
+            node = _rotate_left(node)
+            node.left = _delete(node.left, key)
+    node.update()
+    return node
+
+
+class IntervalTree:
+    """
+    Árbol de intervalos semiabiertos [start, end) implementado como treap
+    aumentado con el máximo `end` de cada subárbol.
+    Inserción, borrado y consulta de solapamiento en O(log n) esperado.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, start, end, code):
+        self._root = _insert(self._root, _Node(start, end, code))
+        self._size += 1
+
+    def remove(self, start, end, code):
+        self._root = _delete(self._root, (start, end, code))
+        self._size -= 1
+
+    def overlaps(self, start, end):
+        """Itera (start, end, code) de los intervalos que se solapan con [start, end)."""
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            # Ningún intervalo de este subárbol termina después de `start`
+            if node.max_end <= start:
+                continue
+            if node.left is not None:
+                stack.append(node.left)
+            # Los nodos a la derecha empiezan igual o más tarde que este
+            if node.start < end:
+                if node.end > start:
+                    yield node.start, node.end, node.code
+                if node.right is not None:
+                    stack.append(node.right)
+
+    def has_overlap(self, start, end, ignore_code=None):
+        for _, _, code in self.overlaps(start, end):
+            if code != ignore_code:
+                return True
+        return False
+
+
+class OccupancyCalendar:
+    """
+    Ocupación por noche de un tipo de habitación en un arreglo compacto
+    indexado por día, con un árbol de segmentos de máximos encima.
+    Agregar o quitar una estadía cuesta O(noches) y consultar el pico de
+    ocupación de un rango cuesta O(log días).
+
+    Las escrituras van bajo el lock del tipo de habitación pero las
+    consultas no: el origen, el tamaño y el árbol viven en una sola tupla
+    que se reemplaza entera al crecer, y cada consulta la lee una vez, así
+    nunca mezcla valores de antes y después de crecer.
+    """
+
+    _MIN_SIZE = 512
+
+    def __init__(self):
+        # (ordinal del día 0, cantidad de hojas, árbol) o None si está vacío
+        self._layout = None
+        # Rango de días efectivamente escrito (ordinales inclusive)
+        self._used = None
+
+    def _ensure(self, first, last):
+        layout = self._layout
+        if layout is not None and layout[0] <= first and last < layout[0] + layout[1]:
+            return layout
+        lo, hi = first, last
+        if self._used is not None:
+            lo, hi = min(lo, self._used[0]), max(hi, self._used[1])
+        span = hi - lo + 1
+        size = self._MIN_SIZE
+        while size < 2 * span:
+            size *= 2
+        # Se deja margen a ambos lados para crecer sin reconstruir enseguida
+        origin = lo - (size - span) // 2
+        tree = array("H", bytes(2 * size * 2))
+        if self._used is not None:
+            old_origin, old_size, old_tree = layout
+            used_lo, used_hi = self._used
+            old = old_tree[old_size + used_lo - old_origin:old_size + used_hi - old_origin + 1]
+            tree[size + used_lo - origin:size + used_hi - origin + 1] = old
+        for node in range(size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self._layout = (origin, size, tree)
+        return self._layout
+
+    def add(self, start, end, delta):
+        first, last = start.toordinal(), end.toordinal() - 1
+        if last < first:
+            return
+        origin, size, tree = self._ensure(first, last)
+        self._used = (first, last) if self._used is None else (
+            min(first, self._used[0]), max(last, self._used[1])
+        )
+        lo = first - origin + size
+        hi = last - origin + size
+        for node in range(lo, hi + 1):
+            tree[node] += delta
+        # Se recalculan los máximos nivel por nivel solo sobre el tramo afectado
+        lo //= 2
+        hi //= 2
+        while lo >= 1:
+            for node in range(lo, hi + 1):
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            lo //= 2
+            hi //= 2
+
+    def peak(self, start, end):
+        layout = self._layout
+        if layout is None:
+            return 0
+        origin, size, tree = layout
+        first = max(start.toordinal(), origin) - origin
+        last = min(end.toordinal(), origin + size) - origin
+        if last <= first:
+            return 0
+        lo, hi = first + size, last + size
+        peak = 0
+        while lo < hi:
+            if lo & 1:
+                peak = max(peak, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                peak = max(peak, tree[hi])
+            lo //= 2
+            hi //= 2
+        return peak
+
+    def nights(self, start, end):
+        """Ocupación de cada noche de [start, end) como lista de enteros."""
+        layout = self._layout
+        if layout is None:
+            return [0] * (end - start).days
+        origin, size, tree = layout
+        counts = []
+        for ordinal in range(start.toordinal(), end.toordinal()):
+            offset = ordinal - origin
+            counts.append(tree[size + offset] if 0 <= offset < size else 0)
+        return counts
+
+
+class AvailabilityIndex:
+    """
+    Índice de estadías bloqueantes (confirmadas u ocupadas) por
+    (hotel, tipo de habitación): un árbol de intervalos y un calendario de
+    ocupación por noche. Se mantiene incrementalmente con `sync` cada vez
+    que una reserva cambia de estado o de fechas.
+    """
+
+    def __init__(self):
+        self._trees = {}
+        self._calendars = {}
+        # confirmation_code -> (key, start, end) de la entrada indexada
+        self._entries = {}
+
+    def _discard(self, code):
+        entry = self._entries.pop(code, None)
+        if entry is None:
+            return
+        key, start, end = entry
+        tree = self._trees[key]
+        tree.remove(start, end, code)
+        if not tree:
+            del self._trees[key]
+        self._calendars[key].add(start, end, -1)
+
+    def sync(self, reservation):
+        code = reservation.confirmation_code
+        self._discard(code)
+        if reservation.status not in BLOCKING_STATUSES:
+            return
+        start, end = reservation.checkin, reservation.checkout
+        key = (reservation.hotel, reservation.room_type)
+        self._trees.setdefault(key, IntervalTree()).add(start, end, code)
+        self._calendars.setdefault(key, OccupancyCalendar()).add(start, end, 1)
+        self._entries[code] = (key, start, end)
+
+    def remove(self, code):
+        """Saca del índice la estadía de una reserva que deja de existir."""
+        self._discard(code)
+
+    def rebuild(self, reservations):
+        self._trees = {}
+        self._calendars = {}
+        self._entries = {}
+        for reservation in reservations:
+            self.sync(reservation)
+
+    def has_overlap(self, hotel_name, room_type, start, end, ignore_code=None):
+        tree = self._trees.get((hotel_name, room_type))
+        if tree is None:
+            return False
+        return tree.has_overlap(start, end, ignore_code)
+
+    def peak_occupancy(self, hotel_name, room_type, start, end, ignore_code=None):
+        key = (hotel_name, room_type)
+        tree = self._trees.get(key)
+        if tree is None:
+            return 0
+        ignored = self._entries.get(ignore_code) if ignore_code else None
+        if ignored is None or ignored[0] != key or not (ignored[1] < end and start < ignored[2]):
+            return self._calendars[key].peak(start, end)
+        # La estadía a ignorar cae en el rango: se barre el árbol sin ella
+        stays = [
+            (stay_start, stay_end)
+            for stay_start, stay_end, code in tree.overlaps(start, end)
+            if code != ignore_code
+        ]
+        record_scan("indice", len(stays))
+        return peak_occupancy(stays, start, end)
+
+    def nightly_occupancy(self, hotel_name, room_type, start, end):
+        calendar = self._calendars.get((hotel_name, room_type))
+        if calendar is None:
+            return [0] * (end - start).days
+        return calendar.nights(start, end)
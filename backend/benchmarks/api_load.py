@@ -0,0 +1,301 @@
+"""
+Benchmark de la API de reservas bajo carga: arma un catálogo sintético
+(hoteles x tipos de habitación x ofertas) y un historial de reservas,
+y mide throughput y latencias p50/p90/p99 de búsqueda, cotización, alta de
+reserva, pago, check-in y check-out. Se puede correr contra el test client
+de Flask (en proceso) y/o contra un gunicorn local con SQLite; el
+resultado sale en JSON para comparar corridas antes de un deploy.
+
+    python benchmarks/api_load.py --hotels 200 --history 100000 --requests 2000
+    python benchmarks/api_load.py --mode gunicorn --workers 4 --concurrency 16 --output resultados.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from synthetic import CITIES, generate_catalog, generate_history
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+GUEST = {"name": "Ana Perez", "birth": "01/01/1990"}
+
+
+class TestClientDriver:
+    def __init__(self, client):
+        self._client = client
+
+    def request(self, method, path, payload=None):
+        response = self._client.open(path, method=method, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self._base_url = base_url
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(
+            self._base_url + path, data=body, method=method, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+def _fmt(day):
+    return day.strftime("%d/%m/%Y")
+
+
+def _summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+
+
+def run_phase(driver, calls, concurrency):
+    """Ejecuta `calls` [(método, ruta, cuerpo)] y devuelve (resumen, respuestas exitosas)."""
+
+    def timed(call):
+        started = time.perf_counter()
+        status, body = driver.request(*call)
+        return time.perf_counter() - started, status, body
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, calls))
+    else:
+        outcomes = [timed(call) for call in calls]
+    elapsed = time.perf_counter() - started
+    errors = sum(1 for _, status, _ in outcomes if status != 200)
+    succeeded = [body for _, status, body in outcomes if status == 200]
+    return _summary([latency for latency, _, _ in outcomes], errors, elapsed), succeeded
+
+
+def run_scenario(driver, catalog, args, rng):
+    today = date.today()
+    rooms = [(hotel["name"], room["type"]) for hotel in catalog for room in hotel["rooms"]]
+    results = {}
+
+    search_calls = []
+    for _ in range(args.requests):
+        checkin = today + timedelta(days=rng.randint(1, 120))
+        query = {
+            "city": rng.choice(CITIES),
+            "from": _fmt(checkin),
+            "to": _fmt(checkin + timedelta(days=rng.randint(1, 7))),
+            "roomType": "Todos",
+            "adults": rng.randint(1, 2),
+        }
+        search_calls.append(("GET", "/api/hotels/search?" + urlencode(query), None))
+    results["search"], _ = run_phase(driver, search_calls, args.concurrency)
+
+    preview_calls = []
+    for _ in range(args.requests):
+        hotel_name, room_type = rng.choice(rooms)
+        checkin = today + timedelta(days=rng.randint(1, 365))
+        preview_calls.append((
+            "POST",
+            "/api/price-preview",
+            {
+                "hotel": hotel_name,
+                "room_type": room_type,
+                "checkin": _fmt(checkin),
+                "checkout": _fmt(checkin + timedelta(days=rng.randint(1, 7))),
+                "counts": {"adult": rng.randint(1, 2)},
+            },
+        ))
+    results["price_preview"], _ = run_phase(driver, preview_calls, args.concurrency)
+
+    # Flujo completo con entrada hoy, para que el check-in sea válido
+    booking_calls = []
+    for index in range(args.requests):
+        hotel_name, room_type = rooms[index % len(rooms)]
+        booking_calls.append((
+            "POST",
+            "/api/reservations",
+            {
+                "contact_email": f"bench{index}@dreamstay.test",
+                "hotel": hotel_name,
+                "room_type": room_type,
+                "checkin": _fmt(today),
+                "checkout": _fmt(today + timedelta(days=rng.randint(1, 3))),
+                "guests": [GUEST],
+            },
+        ))
+    results["reservations"], booked = run_phase(driver, booking_calls, args.concurrency)
+
+    payment_calls = [
+        (
+            "POST",
+            "/api/payments",
+            {
+                "confirmation_code": reservation["confirmation_code"],
+                "email": reservation["contact_email"],
+                "cardholder": "Ana Perez",
+                "card_number": "4111111111111111",
+                "expiration": "12/39",
+                "cvv": "123",
+                "receipt_email": reservation["contact_email"],
+            },
+        )
+        for reservation in booked
+    ]
+    results["payments"], paid = run_phase(driver, payment_calls, args.concurrency)
+
+    codes = [{"confirmation_code": item["reservation"]["confirmation_code"]} for item in paid]
+    results["checkin"], _ = run_phase(driver, [("POST", "/api/checkin", code) for code in codes], args.concurrency)
+    results["checkout"], _ = run_phase(driver, [("POST", "/api/checkout", code) for code in codes], args.concurrency)
+    return results
+
+
+def seed_history(storage, catalog_units, catalog, rows):
+    started = time.perf_counter()
+    history = list(generate_history(catalog, rows))
+    keys = {(item.hotel, item.room_type) for item in history}
+    rejected = storage.bulk_reserve(history, {key: catalog_units(*key) for key in keys}, all_or_nothing=False)
+    # Como al arrancar la app: las completadas y canceladas pasan al archivo
+    archived = storage.archive_terminal()
+    return {
+        "rows": rows,
+        "rejected": len(rejected),
+        "archived": archived,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def run_test_client(catalog_path, catalog, args, workdir):
+    os.environ["DREAMSTAY_CATALOG"] = catalog_path
+    os.environ["DREAMSTAY_CATALOG_CACHE"] = os.path.join(workdir, "cache")
+    if args.storage == "sqlite":
+        os.environ["DREAMSTAY_STORAGE"] = "sqlite://" + os.path.join(workdir, "client.db")
+    import app
+
+    seeded = seed_history(app.storage, app.catalog.units, catalog, args.history)
+    results = run_scenario(TestClientDriver(app.app.test_client()), catalog, args, random.Random(args.seed))
+    return {"seed": seeded, "endpoints": results}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(catalog_path, catalog, args, workdir):
+    from catalog import load_catalog
+    from storage import SQLiteStorage
+
+    db_path = os.path.join(workdir, "gunicorn.db")
+    cache_dir = os.path.join(workdir, "cache")
+    storage = SQLiteStorage(db_path)
+    units = load_catalog(catalog_path, lambda value: None, cache_dir).units
+    seeded = seed_history(storage, units, catalog, args.history)
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DREAMSTAY_CATALOG=catalog_path,
+        DREAMSTAY_CATALOG_CACHE=cache_dir,
+        DREAMSTAY_STORAGE=f"sqlite://{db_path}",
+        DREAMSTAY_BIND=f"127.0.0.1:{port}",
+        WEB_CONCURRENCY=str(args.workers),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        driver = HttpDriver(f"http://127.0.0.1:{port}")
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).close()
+                break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn no arrancó") from None
+                time.sleep(0.2)
+        results = run_scenario(driver, catalog, args, random.Random(args.seed))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {"seed": seeded, "workers": args.workers, "endpoints": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("client", "gunicorn", "both"), default="client")
+    parser.add_argument("--hotels", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--offers", type=int, default=3)
+    parser.add_argument("--history", type=int, default=10_000, help="Reservas previas (10^3 a 10^6)")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests por endpoint")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory", help="Solo modo client")
+    parser.add_argument("--workers", type=int, default=2, help="Workers de gunicorn")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dreamstay-bench-")
+    try:
+        catalog = generate_catalog(args.hotels, args.rooms, args.offers, seed=args.seed)
+        catalog_path = os.path.join(workdir, "hotels.json")
+        with open(catalog_path, "w", encoding="utf-8") as target:
+            json.dump(catalog, target, ensure_ascii=False)
+
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "python": platform.python_version(),
+            "date": date.today().isoformat(),
+            "runs": {},
+        }
+        if args.mode in ("client", "both"):
+            report["runs"]["test_client"] = run_test_client(catalog_path, catalog, args, workdir)
+        if args.mode in ("gunicorn", "both"):
+            report["runs"]["gunicorn"] = run_gunicorn(catalog_path, catalog, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as target:
+            target.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
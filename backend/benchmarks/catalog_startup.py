@@ -0,0 +1,77 @@
+"""
+Benchmark de arranque en frío de un worker: genera un catálogo sintético
+(hoteles x tipos de habitación x ofertas) y mide, cada vez en un proceso
+nuevo, cuánto tarda importar la app y cuánto el primer acceso al
+catálogo, sin caché compilado (primer arranque) y con él (arranques
+siguientes).
+
+    python benchmarks/catalog_startup.py --hotels 5000 --rooms 6 --offers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from synthetic import generate_catalog
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.catalog.load()
+loaded = time.perf_counter()
+print(json.dumps({"import": imported - started, "catalog": loaded - imported}))
+"""
+
+
+def run_worker(catalog_path, cache_dir):
+    env = dict(os.environ, DREAMSTAY_CATALOG=catalog_path, DREAMSTAY_CATALOG_CACHE=cache_dir)
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=6)
+    parser.add_argument("--offers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dreamstay-startup-")
+    try:
+        catalog_path = os.path.join(workdir, "hotels.json")
+        with open(catalog_path, "w", encoding="utf-8") as target:
+            json.dump(generate_catalog(args.hotels, args.rooms, min(args.offers, 12)), target, ensure_ascii=False)
+        size_mb = os.path.getsize(catalog_path) / 1e6
+        print(f"catálogo: {args.hotels} hoteles x {args.rooms} tipos x {args.offers} ofertas ({size_mb:.1f} MB)")
+
+        cache_dir = os.path.join(workdir, "cache")
+        results = {"sin caché": [], "con caché": []}
+        for _ in range(args.runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            results["sin caché"].append(run_worker(catalog_path, cache_dir))
+            results["con caché"].append(run_worker(catalog_path, cache_dir))
+
+        for label, runs in results.items():
+            best_import = min(run["import"] for run in runs)
+            best_catalog = min(run["catalog"] for run in runs)
+            print(
+                f"{label}: import de la app {best_import * 1000:.0f} ms, "
+                f"primer acceso al catálogo {best_catalog * 1000:.0f} ms "
+                f"(mejor de {len(runs)})"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark de memoria del almacenamiento en memoria: carga el mismo
+historial sintético de reservas y estadías en las estructuras anteriores
+(registros `Reservation` en un dict por código y una lista de dicts)
+y en las tablas columnares, y compara los bytes retenidos por fila, el
+tamaño del snapshot del journal y el costo de dar de alta, leer, pagar y
+volver a leer una reserva, y de leer una que no se usó hace rato.
+
+    python benchmarks/columnar_memory.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import replace
+
+from synthetic import generate_catalog, generate_history
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import EstadiaTable, ReservationTable  # noqa: E402
+from models import Reservation  # noqa: E402
+
+FIRST_NAMES = ["Ana", "Juan", "Lucia", "Martin", "Sofia", "Pedro", "Carla", "Diego", "Valeria", "Tomas"]
+LAST_NAMES = ["Perez", "Gomez", "Rodriguez", "Fernandez", "Lopez", "Diaz", "Martinez", "Sosa", "Romero", "Alvarez"]
+
+
+def generate_rows(catalog, rows, seed):
+    """
+    Reservas del historial sintético con huéspedes variados y objetos
+    propios por fila, como quedan al leerlas del journal o de la API.
+    """
+    rng = random.Random(seed)
+    for reservation in generate_history(catalog, rows, seed):
+        guests = [
+            {
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "birth": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2005)}",
+                "age": rng.randint(20, 75),
+                "category": "adult",
+            }
+            for _ in range(rng.randint(1, 3))
+        ]
+        reservation = replace(reservation, guests=guests)
+        # Ida y vuelta por JSON: ningún dict ni lista compartido entre filas
+        yield Reservation.from_dict(json.loads(json.dumps(reservation.to_dict())))
+
+
+def to_estadia(reservation):
+    return {
+        "confirmation_code": reservation.confirmation_code,
+        "hotel": reservation.hotel,
+        "room_type": reservation.room_type,
+        "room_number": "101",
+        "guests": reservation.guests,
+        "checkin": f"{reservation.checkin.isoformat()} 14:00:00",
+        "checkout": f"{reservation.checkout.isoformat()} 10:00:00",
+        "total": reservation.total,
+        "price_detail": reservation.price_detail,
+        "offers": reservation.offers,
+    }
+
+
+def retained(build):
+    """(estructura, bytes que quedan asignados después de construirla)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    structure = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return structure, after - before
+
+
+def build_records(rows):
+    return {reservation.confirmation_code: reservation for reservation in rows}
+
+
+def build_table(rows):
+    table = ReservationTable()
+    for reservation in rows:
+        table.save(reservation)
+    return table
+
+
+def build_estadia_table(rows):
+    table = EstadiaTable()
+    table.extend(rows)
+    return table
+
+
+def timing(structure, sample, cold_codes):
+    """
+    µs por operación en el camino de una reserva: alta, lectura, pago (se
+    guarda con otro estado) y lectura posterior; además la lectura de filas
+    que nadie tocó hace rato (fuera de la caché de filas de la tabla).
+    """
+    save = structure.save if isinstance(structure, ReservationTable) else (
+        lambda reservation: structure.__setitem__(reservation.confirmation_code, reservation)
+    )
+    payment = {"cardholder": "Ana Perez", "card_last4": "1111", "paid_at": "2026-01-01 10:00:00"}
+    elapsed = [0.0] * 4
+    for reservation in sample:
+        code = reservation.confirmation_code
+        started = time.perf_counter()
+        save(reservation)
+        saved = time.perf_counter()
+        current = structure.get(code)
+        read = time.perf_counter()
+        save(replace(current, status="confirmada", payment=payment, expires_at=None))
+        paid = time.perf_counter()
+        structure.get(code)
+        done = time.perf_counter()
+        for index, (begin, end) in enumerate(((started, saved), (saved, read), (read, paid), (paid, done))):
+            elapsed[index] += end - begin
+    started = time.perf_counter()
+    for code in cold_codes:
+        structure.get(code)
+    cold = (time.perf_counter() - started) / len(cold_codes) * 1e6
+    return [value / len(sample) * 1e6 for value in elapsed] + [cold]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--hotels", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.hotels, 4, 3, seed=args.seed)
+    # Serializadas de antemano: dentro de la medición solo se arman los objetos
+    blobs = [pickle.dumps(item) for item in generate_rows(catalog, args.rows, args.seed)]
+    rows = lambda: (pickle.loads(blob) for blob in blobs)  # noqa: E731
+
+    print(f"{args.rows} reservas de {args.hotels} hoteles")
+    results = {}
+    for label, build in (("registros", build_records), ("columnar", build_table)):
+        structure, size = retained(lambda: build(rows()))
+        snapshot = len(pickle.dumps(list(structure.values()) if label == "registros" else structure.copy(), protocol=5))
+        sample = list(generate_rows(catalog, 10_000, args.seed + 1))
+        cold_codes = [reservation.confirmation_code for _, reservation in zip(range(10_000), rows())]
+        save_us, get_us, update_us, reread_us, cold_us = timing(structure, sample, cold_codes)
+        results[label] = size
+        print(
+            f"  reservas {label}: {size / args.rows:,.0f} bytes/reserva en memoria, "
+            f"{snapshot / args.rows:,.0f} bytes/reserva en el snapshot\n"
+            f"    alta {save_us:.1f} µs, get {get_us:.1f} µs, pago {update_us:.1f} µs, "
+            f"get {reread_us:.1f} µs, get en frío {cold_us:.1f} µs"
+        )
+        del structure
+    print(f"  reducción: {results['registros'] / results['columnar']:.1f}x")
+
+    for label, build in (("dicts", list), ("columnar", build_estadia_table)):
+        structure, size = retained(lambda: build(to_estadia(item) for item in rows()))
+        results[label] = size
+        print(f"  estadías {label}: {size / args.rows:,.0f} bytes/estadía en memoria")
+        del structure
+    print(f"  reducción: {results['dicts'] / results['columnar']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
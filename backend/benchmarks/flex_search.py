@@ -0,0 +1,115 @@
+"""
+Benchmark de la búsqueda con fechas flexibles: sobre un catálogo y un
+historial sintéticos compara una búsqueda con `flexDays=N` contra las
+(2N+1)² búsquedas comunes que haría el huésped corriendo las fechas a
+mano, y verifica que ambas elijan el mismo precio por noche en cada
+habitación. Las cachés de búsqueda y de precios se desactivan para medir
+el cálculo completo.
+
+    python benchmarks/flex_search.py --hotels 200 --history 50000 --flex 3
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from synthetic import CITIES, generate_catalog, generate_history
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _fmt(day):
+    return day.strftime("%d/%m/%Y")
+
+
+def brute_force(client, query, checkin, checkout, flex, today):
+    """Mejor precio por noche de cada (hotel, habitación) entre todas las búsquedas comunes."""
+    best = {}
+    for start_offset in range(-flex, flex + 1):
+        start = checkin + timedelta(days=start_offset)
+        if start < today:
+            continue
+        for end_offset in range(-flex, flex + 1):
+            end = checkout + timedelta(days=end_offset)
+            if end <= start:
+                continue
+            params = dict(query, **{"from": _fmt(start), "to": _fmt(end)})
+            for hotel in client.get("/api/hotels/search?" + urlencode(params)).get_json():
+                for room in hotel["rooms"]:
+                    key = (hotel["hotel"], room["type"])
+                    best[key] = min(best.get(key, room["price_per_night"]), room["price_per_night"])
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--offers", type=int, default=3)
+    parser.add_argument("--history", type=int, default=20_000)
+    parser.add_argument("--flex", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dreamstay-flex-")
+    try:
+        catalog = generate_catalog(args.hotels, args.rooms, args.offers, seed=args.seed)
+        catalog_path = os.path.join(workdir, "hotels.json")
+        with open(catalog_path, "w", encoding="utf-8") as target:
+            json.dump(catalog, target, ensure_ascii=False)
+        os.environ["DREAMSTAY_CATALOG"] = catalog_path
+        os.environ["DREAMSTAY_CATALOG_CACHE"] = os.path.join(workdir, "cache")
+        os.environ["DREAMSTAY_SEARCH_CACHE_SIZE"] = "0"
+        os.environ["DREAMSTAY_PRICE_MEMO_SIZE"] = "0"
+        import app
+
+        history = list(generate_history(catalog, args.history, args.seed))
+        keys = {(item.hotel, item.room_type) for item in history}
+        app.storage.bulk_reserve(history, {key: app.catalog.units(*key) for key in keys}, all_or_nothing=False)
+        client = app.app.test_client()
+
+        rng = random.Random(args.seed)
+        today = date.today()
+        flex_seconds = brute_seconds = 0.0
+        mismatches = 0
+        for _ in range(args.queries):
+            checkin = today + timedelta(days=rng.randint(1, 120))
+            checkout = checkin + timedelta(days=rng.randint(1, 7))
+            query = {"city": rng.choice(CITIES), "roomType": "Todos", "adults": rng.randint(1, 2)}
+
+            started = time.perf_counter()
+            flexible = client.get(
+                "/api/hotels/search?"
+                + urlencode(dict(query, **{"from": _fmt(checkin), "to": _fmt(checkout), "flexDays": args.flex}))
+            ).get_json()
+            flex_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            expected = brute_force(client, query, checkin, checkout, args.flex, today)
+            brute_seconds += time.perf_counter() - started
+
+            found = {
+                (hotel["hotel"], room["type"]): room["price_per_night"]
+                for hotel in flexible
+                for room in hotel["rooms"]
+            }
+            mismatches += sum(1 for key in found.keys() | expected.keys() if found.get(key) != expected.get(key))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    windows = (2 * args.flex + 1) ** 2
+    print(f"{args.hotels} hoteles, {args.history} reservas previas, flexDays={args.flex} ({windows} ventanas)")
+    print(f"  flexible: {flex_seconds / args.queries * 1000:,.1f} ms por búsqueda")
+    print(f"  {windows} búsquedas comunes: {brute_seconds / args.queries * 1000:,.1f} ms")
+    print(f"  aceleración: {brute_seconds / flex_seconds:.1f}x, diferencias: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark del journal del almacenamiento en memoria: registra un millón de
+eventos (altas, pagos, check-in/out y estadías) y mide cuánto tarda en
+reconstruirse el estado solo desde el log y desde un snapshot más la cola
+del log.
+
+    python benchmarks/journal_recovery.py --events 1000000
+    python benchmarks/journal_recovery.py --events 200000 --dir /tmp/journal
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import Journal  # noqa: E402
+from models import Reservation  # noqa: E402
+from storage import MemoryStorage  # noqa: E402
+
+HOTELS = [("Hotel Central", "Doble", [str(n) for n in range(101, 121)]), ("Hotel Playa", "Suite", ["11", "12"])]
+
+TEMPLATE = Reservation(
+    confirmation_code="",
+    hotel="",
+    room_type="",
+    room_name="",
+    contact_email="bench@dreamstay.test",
+    checkin=date(2030, 1, 1),
+    checkout=date(2030, 1, 3),
+    guests=[{"name": "Ana Perez", "birth": "01/01/1990", "age": 36, "category": "adult"}],
+    price_detail={
+        "nights": 2,
+        "counts": {"adult": 1, "child": 0, "baby": 0},
+        "per_night": {"adult": 100.0, "child": 50.0, "baby": 0.0},
+        "subtotal_per_night": 100.0,
+        "total": 200.0,
+    },
+    total=200.0,
+    offer=None,
+    offers=[],
+    counts={"adult": 1, "child": 0, "baby": 0},
+    nights=2,
+    status="pendiente_pago",
+)
+
+
+def _booking_events(storage, index):
+    """Ciclo de vida completo de una reserva: 7 eventos en el journal."""
+    hotel_name, room_type, numbers = HOTELS[index % len(HOTELS)]
+    checkin = date(2030, 1, 1) + timedelta(days=index // 50)
+    reservation = replace(
+        TEMPLATE,
+        confirmation_code=f"B{index:07d}",
+        hotel=hotel_name,
+        room_type=room_type,
+        room_name=room_type,
+        checkin=checkin,
+        checkout=checkin + timedelta(days=2),
+    )
+    storage.save_reservation(reservation)
+    reservation = replace(reservation, status="confirmada", payment={"amount": 200.0, "card_last4": "1111"})
+    storage.save_reservation(reservation)
+    room_number = storage.assign_room(hotel_name, room_type, numbers)
+    reservation = replace(reservation, status="ocupada", room_number=room_number)
+    storage.save_reservation(reservation)
+    reservation = replace(reservation, status="completada")
+    storage.save_reservation(reservation)
+    storage.release_room(hotel_name, room_type, room_number)
+    storage.add_estadia(
+        {
+            "confirmation_code": reservation.confirmation_code,
+            "hotel": hotel_name,
+            "room_type": room_type,
+            "room_number": room_number,
+            "guests": reservation.guests,
+            "checkin": f"{checkin.isoformat()} 14:00:00",
+            "checkout": f"{reservation.checkout.isoformat()} 10:00:00",
+            "total": reservation.total,
+            "price_detail": reservation.price_detail,
+            "offers": reservation.offers,
+        }
+    )
+
+
+def _write(directory, events, snapshot_at):
+    storage = MemoryStorage(journal=Journal(directory, snapshot_every=0))
+    started = time.perf_counter()
+    written = 0
+    index = 0
+    snapshotted = False
+    while written < events:
+        _booking_events(storage, index)
+        index += 1
+        written += 7
+        if snapshot_at and not snapshotted and written >= snapshot_at:
+            storage.journal.snapshot()
+            snapshotted = True
+    storage.journal.close()
+    return written, time.perf_counter() - started
+
+
+def _recover(directory):
+    started = time.perf_counter()
+    storage = MemoryStorage(journal=Journal(directory, snapshot_every=0))
+    elapsed = time.perf_counter() - started
+    counts = (len(storage.reservations), len(storage.estadias))
+    storage.journal.close()
+    return counts, elapsed
+
+
+def _disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--tail", type=float, default=0.1, help="Fracción de eventos posteriores al snapshot")
+    parser.add_argument("--dir", help="Directorio de trabajo (por defecto uno temporal)")
+    args = parser.parse_args()
+
+    base = args.dir or tempfile.mkdtemp(prefix="dreamstay-journal-")
+    try:
+        for label, snapshot_at in (
+            ("solo log", 0),
+            ("snapshot + cola", int(args.events * (1 - args.tail))),
+        ):
+            directory = os.path.join(base, "snapshot" if snapshot_at else "log")
+            shutil.rmtree(directory, ignore_errors=True)
+            written, write_time = _write(directory, args.events, snapshot_at)
+            size = _disk_usage(directory)
+            (reservations, estadias), recovery_time = _recover(directory)
+            print(
+                f"{label}: {written} eventos escritos en {write_time:.2f}s "
+                f"({written / write_time:,.0f}/s, {size / written:.0f} bytes/evento en disco); "
+                f"recuperación en {recovery_time:.2f}s -> {reservations} reservas, {estadias} estadías"
+            )
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark del calendario de tarifas: cotiza estadías al azar de distintos
+largos sobre un catálogo sintético con ofertas y compara el costo de
+`RateCalendar.quote` (sumas prefijas) contra resolver las ofertas noche
+por noche, que es lo que haría falta para cobrar bien cada noche sin el
+calendario, y contra `calculate_prices` (el lote vectorizado). También
+verifica que los tres den el mismo total.
+
+    python benchmarks/rate_calendar.py --hotels 200 --offers 6 --stays 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from synthetic import generate_catalog
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog  # noqa: E402
+from pricing import calculate_prices, resolve_rates  # noqa: E402
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return None
+
+
+def nightly_quote(catalog, hotel, room, counts, start, end):
+    total = 0.0
+    day = start
+    while day < end:
+        next_day = day + timedelta(days=1)
+        (adult, child, baby), _ = resolve_rates(room, catalog.active_offers(hotel["name"], day, next_day))
+        total += adult * counts["adult"] + child * counts["child"] + baby * counts["baby"]
+        day = next_day
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--offers", type=int, default=6)
+    parser.add_argument("--stays", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    hotels = generate_catalog(args.hotels, args.rooms, args.offers, seed=args.seed)
+    catalog = Catalog(hotels, parse_date)
+    rooms = [(hotel, room) for hotel in hotels for room in hotel["rooms"]]
+    counts = {"adult": 2, "child": 1, "baby": 0}
+
+    started = time.perf_counter()
+    for hotel, room in rooms:
+        catalog.rate_calendar(hotel["name"], room["type"])
+    print(f"{len(rooms)} calendarios armados en {(time.perf_counter() - started) * 1000:,.1f} ms")
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    for max_nights in (3, 14, 60):
+        stays = []
+        for _ in range(args.stays):
+            hotel, room = rng.choice(rooms)
+            start = today + timedelta(days=rng.randint(0, 365))
+            stays.append((hotel, room, start, start + timedelta(days=rng.randint(1, max_nights))))
+
+        started = time.perf_counter()
+        fast = [
+            catalog.rate_calendar(hotel["name"], room["type"]).quote(counts, start, end)[0]["total"]
+            for hotel, room, start, end in stays
+        ]
+        calendar_us = (time.perf_counter() - started) / len(stays) * 1e6
+
+        started = time.perf_counter()
+        batch = calculate_prices(
+            [catalog.rate_calendar(hotel["name"], room["type"]) for hotel, room, _, _ in stays],
+            [counts] * len(stays),
+            [start for _, _, start, _ in stays],
+            [end for _, _, _, end in stays],
+        )
+        batch_us = (time.perf_counter() - started) / len(stays) * 1e6
+
+        started = time.perf_counter()
+        slow = [nightly_quote(catalog, hotel, room, counts, start, end) for hotel, room, start, end in stays]
+        nightly_us = (time.perf_counter() - started) / len(stays) * 1e6
+
+        mismatches = sum(1 for a, b in zip(fast, slow) if abs(a - b) > 0.01)
+        mismatches += sum(1 for a, b in zip(fast, batch.totals()) if a != b)
+        print(
+            f"  estadías de 1 a {max_nights} noches: calendario {calendar_us:.1f} µs, lote {batch_us:.1f} µs, "
+            f"noche por noche {nightly_us:.1f} µs ({nightly_us / calendar_us:.0f}x), diferencias: {mismatches}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Prueba de estrés de concurrencia: lanza miles de reservas y pagos en
+paralelo contra un mismo tipo de habitación y verifica que en ningún día
+haya más estadías confirmadas que habitaciones físicas del tipo.
+
+    python benchmarks/stress_booking.py --bookings 2000 --threads 64
+    python benchmarks/stress_booking.py --processes 4 --db /tmp/dreamstay.db
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HOTEL = "Hotel Central"
+ROOM_TYPE = "Doble"
+EMAIL = "stress@dreamstay.test"
+
+
+def _stay_dates(rng):
+    start = datetime.now() + timedelta(days=rng.randint(2, 60))
+    end = start + timedelta(days=rng.randint(1, 5))
+    return start.strftime("%d/%m/%Y"), end.strftime("%d/%m/%Y")
+
+
+def _book_and_pay(client, seed):
+    rng = random.Random(seed)
+    checkin, checkout = _stay_dates(rng)
+    response = client.post(
+        "/api/reservations",
+        json={
+            "contact_email": EMAIL,
+            "hotel": HOTEL,
+            "room_type": ROOM_TYPE,
+            "checkin": checkin,
+            "checkout": checkout,
+            "guests": [{"name": "Ana Perez", "birth": "01/01/1990"}],
+        },
+    )
+    if response.status_code != 200:
+        return "rejected"
+    payment = client.post(
+        "/api/payments",
+        json={
+            "confirmation_code": response.get_json()["confirmation_code"],
+            "email": EMAIL,
+            "cardholder": "Ana Perez",
+            "card_number": "4111111111111111",
+            "expiration": "12/39",
+            "cvv": "123",
+        },
+    )
+    return "confirmed" if payment.status_code == 200 else "rejected"
+
+
+def _run_worker(seeds, threads):
+    from app import app
+
+    client = app.test_client()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(lambda seed: _book_and_pay(client, seed), seeds))
+
+
+def _run_worker_process(db_path, seeds, threads):
+    os.environ["DREAMSTAY_STORAGE"] = f"sqlite://{db_path}"
+    return _run_worker(seeds, threads)
+
+
+def find_oversold_days(reservations, units):
+    events = []
+    for res in reservations:
+        if res.hotel == HOTEL and res.room_type == ROOM_TYPE and res.status in ("confirmada", "ocupada"):
+            events.append((res.checkin, 1))
+            events.append((res.checkout, -1))
+    events.sort()
+    oversold = []
+    occupied = 0
+    for day, delta in events:
+        occupied += delta
+        if occupied > units:
+            oversold.append((day, occupied))
+    return oversold, len(events) // 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--db", help="Archivo SQLite compartido (obligatorio con --processes > 1)")
+    args = parser.parse_args()
+
+    seeds = list(range(args.bookings))
+    started = time.perf_counter()
+
+    if args.processes > 1:
+        if not args.db:
+            parser.error("--processes > 1 requiere --db")
+        for suffix in ("", "-wal", "-shm", "-occupancy", "-archive", "-archive-wal", "-archive-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+        from storage import SQLiteStorage
+
+        store = SQLiteStorage(args.db)
+        chunks = [seeds[i::args.processes] for i in range(args.processes)]
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(args.processes) as pool:
+            outcomes = pool.starmap(
+                _run_worker_process, [(args.db, chunk, args.threads) for chunk in chunks]
+            )
+        results = [item for chunk in outcomes for item in chunk]
+    else:
+        if args.db:
+            os.environ["DREAMSTAY_STORAGE"] = f"sqlite://{args.db}"
+        results = _run_worker(seeds, args.threads)
+        from app import storage as store
+
+    elapsed = time.perf_counter() - started
+    from app import catalog
+
+    units = catalog.units(HOTEL, ROOM_TYPE)
+    oversold, confirmed = find_oversold_days(store.iter_reservations(), units)
+    print(
+        f"{args.bookings} reservas en {elapsed:.2f}s: "
+        f"{results.count('confirmed')} confirmadas, {results.count('rejected')} rechazadas, "
+        f"{confirmed} estadías bloqueantes sobre {units} habitaciones, {len(oversold)} sobreventas"
+    )
+    for day, occupied in oversold[:10]:
+        print(f"  {day}: {occupied} estadías para {units} habitaciones")
+    return 1 if oversold else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Generadores de datos sintéticos compartidos por los benchmarks: catálogos
+de N hoteles x M tipos de habitación x K ofertas e historiales de reservas.
+"""
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Reservation  # noqa: E402
+from pricing import RateCalendar  # noqa: E402
+
+ROOM_TYPES = ["Single", "Doble", "Triple", "Suite", "Familiar", "Deluxe", "Loft", "Cabaña"]
+CITIES = ["Buenos Aires", "Mar del Plata", "Córdoba", "Rosario", "Mendoza", "Salta", "Bariloche", "Ushuaia"]
+
+
+def generate_catalog(hotels, rooms, offers, seed=0):
+    rng = random.Random(seed)
+    catalog = []
+    for hotel_id in range(1, hotels + 1):
+        hotel_rooms = []
+        for room_type in ROOM_TYPES[:rooms]:
+            adult_rate = float(rng.randint(50, 400))
+            hotel_rooms.append(
+                {
+                    "type": room_type,
+                    "name": room_type,
+                    "capacity": {"adults": rng.randint(2, 4), "children": rng.randint(0, 2), "babies": rng.randint(0, 1)},
+                    "rates": {"adult": adult_rate, "child": adult_rate / 2, "baby": 0.0},
+                    "room_numbers": [f"{hotel_id}-{room_type}-{n}" for n in range(rng.randint(1, 20))],
+                }
+            )
+        hotel_offers = []
+        for offer_id in range(offers):
+            month = rng.randint(1, 12)
+            hotel_offers.append(
+                {
+                    "name": f"Oferta {offer_id}",
+                    "description": f"Oferta {offer_id} del hotel {hotel_id}",
+                    "start": f"01/{month:02d}/{date.today().year}",
+                    "end": f"28/{month:02d}/{date.today().year}",
+                    "adult_discount": round(rng.uniform(0.05, 0.3), 2),
+                }
+            )
+        catalog.append(
+            {
+                "id": hotel_id,
+                "name": f"Hotel {hotel_id}",
+                "city": rng.choice(CITIES),
+                "rooms": hotel_rooms,
+                "offers": hotel_offers,
+            }
+        )
+    return catalog
+
+
+def generate_history(catalog, rows, seed=0):
+    """
+    Historial de `rows` reservas repartidas entre los tipos de habitación
+    del catálogo: la mayoría completadas o canceladas en el pasado y una
+    décima parte confirmada a futuro, que sí ocupa lugar.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    rooms = [(hotel, room, RateCalendar(room, [])) for hotel in catalog for room in hotel["rooms"]]
+    counts = {"adult": 1, "child": 0, "baby": 0}
+    guests = [{"name": "Ana Perez", "birth": "01/01/1990", "age": 36, "category": "adult"}]
+    for index in range(rows):
+        hotel, room, rate_calendar = rooms[index % len(rooms)]
+        roll = rng.random()
+        nights = rng.randint(1, 5)
+        if roll < 0.1:
+            status = "confirmada"
+            checkin = today + timedelta(days=rng.randint(1, 365))
+        else:
+            status = "completada" if roll < 0.8 else "cancelada"
+            checkin = today - timedelta(days=rng.randint(nights + 1, 1500))
+        price_detail, _ = rate_calendar.quote(counts, checkin, checkin + timedelta(days=nights))
+        yield Reservation(
+            confirmation_code=f"H{index:09d}",
+            hotel=hotel["name"],
+            room_type=room["type"],
+            room_name=room["name"],
+            contact_email=f"huesped{index % 5000}@dreamstay.test",
+            checkin=checkin,
+            checkout=checkin + timedelta(days=nights),
+            guests=guests,
+            price_detail=price_detail,
+            total=price_detail["total"],
+            offer=None,
+            offers=[],
+            counts=counts,
+            nights=nights,
+            status=status,
+        )
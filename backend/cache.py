@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache:
+    """
+    Caché acotada de resultados de búsqueda con desalojo LRU y expiración
+    por TTL. Cada entrada recuerda qué hoteles evaluó y para qué rango de
+    fechas, de modo que `invalidate` descarta solo las búsquedas afectadas
+    por un cambio de ocupación en un hotel y rango concretos.
+
+    `invalidate` solo ve los cambios de este proceso. Cada entrada guarda
+    además la marca de ocupación con que se calculó
+    (`Storage.occupancy_version`) y se descarta al leerla con otra, así
+    los cambios de otros workers también la invalidan. Con marca None no
+    se lee ni se guarda nada.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expira, hoteles, inicio, fin, valor, marca de ocupación)
+        self._entries = OrderedDict()
+        self._by_hotel = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for hotel_name in entry[1]:
+            keys = self._by_hotel.get(hotel_name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_hotel[hotel_name]
+
+    def get(self, key, version=0):
+        with self._lock:
+            entry = self._entries.get(key) if version is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[5] != version:
+                self._drop(key)
+                self.misses += 1
+                self.invalidations += 1
+                return None
+            if entry[0] <= self._clock():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[4]
+
+    def put(self, key, value, hotel_names, start, end, version=0):
+        if self.maxsize <= 0 or version is None:
+            return
+        with self._lock:
+            self._drop(key)
+            hotel_names = frozenset(hotel_names)
+            self._entries[key] = (self._clock() + self.ttl, hotel_names, start, end, value, version)
+            for hotel_name in hotel_names:
+                self._by_hotel.setdefault(hotel_name, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, hotel_name, start, end):
+        """Descarta las búsquedas de `hotel_name` cuyo rango se solapa con [start, end)."""
+        with self._lock:
+            for key in list(self._by_hotel.get(hotel_name, ())):
+                entry = self._entries[key]
+                if entry[2] < end and start < entry[3]:
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_hotel.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class RevisionedMemo:
+    """
+    Memoización LRU acotada para funciones puras del catálogo. Cada entrada
+    queda atada a la revisión del catálogo con que se calculó: al cambiar
+    la revisión se vacía la memoria completa.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._revision = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, revision, key, compute):
+        with self._lock:
+            if revision != self._revision:
+                self._entries.clear()
+                self._revision = revision
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            if revision == self._revision and self.maxsize > 0:
+                self._entries[key] = value
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
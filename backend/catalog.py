@@ -0,0 +1,266 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from pricing import RateCalendar
+
+# Cambiar al modificar la estructura de Catalog u OfferIndex: invalida los cachés compilados
+CATALOG_CACHE_VERSION = 3
+
+
+class OfferIndex:
+    """
+    Ofertas de un hotel con sus fechas ya parseadas, sin reparsear en cada
+    request. Los inicios y fines de las ofertas parten el tiempo en tramos
+    y para cada tramo se guardan las ofertas que lo cubren: las vigentes en
+    [start, end) son las que cubren el tramo de `start` más las que empiezan
+    dentro del rango, y ambas salen de una búsqueda binaria. El costo de
+    `active` depende de las ofertas que devuelve, no del total del hotel.
+    """
+
+    def __init__(self, offers, parse_date):
+        entries = []
+        for position, offer in enumerate(offers):
+            offer_start = parse_date(offer.get("start"))
+            offer_end = parse_date(offer.get("end"))
+            if not offer_start or not offer_end:
+                continue
+            # `end` es inclusivo en el catálogo: la oferta cubre hasta esa noche
+            entries.append((offer_start.date(), offer_end.date() + timedelta(days=1), position, offer))
+        entries.sort(key=lambda entry: entry[0])
+        self._starts = [entry[0] for entry in entries]
+        self._entries = entries
+        # Tramo i: [cortes[i], cortes[i + 1]); el último no lo cubre ninguna oferta
+        self._cuts = sorted({day for offer_start, offer_end, _, _ in entries for day in (offer_start, offer_end)})
+        covering = [[] for _ in self._cuts]
+        for offer_start, offer_end, position, offer in entries:
+            for segment in range(bisect_left(self._cuts, offer_start), bisect_left(self._cuts, offer_end)):
+                covering[segment].append((position, offer))
+        self._covering = [tuple(sorted(items, key=lambda item: item[0])) for items in covering]
+
+    def active(self, start, end):
+        """Ofertas que se solapan con [start, end), en el orden del catálogo."""
+        segment = bisect_right(self._cuts, start) - 1
+        found = dict(self._covering[segment]) if segment >= 0 else {}
+        for _, _, position, offer in self._entries[bisect_left(self._starts, start):bisect_left(self._starts, end)]:
+            found[position] = offer
+        return [found[position] for position in sorted(found)]
+
+
+class Catalog:
+    """
+    Índices precalculados sobre la lista de hoteles para que la búsqueda
+    no recorra todo el catálogo en cada request. Se debe llamar a
+    `rebuild` cada vez que cambia la lista de hoteles, habitaciones u ofertas.
+    """
+
+    def __init__(self, hotels, parse_date):
+        self._parse_date = parse_date
+        self.revision = 0
+        self.rebuild(hotels)
+
+    def rebuild(self, hotels=None):
+        if hotels is not None:
+            self.hotels = hotels
+        by_name = {}
+        by_folded_name = {}
+        by_city = {}
+        rooms = {}
+        capacities = {}
+        rates = {}
+        room_numbers = {}
+        type_capacity = {}
+        offers = {}
+
+        for hotel in self.hotels:
+            by_name.setdefault(hotel["name"], hotel)
+            offers.setdefault(hotel["name"], OfferIndex(hotel.get("offers", []), self._parse_date))
+            by_folded_name.setdefault(hotel["name"].casefold(), hotel)
+            by_city.setdefault(hotel["city"].casefold(), []).append(hotel)
+            for room in hotel["rooms"]:
+                key = (hotel["name"], room["type"])
+                rooms.setdefault(key, (hotel, room))
+                capacity = room["capacity"]
+                capacities[key] = (capacity["adults"], capacity["children"], capacity["babies"])
+                room_rates = room.get("rates", {})
+                adult_rate = float(room_rates.get("adult", room.get("price", 0.0)))
+                rates[key] = (
+                    adult_rate,
+                    float(room_rates.get("child", adult_rate * 0.5)),
+                    float(room_rates.get("baby", 0.0)),
+                )
+                # Sin inventario explícito el tipo cuenta como una sola habitación
+                room_numbers[key] = tuple(room.get("room_numbers") or (room.get("name", room["type"]),))
+                # Capacidad de referencia del tipo: la del primer hotel que lo ofrece
+                type_capacity.setdefault(room["type"], capacity)
+
+        self._by_name = by_name
+        self._by_folded_name = by_folded_name
+        self._by_city = by_city
+        self._rooms = rooms
+        self.capacities = capacities
+        self.rates = rates
+        self.room_numbers = room_numbers
+        self.type_capacity = type_capacity
+        self._offers = offers
+        self._calendars = {}
+        self.revision += 1
+
+    def __getstate__(self):
+        # parse_date es una función de la app: se vuelve a asignar al cargar
+        state = dict(self.__dict__)
+        state.pop("_parse_date", None)
+        # Los calendarios de tarifas se arman a demanda en cada proceso
+        state["_calendars"] = {}
+        return state
+
+    @property
+    def room_types(self):
+        return self.type_capacity.keys()
+
+    def hotel(self, hotel_name):
+        return self._by_name.get(hotel_name)
+
+    def hotel_casefold(self, hotel_name):
+        return self._by_folded_name.get(hotel_name.casefold())
+
+    def hotels_in_city(self, city):
+        return self._by_city.get(city.casefold(), [])
+
+    def room(self, hotel_name, room_type):
+        return self._rooms.get((hotel_name, room_type), (None, None))
+
+    def active_offers(self, hotel_name, start, end):
+        index = self._offers.get(hotel_name)
+        return index.active(start, end) if index is not None else []
+
+    def rate_calendar(self, hotel_name, room_type):
+        """
+        Calendario de tarifas por noche de (hotel, tipo de habitación). Se
+        arma en el primer uso, así solo ocupan memoria los tipos que se
+        cotizan; dos requests que lo armen a la vez obtienen calendarios
+        equivalentes y queda el último.
+        """
+        key = (hotel_name, room_type)
+        calendar = self._calendars.get(key)
+        if calendar is None:
+            _, room = self._rooms[key]
+            index = self._offers.get(hotel_name)
+            calendar = RateCalendar(room, index._entries if index is not None else [])
+            self._calendars[key] = calendar
+        return calendar
+
+    def units(self, hotel_name, room_type):
+        return len(self.room_numbers.get((hotel_name, room_type), ()))
+
+
+def _private_dir(path):
+    """
+    Crea `path` con permisos 0700 si no existe y confirma que sea un
+    directorio del usuario del proceso donde nadie más puede escribir: en
+    otro caso alguien podría dejar un pickle que se ejecute al cargarlo.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & 0o022:
+        return False
+    return not hasattr(os, "getuid") or info.st_uid == os.getuid()
+
+
+def _read_cache(cache_path):
+    try:
+        fd = os.open(cache_path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError:
+        return None
+    with os.fdopen(fd, "rb") as cached:
+        info = os.fstat(cached.fileno())
+        if info.st_mode & 0o022 or (hasattr(os, "getuid") and info.st_uid != os.getuid()):
+            return None
+        try:
+            catalog = pickle.load(cached)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+    return catalog if isinstance(catalog, Catalog) else None
+
+
+def load_catalog(path, parse_date, cache_dir=None):
+    """
+    Lee el catálogo JSON de `path` y lo devuelve ya indexado. Si se indica
+    `cache_dir`, el `Catalog` armado se guarda compilado (pickle) ahí con el
+    hash del archivo en el nombre, así los arranques siguientes con el mismo
+    archivo cargan los índices directamente sin parsear ni reconstruir nada.
+    Como cargar un pickle ejecuta código, el caché solo se usa si el
+    directorio y el archivo son del usuario del proceso y nadie más puede
+    escribirlos.
+    """
+    with open(path, "rb") as source:
+        raw = source.read()
+    cache_path = None
+    if cache_dir and _private_dir(cache_dir):
+        digest = hashlib.sha256(raw).hexdigest()
+        cache_path = os.path.join(cache_dir, f"catalog-{digest}-v{CATALOG_CACHE_VERSION}.pickle")
+
+    # El catálogo son millones de objetos que viven todo el proceso: el
+    # recolector de ciclos solo agregaría pasadas inútiles mientras se arma
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        catalog = _read_cache(cache_path) if cache_path else None
+        if catalog is not None:
+            catalog._parse_date = parse_date
+            return catalog
+        catalog = Catalog(json.loads(raw), parse_date)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    if cache_path is None:
+        return catalog
+    try:
+        # Escritura atómica (el temporal se crea con permisos 0600): otro
+        # worker puede estar leyendo el mismo caché
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as tmp:
+            pickle.dump(catalog, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp.name, cache_path)
+    except OSError:
+        pass  # Sin caché el catálogo funciona igual; solo el próximo arranque es más lento
+    return catalog
+
+
+class LazyCatalog:
+    """
+    Catálogo que se carga con `loader` recién en el primer acceso, de modo
+    que importar la app (y levantar un worker) no paga el costo de leer el
+    archivo. Delega todos los atributos en el `Catalog` cargado.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._catalog is not None
+
+    def load(self):
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self._catalog = self._loader()
+                catalog = self._catalog
+        return catalog
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
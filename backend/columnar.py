@@ -0,0 +1,527 @@
+import json
+import sys
+import threading
+from array import array
+from collections import namedtuple
+from dataclasses import fields
+from datetime import date
+from operator import attrgetter
+
+from models import Reservation
+from repository import ReservationRepository, normalize_email
+
+# Huecos (filas borradas o huéspedes sin referencia) a partir de los que se compacta
+_COMPACT_MIN = 1024
+_SECONDS_PER_DAY = 86400
+# Reservas ya armadas que retiene `ReservationTable` (las de uso reciente)
+_HOT_ROWS = 4096
+
+# Lo que necesita el índice de disponibilidad de cada reserva, sin armarla completa
+Stay = namedtuple("Stay", "confirmation_code hotel room_type checkin checkout status")
+
+
+# Un solo codificador: json.dumps arma uno nuevo en cada llamada con estos parámetros
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+_reservation_values = attrgetter(*(field.name for field in fields(Reservation)))
+
+
+def _clone(reservation):
+    """Copia superficial de un `Reservation`: comparte los valores anidados."""
+    return Reservation(*_reservation_values(reservation))
+
+
+class Dictionary:
+    """
+    Codificación por diccionario: cada valor distinto se guarda una sola
+    vez y las filas guardan su id. Los textos se internan, así se comparten
+    también con el resto del proceso (nombres de hotel del catálogo, etc.).
+    """
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        value_id = self._ids.get(value)
+        if value_id is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            value_id = len(self.values)
+            self.values.append(value)
+            self._ids[value] = value_id
+        return value_id
+
+    def lookup(self, value):
+        """Id del valor, o None si nunca se codificó (ninguna fila lo tiene)."""
+        return self._ids.get(value)
+
+    def copy(self):
+        clone = Dictionary()
+        clone.values = list(self.values)
+        clone._ids = dict(self._ids)
+        return clone
+
+
+class EncodedColumn:
+    """
+    Columna codificada por diccionario, con ids en un `array` de 32 bits.
+    Con `as_json` los valores (dicts o listas) se guardan como su texto
+    JSON y se decodifican en un objeto nuevo cada vez que se leen.
+    """
+
+    def __init__(self, as_json=False):
+        self.as_json = as_json
+        self.dictionary = Dictionary()
+        self.ids = array("I")
+
+    def encode(self, value):
+        return self.dictionary.encode(_dumps(value) if self.as_json else value)
+
+    def set(self, row, value):
+        value_id = self.encode(value)
+        if row == len(self.ids):
+            self.ids.append(value_id)
+        else:
+            self.ids[row] = value_id
+
+    def get(self, row):
+        value = self.dictionary.values[self.ids[row]]
+        return json.loads(value) if self.as_json else value
+
+    def copy(self):
+        clone = EncodedColumn(self.as_json)
+        clone.dictionary = self.dictionary.copy()
+        clone.ids = array("I", self.ids)
+        return clone
+
+
+def _set(column, row, value):
+    if row == len(column):
+        column.append(value)
+    else:
+        column[row] = value
+
+
+class GuestTable:
+    """
+    Tabla lateral de huéspedes: cada fila referencia un tramo
+    [inicio, inicio + cantidad) de ids de huésped, y cada huésped distinto
+    (nombre, nacimiento, edad, categoría) se guarda una vez en el
+    diccionario. Los tramos que dejan de usarse quedan como basura hasta
+    que la tabla dueña compacta.
+    """
+
+    def __init__(self):
+        self.dictionary = Dictionary()
+        self.starts = array("I")
+        self.counts = array("H")
+        self.guest_ids = array("I")
+        self.garbage = 0
+
+    def encode(self, guests):
+        return array("I", (self.dictionary.encode(_dumps(guest)) for guest in guests))
+
+    def set(self, row, guests, replacing=False):
+        encoded = self.encode(guests)
+        if replacing:
+            start, count = self.starts[row], self.counts[row]
+            # Sin cambios (lo habitual al actualizar una reserva): se conserva el tramo
+            if self.guest_ids[start:start + count] == encoded:
+                return
+            self.garbage += count
+        _set(self.starts, row, len(self.guest_ids))
+        _set(self.counts, row, len(encoded))
+        self.guest_ids.extend(encoded)
+
+    def get(self, row):
+        start = self.starts[row]
+        values = self.dictionary.values
+        return [json.loads(values[guest_id]) for guest_id in self.guest_ids[start:start + self.counts[row]]]
+
+    def discard(self, row):
+        self.garbage += self.counts[row]
+
+    def copy(self):
+        clone = GuestTable()
+        clone.dictionary = self.dictionary.copy()
+        clone.starts = array("I", self.starts)
+        clone.counts = array("H", self.counts)
+        clone.guest_ids = array("I", self.guest_ids)
+        clone.garbage = self.garbage
+        return clone
+
+
+class ReservationTable:
+    """
+    Reservas en columnas, indexadas por código de confirmación: hotel,
+    tipo, estado, correos y demás textos repetidos codificados por
+    diccionario; fechas, noches y totales en `array`; precio, conteos y
+    ofertas como JSON compartido entre las filas iguales; huéspedes en una
+    tabla lateral y los campos que solo tienen algunos estados (pago,
+    cancelación, check-in...) en diccionarios dispersos por fila.
+
+    Cada lectura devuelve un `Reservation` nuevo: modificarlo no cambia la
+    tabla hasta que se vuelve a guardar con `save`. Las filas borradas
+    quedan como huecos y la tabla se compacta cuando superan la mitad.
+
+    Las últimas `_HOT_ROWS` reservas leídas o guardadas quedan además ya
+    armadas en un `ReservationRepository` acotado, así reservar, pagar y
+    consultar la misma reserva no decodifica el JSON en cada paso, y al
+    guardar solo se recodifican las columnas que cambiaron. Por eso los
+    valores anidados (huéspedes, precio, pago...) se comparten entre las
+    lecturas: para cambiarlos se asigna un valor nuevo al campo, nunca se
+    modifican en el lugar.
+    """
+
+    _ENCODED = ("hotel", "room_type", "room_name", "contact_email", "status", "offer")
+    _ENCODED_JSON = ("price_detail", "offers", "counts")
+    _SPARSE = ("checkin_real", "checkout_real", "room_number", "expires_at")
+    _SPARSE_JSON = ("payment", "cancellation", "modification")
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._hot = ReservationRepository(capacity=_HOT_ROWS)
+        self._reset()
+
+    def _reset(self):
+        self._row_of = {}
+        self._codes = []
+        self._holes = 0
+        self._columns = {name: EncodedColumn() for name in self._ENCODED}
+        self._columns.update((name, EncodedColumn(as_json=True)) for name in self._ENCODED_JSON)
+        # Correo normalizado, para buscar por código y correo sin índice aparte
+        self._email_key = EncodedColumn()
+        self._checkin = array("i")
+        self._checkout = array("i")
+        self._nights = array("H")
+        self._total = array("d")
+        self._guests = GuestTable()
+        self._sparse = {name: {} for name in self._SPARSE + self._SPARSE_JSON}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        state.pop("_hot", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._hot = ReservationRepository(capacity=_HOT_ROWS)
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __iter__(self):
+        # Por código y no por fila: una compactación entre lecturas mueve las filas
+        with self._lock:
+            codes = [code for code in self._codes if code is not None]
+        for code in codes:
+            # Un recorrido completo no pasa por la caché: la vaciaría de las reservas en uso
+            with self._lock:
+                reservation = self._hot.get(code)
+                if reservation is not None:
+                    reservation = _clone(reservation)
+                elif code in self._row_of:
+                    reservation = self._materialize_row(self._row_of[code])
+            if reservation is not None:
+                yield reservation
+
+    def __contains__(self, code):
+        return code in self._row_of
+
+    def save(self, reservation):
+        with self._lock:
+            self._write(reservation, self._hot.get(reservation.confirmation_code))
+            self._hot.save(_clone(reservation))
+            self._maybe_compact()
+        return reservation
+
+    def _write(self, reservation, previous=None):
+        """
+        Escribe la reserva en las columnas. `previous` es la versión ya
+        armada de lo que hay guardado, si se tiene: los valores JSON y los
+        huéspedes iguales a los suyos no se vuelven a codificar.
+        """
+        code = reservation.confirmation_code
+        row = self._row_of.get(code)
+        replacing = row is not None
+        if row is None:
+            row = len(self._codes)
+            self._codes.append(code)
+            self._row_of[code] = row
+        for name, column in self._columns.items():
+            value = getattr(reservation, name)
+            if previous is not None and column.as_json and value == getattr(previous, name):
+                continue
+            column.set(row, value)
+        self._email_key.set(row, normalize_email(reservation.contact_email))
+        _set(self._checkin, row, reservation.checkin.toordinal())
+        _set(self._checkout, row, reservation.checkout.toordinal())
+        _set(self._nights, row, reservation.nights)
+        _set(self._total, row, reservation.total)
+        if previous is None or reservation.guests != previous.guests:
+            self._guests.set(row, reservation.guests, replacing)
+        for name, values in self._sparse.items():
+            value = getattr(reservation, name)
+            if value is None:
+                values.pop(row, None)
+            elif name not in self._SPARSE_JSON:
+                values[row] = value
+            elif previous is None or value != getattr(previous, name):
+                values[row] = _dumps(value)
+
+    def remove(self, code):
+        with self._lock:
+            row = self._row_of.get(code)
+            if row is None:
+                return None
+            reservation = self._hot.remove(code) or self._materialize_row(row)
+            del self._row_of[code]
+            self._codes[row] = None
+            self._holes += 1
+            self._guests.discard(row)
+            for values in self._sparse.values():
+                values.pop(row, None)
+            self._maybe_compact()
+            return reservation
+
+    def _load(self, code):
+        """Reserva armada de la caché (o de las columnas, y queda en la caché); None si no existe."""
+        reservation = self._hot.get(code)
+        if reservation is None:
+            row = self._row_of.get(code)
+            if row is None:
+                return None
+            reservation = self._hot.save(self._materialize_row(row))
+        return reservation
+
+    def get(self, code):
+        with self._lock:
+            reservation = self._load(code)
+            return None if reservation is None else _clone(reservation)
+
+    def find(self, code, email):
+        """Reserva con ese código cuyo correo de contacto coincide (normalizado)."""
+        with self._lock:
+            if code not in self._hot:
+                row = self._row_of.get(code)
+                # Un correo que no coincide se descarta sin armar la fila
+                if row is None or self._email_key.get(row) != normalize_email(email):
+                    return None
+                self._load(code)
+            reservation = self._hot.find(code, email)
+            return None if reservation is None else _clone(reservation)
+
+    def stays(self):
+        """Itera `Stay` de cada reserva leyendo solo las columnas de la estadía."""
+        with self._lock:
+            columns = self._columns
+            rows = [
+                Stay(
+                    code,
+                    columns["hotel"].get(row),
+                    columns["room_type"].get(row),
+                    date.fromordinal(self._checkin[row]),
+                    date.fromordinal(self._checkout[row]),
+                    columns["status"].get(row),
+                )
+                for row, code in enumerate(self._codes)
+                if code is not None
+            ]
+        return iter(rows)
+
+    def room_key(self, code):
+        """(hotel, tipo de habitación) de la reserva leyendo solo esas dos columnas, o None."""
+        with self._lock:
+            row = self._row_of.get(code)
+            if row is None:
+                return None
+            return self._columns["hotel"].get(row), self._columns["room_type"].get(row)
+
+    def _materialize_row(self, row):
+        with self._lock:
+            code = self._codes[row] if row < len(self._codes) else None
+            if code is None:
+                return None
+            values = {name: column.get(row) for name, column in self._columns.items()}
+            for name, sparse in self._sparse.items():
+                value = sparse.get(row)
+                values[name] = json.loads(value) if value is not None and name in self._SPARSE_JSON else value
+            return Reservation(
+                confirmation_code=code,
+                checkin=date.fromordinal(self._checkin[row]),
+                checkout=date.fromordinal(self._checkout[row]),
+                guests=self._guests.get(row),
+                total=self._total[row],
+                nights=self._nights[row],
+                **values,
+            )
+
+    def _maybe_compact(self):
+        rows = len(self._codes)
+        guests = len(self._guests.guest_ids)
+        if (self._holes >= _COMPACT_MIN and self._holes * 2 > rows) or (
+            self._guests.garbage >= _COMPACT_MIN and self._guests.garbage * 2 > guests
+        ):
+            reservations = [self._materialize_row(row) for row in range(rows) if self._codes[row] is not None]
+            self._reset()
+            for reservation in reservations:
+                self._write(reservation)
+
+    def copy(self):
+        """Copia independiente (para el snapshot del journal): copia arrays, no materializa filas."""
+        with self._lock:
+            clone = ReservationTable.__new__(ReservationTable)
+            clone._lock = threading.RLock()
+            clone._hot = ReservationRepository(capacity=_HOT_ROWS)
+            clone._row_of = dict(self._row_of)
+            clone._codes = list(self._codes)
+            clone._holes = self._holes
+            clone._columns = {name: column.copy() for name, column in self._columns.items()}
+            clone._email_key = self._email_key.copy()
+            clone._checkin = array("i", self._checkin)
+            clone._checkout = array("i", self._checkout)
+            clone._nights = array("H", self._nights)
+            clone._total = array("d", self._total)
+            clone._guests = self._guests.copy()
+            clone._sparse = {name: dict(values) for name, values in self._sparse.items()}
+            return clone
+
+
+def _encode_timestamp(value):
+    """Marca "YYYY-MM-DD HH:MM:SS" como segundos desde el día 1 del calendario; -1 si no hay."""
+    if value is None:
+        return -1
+    # Formato fijo: cortar es mucho más rápido que strptime (pesa al reconstruir el journal)
+    day = date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+    return day.toordinal() * _SECONDS_PER_DAY + int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+
+
+def _decode_timestamp(value):
+    if value < 0:
+        return None
+    days, seconds = divmod(value, _SECONDS_PER_DAY)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return f"{date.fromordinal(days).isoformat()} {hour:02d}:{minute:02d}:{second:02d}"
+
+
+class EstadiaTable:
+    """
+    Historial de estadías en columnas, de solo agregado: el id de cada
+    estadía es su posición desde 1. Los filtros de `iter_matching` se
+    evalúan sobre las columnas y solo se arma el dict de las estadías que
+    pasan. Las altas se serializan con un lock; el código se agrega al
+    final, así los lectores nunca ven una fila a medio escribir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes = []
+        self._hotel = EncodedColumn()
+        self._room_type = EncodedColumn()
+        self._room_number = EncodedColumn()
+        self._checkin = array("q")
+        self._checkout = array("q")
+        self._total = array("d")
+        self._price_detail = EncodedColumn(as_json=True)
+        self._offers = EncodedColumn(as_json=True)
+        self._guests = GuestTable()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __iter__(self):
+        for index in range(len(self._codes)):
+            yield self[index]
+
+    def append(self, estadia):
+        with self._lock:
+            index = len(self._codes)
+            self._hotel.set(index, estadia["hotel"])
+            self._room_type.set(index, estadia["room_type"])
+            self._room_number.set(index, estadia.get("room_number"))
+            self._checkin.append(_encode_timestamp(estadia.get("checkin")))
+            self._checkout.append(_encode_timestamp(estadia.get("checkout")))
+            self._total.append(estadia["total"])
+            self._price_detail.set(index, estadia["price_detail"])
+            self._offers.set(index, estadia["offers"])
+            self._guests.set(index, estadia["guests"])
+            self._codes.append(estadia["confirmation_code"])
+
+    def extend(self, estadias):
+        for estadia in estadias:
+            self.append(estadia)
+
+    def __getitem__(self, index):
+        return {
+            "confirmation_code": self._codes[index],
+            "hotel": self._hotel.get(index),
+            "room_type": self._room_type.get(index),
+            "room_number": self._room_number.get(index),
+            "guests": self._guests.get(index),
+            "checkin": _decode_timestamp(self._checkin[index]),
+            "checkout": _decode_timestamp(self._checkout[index]),
+            "total": self._total[index],
+            "price_detail": self._price_detail.get(index),
+            "offers": self._offers.get(index),
+        }
+
+    def iter_matching(self, after_id=0, hotel_name=None, room_type=None, start=None, end=None):
+        """Itera (id, estadía) como `Storage.iter_estadias`, filtrando sobre las columnas."""
+        hotel_id = room_type_id = None
+        if hotel_name is not None:
+            hotel_id = self._hotel.dictionary.lookup(hotel_name)
+            if hotel_id is None:
+                return
+        if room_type is not None:
+            room_type_id = self._room_type.dictionary.lookup(room_type)
+            if room_type_id is None:
+                return
+        # Los filtros son días enteros: se comparan contra el día de cada marca
+        first_day = date.fromisoformat(start).toordinal() if start is not None else None
+        last_day = date.fromisoformat(end).toordinal() if end is not None else None
+        hotels, room_types = self._hotel.ids, self._room_type.ids
+        checkins, checkouts = self._checkin, self._checkout
+        for index in range(max(after_id, 0), len(self._codes)):
+            if hotel_id is not None and hotels[index] != hotel_id:
+                continue
+            if room_type_id is not None and room_types[index] != room_type_id:
+                continue
+            # Sin marca de salida no hay solapamiento con `start`; sin entrada sí con `end`
+            if first_day is not None and (checkouts[index] < 0 or checkouts[index] // _SECONDS_PER_DAY < first_day):
+                continue
+            if last_day is not None and checkins[index] >= 0 and checkins[index] // _SECONDS_PER_DAY > last_day:
+                continue
+            yield index + 1, self[index]
+
+    def copy(self):
+        with self._lock:
+            return self._copy()
+
+    def _copy(self):
+        clone = EstadiaTable()
+        clone._codes = list(self._codes)
+        clone._hotel = self._hotel.copy()
+        clone._room_type = self._room_type.copy()
+        clone._room_number = self._room_number.copy()
+        clone._checkin = array("q", self._checkin)
+        clone._checkout = array("q", self._checkout)
+        clone._total = array("d", self._total)
+        clone._price_detail = self._price_detail.copy()
+        clone._offers = self._offers.copy()
+        clone._guests = self._guests.copy()
+        return clone
@@ -0,0 +1,117 @@
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Espera antes de reintentar un vencimiento que falló (p. ej. base bloqueada)
+RETRY_DELAY = 5.0
+
+
+class HoldExpiryScheduler:
+    """
+    Vence las reservas `pendiente_pago` que no se pagan dentro de `ttl`
+    segundos. Cada reserva retenida se agenda una vez en un heap ordenado
+    por vencimiento y un único hilo en segundo plano duerme hasta el
+    próximo: cada pasada solo toca las reservas que vencieron, nunca el
+    total. Las entradas de reservas que ya se pagaron se descartan al
+    salir del heap, porque `storage.expire_hold` solo borra si la reserva
+    sigue pendiente y vencida.
+
+    El hilo se crea con la primera reserva agendada y de nuevo en cada
+    proceso hijo tras un fork. Un worker forkeado del maestro hereda el
+    heap del arranque, que no tiene las retenciones que crearon los workers
+    anteriores: gunicorn llama a `reload` al iniciar cada worker para
+    agendarlas desde el almacenamiento, así las de un worker que murió no
+    quedan sin vencer hasta el próximo reinicio completo.
+    """
+
+    def __init__(self, storage, ttl, clock=time.time):
+        self.storage = storage
+        self.ttl = ttl
+        self._clock = clock
+        self._heap = []
+        self._condition = threading.Condition()
+        self._pid = None
+        self.expired = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def deadline(self):
+        """Marca de vencimiento para una reserva retenida ahora, o None si no vencen."""
+        if not self.enabled:
+            return None
+        return datetime.fromtimestamp(self._clock() + self.ttl).strftime(TIMESTAMP_FORMAT)
+
+    def schedule(self, reservation):
+        if not self.enabled or reservation.expires_at is None:
+            return
+        when = datetime.strptime(reservation.expires_at, TIMESTAMP_FORMAT).timestamp()
+        self._push(when, reservation.confirmation_code)
+
+    def schedule_pending(self):
+        """Agenda las reservas retenidas que ya estaban en el almacenamiento (al arrancar)."""
+        if not self.enabled:
+            return
+        for code, expires_at in self.storage.iter_holds():
+            if expires_at is not None:
+                self._push(datetime.strptime(expires_at, TIMESTAMP_FORMAT).timestamp(), code)
+
+    def reload(self):
+        """Descarta el heap y vuelve a agendar todas las retenciones del almacenamiento."""
+        with self._condition:
+            self._heap = []
+        self.schedule_pending()
+
+    def _push(self, when, code):
+        with self._condition:
+            heapq.heappush(self._heap, (when, code))
+            # Solo hace falta despertar al hilo si cambió el próximo vencimiento
+            if self._heap[0][1] == code:
+                self._condition.notify()
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="hold-expiry", daemon=True).start()
+
+    def _after_fork(self):
+        # El hilo no sobrevive al fork: el worker hereda el heap y arranca el suyo
+        self._condition = threading.Condition()
+        if self._heap:
+            self._ensure_thread()
+
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _due(self):
+        """Espera al próximo vencimiento y devuelve los códigos vencidos."""
+        with self._condition:
+            while True:
+                now = self._clock()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                self._condition.wait(self._heap[0][0] - now if self._heap else None)
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+            return now, due
+
+    def _run(self):
+        while True:
+            now, due = self._due()
+            stamp = datetime.fromtimestamp(now).strftime(TIMESTAMP_FORMAT)
+            for code in due:
+                try:
+                    reservation = self.storage.expire_hold(code, stamp)
+                except Exception:
+                    self._push(now + RETRY_DELAY, code)
+                    continue
+                if reservation is not None:
+                    self.expired += 1
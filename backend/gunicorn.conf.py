@@ -0,0 +1,48 @@
+"""
+Configuración de gunicorn (se toma automáticamente al lanzar `gunicorn app:app`
+desde este directorio).
+
+Con SQLite (DREAMSTAY_STORAGE=sqlite://...) la app se importa una sola vez
+en el proceso maestro y el catálogo se carga ahí antes de crear los
+workers: todos comparten esas páginas de memoria por copy-on-write en lugar
+de tener cada uno su copia. `gc.freeze()` saca esos objetos del recolector
+de ciclos para que sus pasadas no escriban en las páginas y las terminen
+duplicando. La ocupación se comparte aparte, con el mmap de `SQLiteStorage`.
+
+El almacenamiento en memoria (con o sin journal) es por proceso: un worker
+creado a partir del maestro arrancaría con la foto del estado al iniciar
+y, si reemplaza a otro que murió, vendería habitaciones ya reservadas. Sin
+SQLite se usa un único worker, que importa la app y recupera el journal
+por su cuenta al arrancar (también cada reemplazo), y se rechaza pedir más.
+"""
+import gc
+import os
+
+_shared_storage = os.environ.get("DREAMSTAY_STORAGE", "memory").startswith("sqlite://")
+
+bind = os.environ.get("DREAMSTAY_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 if _shared_storage else 1))
+if workers > 1 and not _shared_storage:
+    raise RuntimeError(
+        "Con el almacenamiento en memoria cada worker tendría su propio estado: "
+        "usar WEB_CONCURRENCY=1 o DREAMSTAY_STORAGE=sqlite:///ruta/absoluta/al/archivo.db"
+    )
+preload_app = _shared_storage
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import app
+
+    app.catalog.load()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    import app
+
+    # El heap de vencimientos heredado es el del arranque del maestro
+    app.hold_expiry.reload()
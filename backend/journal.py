@@ -0,0 +1,244 @@
+import atexit
+import mmap
+import os
+import pickle
+import re
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo del directorio entre procesos
+    fcntl = None
+
+# Cada registro del log: largo del payload, CRC32 del payload y el payload (pickle)
+_RECORD_HEADER = struct.Struct("<II")
+_LOG_NAME = re.compile(r"^journal\.(\d+)\.log$")
+_SNAPSHOT_NAME = "snapshot.pickle"
+_LOCK_NAME = "LOCK"
+
+
+class JournalError(Exception):
+    pass
+
+
+class Journal:
+    """
+    Registro de escritura anticipada (write-ahead log) para el
+    almacenamiento en memoria. Cada mutación se agrega como un registro
+    binario al final de `journal.<generación>.log`; los registros se
+    escriben en el buffer del proceso y un hilo los baja a disco con un
+    único fsync cada `fsync_interval` segundos, así una request nunca
+    espera al disco (se pueden perder a lo sumo los últimos
+    `fsync_interval` segundos ante un corte de energía).
+
+    Cada `snapshot_every` eventos se guarda un snapshot del estado completo
+    y se empieza una generación nueva del log; al arrancar se carga el
+    snapshot y se reproducen solo los logs posteriores.
+
+    Solo escribe el proceso que lo abrió. Un hijo creado con fork hereda
+    una copia del estado que no ve lo que escriben los demás procesos, y lo
+    que agregara al log de esta generación se perdería cuando otro proceso
+    la rotara con un snapshot: en el hijo el journal queda cerrado y toda
+    mutación falla con `JournalError`. Por eso gunicorn no precarga la app
+    con este almacenamiento y usa un único worker (ver gunicorn.conf.py).
+    """
+
+    def __init__(self, directory, fsync_interval=0.05, snapshot_every=100_000):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        # Las mutaciones se aplican en memoria y se registran bajo este lock,
+        # de modo que un snapshot nunca queda entre las dos cosas
+        self.lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._capture = None
+        self._file = None
+        self._dirty = False
+        self._events_since_snapshot = 0
+        self._stop = threading.Event()
+        self._flusher = None
+        self._forked = False
+        self.generation = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._dir_lock = open(os.path.join(directory, _LOCK_NAME), "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._dir_lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._dir_lock.close()
+                raise JournalError(f"El journal {directory} ya está en uso por otro proceso") from None
+        os.register_at_fork(before=self._before_fork, after_in_child=self._after_fork)
+
+    def _log_path(self, generation):
+        return os.path.join(self.directory, f"journal.{generation}.log")
+
+    def _generations(self):
+        found = []
+        for name in os.listdir(self.directory):
+            match = _LOG_NAME.match(name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def recover(self):
+        """
+        Devuelve (estado del último snapshot o None, iterador de eventos
+        posteriores en orden). Un registro incompleto al final del último
+        log (escritura cortada) se descarta y el archivo se trunca ahí.
+        """
+        state = None
+        snapshot_path = os.path.join(self.directory, _SNAPSHOT_NAME)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+            self.generation = snapshot["generation"]
+            state = snapshot["state"]
+        generations = [gen for gen in self._generations() if gen >= self.generation]
+        if generations:
+            self.generation = generations[-1]
+        return state, self._replay(generations)
+
+    def _replay(self, generations):
+        for generation in generations:
+            path = self._log_path(generation)
+            last = generation == generations[-1]
+            size = os.path.getsize(path)
+            if not size:
+                continue
+            with open(path, "rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offset = 0
+                while offset < size:
+                    if offset + _RECORD_HEADER.size > size:
+                        break
+                    length, checksum = _RECORD_HEADER.unpack_from(data, offset)
+                    start = offset + _RECORD_HEADER.size
+                    payload = data[start:start + length]
+                    if len(payload) != length or zlib.crc32(payload) != checksum:
+                        break
+                    yield pickle.loads(payload)
+                    offset = start + length
+            if offset < size:
+                if not last:
+                    raise JournalError(f"Registro corrupto en {path} (byte {offset})")
+                with open(path, "r+b") as log_file:
+                    log_file.truncate(offset)
+
+    def start(self, capture):
+        """
+        Abre el log para escribir y lanza el hilo de fsync y snapshots.
+        `capture` devuelve el estado a guardar en un snapshot; se llama con
+        `lock` tomado.
+        """
+        self._check_writable()
+        self._capture = capture
+        self._file = open(self._log_path(self.generation), "ab")
+        self._flusher = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _before_fork(self):
+        # Lo que quede en el buffer lo escribiría también el hijo al cerrarse
+        with self.lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def _after_fork(self):
+        # Los locks pueden haber quedado tomados por hilos que no existen en el hijo
+        self.lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._forked = True
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check_writable(self):
+        if self._forked:
+            raise JournalError(
+                f"El journal {self.directory} lo escribe el proceso que lo abrió, no este hijo creado con fork"
+            )
+
+    @contextmanager
+    def record(self, event):
+        """Aplica la mutación del bloque y agrega `event` al log de forma atómica."""
+        with self.lock:
+            self._check_writable()
+            yield
+            self.append(event)
+
+    def append(self, event):
+        payload = pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._check_writable()
+            self._file.write(_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self._file.write(payload)
+            self._dirty = True
+            self._events_since_snapshot += 1
+
+    def sync(self):
+        with self.lock:
+            if self._file is None or not self._dirty:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _run(self):
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+            if self.snapshot_every and self._events_since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def _rotate(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.generation += 1
+        self._file = open(self._log_path(self.generation), "ab")
+        self._dirty = False
+
+    def snapshot(self):
+        """
+        Guarda el estado actual y descarta los logs que ya cubre. El estado
+        se captura y el log se rota bajo `lock`; la serialización y la
+        escritura ocurren fuera para no frenar a las requests.
+        """
+        with self._snapshot_lock:
+            with self.lock:
+                self._check_writable()
+                state = self._capture()
+                self._rotate()
+                generation = self.generation
+                self._events_since_snapshot = 0
+            payload = pickle.dumps({"generation": generation, "state": state}, protocol=pickle.HIGHEST_PROTOCOL)
+            path = os.path.join(self.directory, _SNAPSHOT_NAME)
+            with open(path + ".tmp", "wb") as snapshot_file:
+                snapshot_file.write(payload)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(path + ".tmp", path)
+            if hasattr(os, "O_DIRECTORY"):
+                dir_fd = os.open(self.directory, os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            for old in self._generations():
+                if old < generation:
+                    os.remove(self._log_path(old))
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        with self.lock:
+            if self._file is not None:
+                self.sync()
+                self._file.close()
+                self._file = None
+        if not self._dir_lock.closed:
+            self._dir_lock.close()
@@ -0,0 +1,221 @@
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Métricas de la app en curso (las registra `Metrics.init_app`), para que
+# los módulos de almacenamiento puedan informar barridos sin depender de la app
+_active = None
+
+
+def record_scan(source, rows):
+    """Registra un barrido de `rows` reservas; no hace nada si las métricas están apagadas."""
+    if _active is not None:
+        _active.record_scan(source, rows)
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus, con una serie por combinación de etiquetas."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # etiquetas -> [conteo por bucket (no acumulado) + desborde, suma, cantidad]
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SlowRequestProfiler:
+    """
+    Perfilador por muestreo: un único hilo toma cada `interval` segundos la
+    pila de cada request en curso. Si la request tarda al menos `threshold`
+    segundos, sus muestras se agregan a `path` en formato de pilas
+    colapsadas ("raíz;...;función cantidad"), el que leen flamegraph.pl y
+    speedscope. Las requests rápidas descartan sus muestras.
+    """
+
+    def __init__(self, path, threshold, interval=0.005):
+        self.path = path
+        self.threshold = threshold
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._sampler = None
+
+    def start(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._sampler.start()
+
+    def stop(self, label, duration):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or duration < self.threshold:
+            return
+        root = label.replace(";", ":").replace(" ", "_")
+        with self._lock, open(self.path, "a", encoding="utf-8") as output:
+            for stack, count in samples.items():
+                output.write(f"{root};{stack} {count}\n")
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own:
+                        samples[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class Metrics:
+    """
+    Métricas opcionales de la API: latencia por endpoint, llamadas por
+    request a las funciones del camino caliente y largo de los barridos de
+    reservas, expuestas en formato de texto de Prometheus. Deshabilitadas
+    no agregan costo: nada se envuelve ni se registra.
+    """
+
+    def __init__(self, enabled=False, profiler=None):
+        self.enabled = enabled
+        self.profiler = profiler
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._functions = []
+        self._calls_total = Counter()
+        self._requests_total = Counter()
+        self.latency = Histogram(
+            "dreamstay_request_duration_seconds", "Latencia de las requests por endpoint.", LATENCY_BUCKETS
+        )
+        self.calls = Histogram(
+            "dreamstay_function_calls_per_request", "Llamadas por request a funciones instrumentadas.", COUNT_BUCKETS
+        )
+        self.scans = Histogram(
+            "dreamstay_reservation_scan_rows", "Reservas recorridas por barrido, por origen.", COUNT_BUCKETS
+        )
+
+    @classmethod
+    def from_env(cls):
+        """DREAMSTAY_METRICS=1 habilita las métricas; DREAMSTAY_PROFILE_SLOW_MS además el perfilador."""
+        if os.environ.get("DREAMSTAY_METRICS", "0") in ("", "0"):
+            return cls()
+        profiler = None
+        slow_ms = os.environ.get("DREAMSTAY_PROFILE_SLOW_MS")
+        if slow_ms:
+            profiler = SlowRequestProfiler(
+                os.environ.get("DREAMSTAY_PROFILE_OUTPUT", "slow_requests.folded"),
+                threshold=float(slow_ms) / 1000,
+                interval=float(os.environ.get("DREAMSTAY_PROFILE_INTERVAL_MS", "5")) / 1000,
+            )
+        return cls(enabled=True, profiler=profiler)
+
+    def counted(self, function):
+        """Envuelve `function` para contar sus llamadas por request."""
+        name = function.__name__
+        self._functions.append(name)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            calls = getattr(self._local, "calls", None)
+            if calls is not None:
+                calls[name] += 1
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    def record_scan(self, source, rows):
+        if self.enabled:
+            with self._lock:
+                self.scans.observe((("source", source),), rows)
+
+    def init_app(self, app):
+        global _active
+        _active = self
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        self._local.calls = Counter()
+        self._local.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def _teardown_request(self, error=None):
+        from flask import request
+
+        started = getattr(self._local, "started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        calls, self._local.calls, self._local.started = self._local.calls, None, None
+        endpoint = request.url_rule.rule if request.url_rule is not None else "sin_ruta"
+        labels = (("endpoint", endpoint), ("method", request.method))
+        with self._lock:
+            self.latency.observe(labels, duration)
+            self._requests_total[labels + (("error", "1" if error else "0"),)] += 1
+            for name in self._functions:
+                count = calls[name]
+                self.calls.observe(labels + (("function", name),), count)
+                self._calls_total[name] += count
+        if self.profiler is not None:
+            self.profiler.stop(f"{request.method} {endpoint}", duration)
+
+    def render(self):
+        with self._lock:
+            lines = ["# HELP dreamstay_requests_total Requests atendidas.", "# TYPE dreamstay_requests_total counter"]
+            for labels, count in sorted(self._requests_total.items()):
+                label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+                lines.append(f"dreamstay_requests_total{{{label_text}}} {count}")
+            lines += [
+                "# HELP dreamstay_function_calls_total Llamadas a funciones instrumentadas.",
+                "# TYPE dreamstay_function_calls_total counter",
+            ]
+            for name in self._functions:
+                lines.append(f'dreamstay_function_calls_total{{function="{name}"}} {self._calls_total[name]}')
+            lines += self.latency.render() + self.calls.render() + self.scans.render()
+        return "\n".join(lines) + "\n"
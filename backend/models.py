@@ -0,0 +1,56 @@
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+
+DATE_OUTPUT_FORMAT = "%d/%m/%Y"
+
+
+@dataclass(slots=True)
+class Reservation:
+    """
+    Registro interno de una reserva. Las fechas se guardan como `date` y
+    solo se formatean a dd/mm/yyyy al serializar la respuesta JSON.
+    """
+
+    confirmation_code: str
+    hotel: str
+    room_type: str
+    room_name: str
+    contact_email: str
+    checkin: date
+    checkout: date
+    guests: list
+    price_detail: dict
+    total: float
+    offer: str | None
+    offers: list
+    counts: dict
+    nights: int
+    status: str
+    # Campos que solo existen a partir de cierto estado de la reserva
+    payment: dict | None = None
+    cancellation: dict | None = None
+    modification: dict | None = None
+    checkin_real: str | None = None
+    checkout_real: str | None = None
+    room_number: str | None = None
+    # Vencimiento de la retención mientras está pendiente de pago
+    expires_at: str | None = None
+
+    def to_dict(self) -> dict:
+        data = {}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value is None and field.default is None:
+                continue
+            if isinstance(value, date):
+                value = value.strftime(DATE_OUTPUT_FORMAT)
+            data[field.name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Reservation":
+        values = dict(data)
+        for name in ("checkin", "checkout"):
+            if isinstance(values[name], str):
+                values[name] = datetime.strptime(values[name], DATE_OUTPUT_FORMAT).date()
+        return cls(**values)
@@ -0,0 +1,311 @@
+from array import array
+from datetime import timedelta
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el camino en Python puro
+    np = None
+
+# Por debajo de este tamaño el costo de armar arreglos NumPy supera la ganancia
+NUMPY_MIN_BATCH = 256
+# Lo mismo para las estadías de un mismo calendario dentro de un lote
+NUMPY_MIN_GROUP = 64
+
+
+def base_rates(room):
+    rates = room.get("rates", {})
+    adult_rate = float(rates.get("adult", room.get("price", 0.0)))
+    return adult_rate, float(rates.get("child", adult_rate * 0.5)), float(rates.get("baby", 0.0))
+
+
+def resolve_rates(room, offers):
+    """
+    Tarifas por noche (adulto, niño, bebé) de la habitación tras aplicar
+    las ofertas en orden, junto con las etiquetas de las ofertas aplicadas.
+    """
+    adult_rate, child_rate, baby_rate = base_rates(room)
+
+    applied_offers = []
+    for offer in offers:
+        applied = False
+        if offer.get("adult_discount"):
+            adult_rate = max(adult_rate * (1 - float(offer["adult_discount"])), 0.0)
+            applied = True
+        if offer.get("children_discount"):
+            child_rate = max(child_rate * (1 - float(offer["children_discount"])), 0.0)
+            applied = True
+        if offer.get("baby_discount"):
+            baby_rate = max(baby_rate * (1 - float(offer["baby_discount"])), 0.0)
+            applied = True
+        if applied:
+            applied_offers.append(offer.get("description") or offer.get("name"))
+
+    return (adult_rate, child_rate, baby_rate), applied_offers
+
+
+def build_price_detail(nights, counts, rates, subtotal_per_night, total):
+    adult_rate, child_rate, baby_rate = rates
+    return {
+        "nights": nights,
+        "counts": counts,
+        "per_night": {
+            "adult": round(adult_rate, 2),
+            "child": round(child_rate, 2),
+            "baby": round(baby_rate, 2),
+        },
+        "subtotal_per_night": round(subtotal_per_night, 2),
+        "total": round(total, 2),
+    }
+
+
+def _counts_dict(counts):
+    adult, child, baby = counts
+    return {"adult": adult, "child": child, "baby": baby}
+
+
+def _stay(start, end):
+    nights = (end - start).days
+    if nights < 1:
+        return start, start + timedelta(days=1), 1
+    return start, end, nights
+
+
+def _stay_amounts(sums, counts, nights):
+    """(tarifas promedio por noche, subtotal por noche, total) a partir de las sumas de tarifas."""
+    adult_sum, child_sum, baby_sum = sums
+    adult, child, baby = counts
+    total = adult_sum * adult + child_sum * child + baby_sum * baby
+    return (adult_sum / nights, child_sum / nights, baby_sum / nights), total / nights, total
+
+
+def _discounts(offer):
+    return bool(offer.get("adult_discount") or offer.get("children_discount") or offer.get("baby_discount"))
+
+
+class RateCalendar:
+    """
+    Tarifas por noche de un tipo de habitación de un hotel con las ofertas
+    ya aplicadas noche por noche: una oferta descuenta solo las noches que
+    cubre, no toda la estadía que la toca.
+
+    Los inicios y fines de las ofertas parten el tiempo en tramos con el
+    mismo conjunto de ofertas vigentes; las tarifas de cada tramo se
+    resuelven una vez con `resolve_rates`. Sobre los días que cubren las
+    ofertas se guardan sumas prefijas por categoría (adulto, niño, bebé),
+    así la suma de tarifas de cualquier estadía sale de dos lecturas por
+    categoría; fuera de ese rango rige la tarifa base. `offers` son las
+    entradas (inicio, fin exclusivo, posición, oferta) del `OfferIndex`.
+    """
+
+    def __init__(self, room, offers):
+        self.base = base_rates(room)
+        boundaries = sorted({day for start, end, _, _ in offers for day in (start, end)})
+        # Tramo 0: antes de la primera oferta; el último: después de la última
+        self._segment_rates = [self.base]
+        self._segment_offers = [()]
+        if boundaries:
+            self._origin = boundaries[0].toordinal()
+            self._size = boundaries[-1].toordinal() - self._origin
+        else:
+            self._origin, self._size = 0, 0
+        self._day_segment = array("I")
+        daily = ([], [], [])
+        for start, end in zip(boundaries, boundaries[1:]):
+            active = sorted(
+                (position, offer) for offer_start, offer_end, position, offer in offers
+                if offer_start <= start and offer_end >= end
+            )
+            rates, labels = resolve_rates(room, [offer for _, offer in active])
+            self._segment_rates.append(rates)
+            # Posición en el catálogo junto a la etiqueta, para ordenar al unir tramos
+            positions = [position for position, offer in active if _discounts(offer)]
+            self._segment_offers.append(tuple(zip(positions, labels)))
+            nights = (end - start).days
+            self._day_segment.extend([len(self._segment_rates) - 1] * nights)
+            for category in range(3):
+                daily[category].extend([rates[category]] * nights)
+        self._segment_rates.append(self.base)
+        self._segment_offers.append(())
+        self._prefix = [array("d", accumulate(values, initial=0.0)) for values in daily]
+
+    def _segment(self, ordinal):
+        offset = ordinal - self._origin
+        if offset < 0:
+            return 0
+        if offset >= self._size:
+            return len(self._segment_rates) - 1
+        return self._day_segment[offset]
+
+    def sums(self, start, end):
+        """Suma de las tarifas (adulto, niño, bebé) de las noches de [start, end)."""
+        first, last = start.toordinal(), end.toordinal()
+        segment = self._segment(first)
+        if segment == self._segment(last - 1):
+            # Toda la estadía en un mismo tramo: tarifa fija por la cantidad de noches
+            nights = last - first
+            return tuple(rate * nights for rate in self._segment_rates[segment])
+        low = min(max(first - self._origin, 0), self._size)
+        high = min(max(last - self._origin, 0), self._size)
+        outside = (last - first) - (high - low)
+        return tuple(
+            prefix[high] - prefix[low] + base * outside for prefix, base in zip(self._prefix, self.base)
+        )
+
+    def total(self, counts, start, end):
+        """Precio sin redondear de la estadía [start, end) para `counts` (adulto, niño, bebé)."""
+        adult_sum, child_sum, baby_sum = self.sums(start, end)
+        adult, child, baby = counts
+        return adult_sum * adult + child_sum * child + baby_sum * baby
+
+    def applied_offers(self, start, end):
+        """Etiquetas de las ofertas que descuentan al menos una noche de [start, end)."""
+        first, last = self._segment(start.toordinal()), self._segment(end.toordinal() - 1)
+        if first == last:
+            return [label for _, label in self._segment_offers[first]]
+        found = {}
+        for segment in range(first, last + 1):
+            for position, label in self._segment_offers[segment]:
+                found.setdefault(position, label)
+        return [found[position] for position in sorted(found)]
+
+    def sums_array(self, first, last):
+        """
+        Versión vectorizada de `sums` para arreglos NumPy de ordinales de
+        entrada y salida: devuelve una matriz (n, 3) con las mismas
+        operaciones en el mismo orden que la versión escalar.
+        """
+        nights = (last - first).astype(np.float64)
+        segment_rates = np.array(self._segment_rates, dtype=np.float64)
+        if self._size:
+            day_segment = np.frombuffer(self._day_segment, dtype=np.uint32)
+            outer = len(self._segment_rates) - 1
+
+            def segment(ordinals):
+                offset = ordinals - self._origin
+                inside = day_segment[np.clip(offset, 0, self._size - 1)]
+                return np.where(offset < 0, 0, np.where(offset >= self._size, outer, inside))
+
+            first_segment, last_segment = segment(first), segment(last - 1)
+        else:
+            first_segment = last_segment = np.zeros(len(first), dtype=np.int64)
+        low = np.clip(first - self._origin, 0, self._size)
+        high = np.clip(last - self._origin, 0, self._size)
+        outside = (nights - (high - low)).astype(np.float64)
+        result = np.empty((len(first), 3), dtype=np.float64)
+        uniform = first_segment == last_segment
+        for category, (prefix, base) in enumerate(zip(self._prefix, self.base)):
+            prefix = np.frombuffer(prefix, dtype=np.float64)
+            result[:, category] = np.where(
+                uniform,
+                segment_rates[first_segment, category] * nights,
+                prefix[high] - prefix[low] + base * outside,
+            )
+        return result
+
+    def quote(self, counts, start, end):
+        """
+        Precio de la estadía [start, end) como par (detalle, ofertas
+        aplicadas), con `per_night` y `subtotal_per_night` como promedio por
+        noche. Una estadía sin noches se cotiza como una.
+        """
+        counts = _counts_tuple(counts)
+        start, end, nights = _stay(start, end)
+        rates, subtotal_per_night, total = _stay_amounts(self.sums(start, end), counts, nights)
+        detail = build_price_detail(nights, _counts_dict(counts), rates, subtotal_per_night, total)
+        return detail, self.applied_offers(start, end)
+
+
+def _counts_tuple(counts):
+    if isinstance(counts, dict):
+        return int(counts.get("adult", 0)), int(counts.get("child", 0)), int(counts.get("baby", 0))
+    adult, child, baby = counts
+    return int(adult), int(child), int(baby)
+
+
+class PriceBatch:
+    """
+    Resultado columnar de `calculate_prices`. Los montos se guardan sin
+    redondear; `detail(i)` materializa el mismo par (detalle, ofertas) que
+    devolvería `RateCalendar.quote` para el elemento i.
+    """
+
+    def __init__(self, counts, nights, rates, applied_offers, subtotal_per_night, total):
+        self.counts = counts
+        self.nights = nights
+        self.rates = rates
+        self.applied_offers = applied_offers
+        self.subtotal_per_night = subtotal_per_night
+        self.total = total
+
+    def __len__(self):
+        return len(self.nights)
+
+    def totals(self):
+        return [round(value, 2) for value in self.total]
+
+    def detail(self, index):
+        return (
+            build_price_detail(
+                self.nights[index],
+                _counts_dict(self.counts[index]),
+                self.rates[index],
+                self.subtotal_per_night[index],
+                self.total[index],
+            ),
+            list(self.applied_offers[index]),
+        )
+
+
+def calculate_prices(calendars, counts, starts, ends, use_numpy=None):
+    """
+    Versión por lotes de `RateCalendar.quote` para repreciar o simular
+    muchas estadías de una vez: recibe secuencias alineadas de calendarios
+    de tarifas, conteos (dict o tupla adulto/niño/bebé) y fechas de entrada
+    y salida. Con NumPy disponible y un lote grande, las sumas prefijas de
+    cada calendario se leen vectorizadas para todas sus estadías; los montos
+    resultan idénticos a los de la versión escalar porque las operaciones
+    son las mismas y en el mismo orden.
+    """
+    size = len(calendars)
+    if not (len(counts) == len(starts) == len(ends) == size):
+        raise ValueError("calendars, counts, starts y ends deben tener el mismo largo")
+
+    counts = [_counts_tuple(item) for item in counts]
+    stays = [_stay(start, end) for start, end in zip(starts, ends)]
+    nights = [item_nights for _, _, item_nights in stays]
+    applied = [calendar.applied_offers(start, end) for calendar, (start, end, _) in zip(calendars, stays)]
+
+    if use_numpy is None:
+        use_numpy = np is not None and size >= NUMPY_MIN_BATCH
+    if use_numpy and np is None:
+        raise RuntimeError("NumPy no está instalado")
+
+    if use_numpy and size:
+        sums = np.empty((size, 3), dtype=np.float64)
+        by_calendar = {}
+        for index, calendar in enumerate(calendars):
+            by_calendar.setdefault(id(calendar), (calendar, []))[1].append(index)
+        for calendar, indexes in by_calendar.values():
+            if len(indexes) < NUMPY_MIN_GROUP:
+                for index in indexes:
+                    sums[index] = calendar.sums(stays[index][0], stays[index][1])
+                continue
+            first = np.array([stays[index][0].toordinal() for index in indexes], dtype=np.int64)
+            last = np.array([stays[index][1].toordinal() for index in indexes], dtype=np.int64)
+            sums[indexes] = calendar.sums_array(first, last)
+        count_matrix = np.array(counts, dtype=np.float64)
+        night_array = np.array(nights, dtype=np.float64)
+        total = sums[:, 0] * count_matrix[:, 0] + sums[:, 1] * count_matrix[:, 1] + sums[:, 2] * count_matrix[:, 2]
+        rates = (sums / night_array[:, None]).tolist()
+        subtotal, total = (total / night_array).tolist(), total.tolist()
+    else:
+        amounts = [
+            _stay_amounts(calendar.sums(start, end), item_counts, item_nights)
+            for calendar, item_counts, (start, end, item_nights) in zip(calendars, counts, stays)
+        ]
+        rates = [item_rates for item_rates, _, _ in amounts]
+        subtotal = [item_subtotal for _, item_subtotal, _ in amounts]
+        total = [item_total for _, _, item_total in amounts]
+
+    return PriceBatch(counts, nights, rates, applied, subtotal, total)
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+
+def normalize_email(value: str) -> str:
+    return str(value or "").strip().lower()
+
+
+class ReservationRepository:
+    """
+    Reservas indexadas por código de confirmación y por correo de contacto
+    normalizado. Toda mutación de una reserva debe pasar por `save` para
+    que los índices secundarios sigan consistentes.
+
+    Con `capacity` retiene solo las `capacity` reservas usadas más
+    recientemente y descarta las demás (LRU): así la usa `ReservationTable`
+    como caché de filas ya armadas.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self._by_code = OrderedDict()
+        self._by_email = {}
+        # confirmation_code -> correo normalizado con el que quedó indexada
+        self._email_of = {}
+
+    def __len__(self):
+        return len(self._by_code)
+
+    def __iter__(self):
+        return iter(self._by_code.values())
+
+    def __contains__(self, code):
+        return code in self._by_code
+
+    def _unindex_email(self, code):
+        email = self._email_of.pop(code, None)
+        if email is None:
+            return
+        codes = self._by_email.get(email)
+        if codes is not None:
+            codes.discard(code)
+            if not codes:
+                del self._by_email[email]
+
+    def save(self, reservation):
+        code = reservation.confirmation_code
+        email = normalize_email(reservation.contact_email)
+        self._by_code[code] = reservation
+        self._by_code.move_to_end(code)
+        if self._email_of.get(code) != email:
+            self._unindex_email(code)
+            self._by_email.setdefault(email, set()).add(code)
+            self._email_of[code] = email
+        if self.capacity is not None:
+            while len(self._by_code) > self.capacity:
+                oldest, _ = self._by_code.popitem(last=False)
+                self._unindex_email(oldest)
+        return reservation
+
+    def remove(self, code):
+        reservation = self._by_code.pop(code, None)
+        if reservation is not None:
+            self._unindex_email(code)
+        return reservation
+
+    def get(self, code):
+        reservation = self._by_code.get(code)
+        if reservation is not None and self.capacity is not None:
+            self._by_code.move_to_end(code)
+        return reservation
+
+    def find(self, code, email):
+        """Reserva con ese código cuyo correo de contacto coincide (normalizado)."""
+        if self._email_of.get(code) != normalize_email(email):
+            return None
+        return self.get(code)
+
+    def clear(self):
+        self._by_code.clear()
+        self._by_email.clear()
+        self._email_of.clear()
+
+    def find_by_email(self, email):
+        codes = self._by_email.get(normalize_email(email), ())
+        return [self._by_code[code] for code in codes]
@@ -0,0 +1,169 @@
+import mmap
+import os
+import struct
+from array import array
+from datetime import date
+
+# magic, versión, origen (ordinal), días, slots, secuencia, token de la base
+_HEADER = struct.Struct("<4sIqIIQ16s")
+_HEADER_SIZE = 64
+_MAGIC = b"DSOC"
+_VERSION = 1
+_SEQ_OFFSET = 4 + 4 + 8 + 4 + 4
+_SEQ = struct.Struct("<Q")
+_READ_RETRIES = 8
+_MAX_COUNT = 0xFFFF
+
+
+class SharedOccupancy:
+    """
+    Ocupación por noche de cada (hotel, tipo de habitación) en un archivo
+    mapeado en memoria que comparten todos los workers: una matriz de
+    contadores uint16 de `slots` filas por `days` noches a partir de
+    `origin`. Cada worker la lee directamente desde el mmap, sin copiarla.
+
+    Hay un único escritor a la vez (quien tenga el lock de escritura de la
+    base), que deja la secuencia del encabezado impar mientras modifica la
+    matriz. Los lectores usan esa secuencia como seqlock: si cambió durante
+    la lectura, o si es impar, reintentan y luego devuelven None para que
+    se consulte la base. Si un escritor muere a mitad de camino la
+    secuencia queda impar y el archivo se reconstruye al próximo arranque.
+    """
+
+    def __init__(self, path, slots=4096, days=1096):
+        created = not os.path.exists(path) or os.path.getsize(path) < _HEADER_SIZE
+        if not created:
+            with open(path, "rb") as existing:
+                header = _HEADER.unpack(existing.read(_HEADER.size))
+            if header[0] != _MAGIC or header[1] != _VERSION:
+                created = True
+            else:
+                slots, days = header[4], header[3]
+        size = _HEADER_SIZE + slots * days * 2
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if created:
+            # Secuencia impar: todavía no se cargó desde la base
+            _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, 0, days, slots, 1, b"")
+        self.slots = slots
+        self.days = days
+        self._counts = memoryview(self._map)[_HEADER_SIZE:].cast("H")
+
+    @property
+    def _sequence(self):
+        return _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0]
+
+    @property
+    def sequence(self):
+        """Secuencia del seqlock: cambia con cada escritura que modifica la matriz; impar mientras hay una en curso."""
+        return self._sequence
+
+    def _set_sequence(self, value):
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, value)
+
+    @property
+    def origin(self):
+        return date.fromordinal(_HEADER.unpack_from(self._map, 0)[2])
+
+    @property
+    def token(self):
+        return _HEADER.unpack_from(self._map, 0)[6]
+
+    def needs_rebuild(self, token, today):
+        """
+        Hay que recargar desde la base si quedó una escritura a medias, si
+        el archivo corresponde a otra base o si la ventana de noches ya no
+        cubre al menos medio período hacia adelante.
+        """
+        if self._sequence % 2 or self.token != token:
+            return True
+        origin = self.origin
+        return today < origin or (today - origin).days > self.days // 2
+
+    def begin_write(self):
+        """Abre una escritura y devuelve la secuencia que había antes."""
+        previous = self._sequence
+        self._set_sequence(previous | 1)
+        return previous
+
+    def end_write(self, unchanged_since=None):
+        """
+        Cierra la escritura. Si no se modificó ninguna noche,
+        `unchanged_since` es la secuencia que devolvió `begin_write` y se
+        restaura, así lo leído con ella sigue valiendo; una secuencia impar
+        no se restaura. Cambios deshechos no cuentan como "sin modificar":
+        un lector pudo haber visto los valores intermedios.
+        """
+        if unchanged_since is not None and not unchanged_since % 2:
+            self._set_sequence(unchanged_since)
+        else:
+            self._set_sequence((self._sequence | 1) + 1)
+
+    def reset(self, origin, token):
+        """Vacía la matriz y fija un origen nuevo. Solo dentro de una escritura."""
+        self._map[_HEADER_SIZE:] = bytes(len(self._map) - _HEADER_SIZE)
+        _HEADER.pack_into(
+            self._map, 0, _MAGIC, _VERSION, origin.toordinal(), self.days, self.slots, self._sequence, token
+        )
+
+    def _window(self, start, end):
+        """Posiciones [a, b) de las noches del rango, o None si salen de la ventana."""
+        origin_ordinal = _HEADER.unpack_from(self._map, 0)[2]
+        first = start.toordinal() - origin_ordinal
+        last = end.toordinal() - origin_ordinal
+        if first < 0 or last > self.days:
+            return None
+        return first, last
+
+    def add(self, slot, start, end, delta):
+        """
+        Suma `delta` a las noches de [start, end) que caen en la ventana. Solo
+        dentro de una escritura. Si algún contador quedaría fuera de rango
+        (una liberación doble o un rollback desparejo) lanza ValueError sin
+        modificar ninguna noche, así deshacer los cambios sigue siendo exacto.
+        """
+        origin_ordinal = _HEADER.unpack_from(self._map, 0)[2]
+        base = slot * self.days
+        first = max(start.toordinal() - origin_ordinal, 0)
+        last = min(end.toordinal() - origin_ordinal, self.days)
+        counts = self._counts
+        nights = range(base + first, base + last)
+        if any(not 0 <= counts[index] + delta <= _MAX_COUNT for index in nights):
+            raise ValueError(
+                f"Ocupación compartida fuera de rango: slot {slot}, {start} a {end}, delta {delta}"
+            )
+        for index in nights:
+            counts[index] += delta
+
+    def load(self, slot, nights):
+        """Reemplaza la fila completa de `slot`. Solo dentro de una escritura."""
+        base = slot * self.days
+        self._counts[base:base + self.days] = array("H", nights)
+
+    def read(self, slot, start, end, writer=False):
+        """
+        Contadores de las noches de [start, end), o None si el rango sale de
+        la ventana o no se pudo leer una versión consistente. El escritor en
+        curso (`writer`) lee directamente sin verificar la secuencia.
+        """
+        for _ in range(1 if writer else _READ_RETRIES):
+            before = self._sequence
+            if before % 2 and not writer:
+                continue
+            window = self._window(start, end)
+            if window is None:
+                return None
+            base = slot * self.days
+            nights = self._counts[base + window[0]:base + window[1]].tolist()
+            if writer or self._sequence == before:
+                return nights
+        return None
+
+    def close(self):
+        self._counts.release()
+        self._map.close()
@@ -0,0 +1,984 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import ExitStack, nullcontext
+from datetime import date, timedelta
+
+from archive import ReservationArchive, TERMINAL_STATUSES
+from availability import AvailabilityIndex, BLOCKING_STATUSES, peak_occupancy
+from columnar import EstadiaTable, ReservationTable
+from journal import Journal
+from metrics import record_scan
+from models import Reservation
+from repository import normalize_email
+from shared_occupancy import SharedOccupancy
+
+
+class Storage:
+    """
+    Interfaz común de persistencia para reservas, estado de habitaciones
+    y estadías. Las reservas devueltas son registros `Reservation`; toda
+    mutación debe confirmarse con `save_reservation`.
+
+    Las reservas que llegan a un estado terminal se mueven con
+    `archive_reservation` al archivo frío (`archive`), así las consultas de
+    reservas vivas no las recorren.
+    """
+
+    archive = None
+
+    def get_reservation(self, code):
+        raise NotImplementedError
+
+    def has_reservation(self, code):
+        """Si hay una reserva viva con ese código, sin leerla entera."""
+        raise NotImplementedError
+
+    def find_reservation(self, code, email):
+        raise NotImplementedError
+
+    def save_reservation(self, reservation):
+        raise NotImplementedError
+
+    def iter_reservations(self):
+        raise NotImplementedError
+
+    def peak_occupancy(self, hotel_name, room_type, start, end, ignore_code=None):
+        """Máximo de habitaciones del tipo ocupadas a la vez en [start, end)."""
+        raise NotImplementedError
+
+    def nightly_occupancy(self, hotel_name, room_type, start, end):
+        """Habitaciones ocupadas en cada noche de [start, end), en orden."""
+        raise NotImplementedError
+
+    def occupancy_version(self):
+        """
+        Marca de la ocupación que cambia cuando otro proceso puede haberla
+        modificado: un resultado calculado con otra marca ya no vale. El
+        almacenamiento propio del proceso devuelve siempre la misma (sus
+        cambios se invalidan uno por uno); None si no hay forma de saberlo
+        o hay una escritura en curso, y entonces no se debe cachear.
+        """
+        return 0
+
+    def available_units(self, hotel_name, room_type, start, end, units, ignore_code=None):
+        peak = self.peak_occupancy(hotel_name, room_type, start, end, ignore_code)
+        return max(units - peak, 0)
+
+    def reserve(self, reservation, units, expected_status=None):
+        """
+        Verifica que quede al menos una de las `units` habitaciones del tipo
+        y guarda la reserva en una única operación atómica. Si
+        `expected_status` está definido, la reserva almacenada debe seguir en
+        ese estado (compare-and-set). Devuelve False si ya no hay lugar o el
+        estado cambió entretanto.
+        """
+        raise NotImplementedError
+
+    def bulk_reserve(self, reservations, units_by_key, all_or_nothing=True):
+        """
+        Alta masiva de reservas nuevas en una única operación atómica. La
+        disponibilidad se verifica contra una sola foto de la ocupación por
+        noche de cada tipo de habitación, a la que se suman en orden las
+        reservas aceptadas del lote. Devuelve {índice: motivo} con las
+        reservas rechazadas ("duplicada" o "sin_disponibilidad"); si
+        `all_or_nothing` es verdadero y hay rechazos no se guarda ninguna.
+        """
+        raise NotImplementedError
+
+    def _plan_bulk(self, reservations, units_by_key, existing_codes):
+        rejected = {}
+        seen = set(existing_codes)
+        ranges = {}
+        for reservation in reservations:
+            key = (reservation.hotel, reservation.room_type)
+            start, end = ranges.get(key, (reservation.checkin, reservation.checkout))
+            ranges[key] = (min(start, reservation.checkin), max(end, reservation.checkout))
+        occupancy = {
+            key: self.nightly_occupancy(key[0], key[1], start, end) for key, (start, end) in ranges.items()
+        }
+
+        for index, reservation in enumerate(reservations):
+            code = reservation.confirmation_code
+            if code in seen:
+                rejected[index] = "duplicada"
+                continue
+            key = (reservation.hotel, reservation.room_type)
+            nights = occupancy[key]
+            offset = (reservation.checkin - ranges[key][0]).days
+            stop = offset + (reservation.checkout - reservation.checkin).days
+            if max(nights[offset:stop], default=0) >= units_by_key.get(key, 0):
+                rejected[index] = "sin_disponibilidad"
+                continue
+            seen.add(code)
+            if reservation.status in BLOCKING_STATUSES:
+                for night in range(offset, stop):
+                    nights[night] += 1
+        return rejected
+
+    def archive_reservation(self, reservation, expected_status=None):
+        """
+        Guarda la reserva, ya en estado terminal, en el archivo y la saca
+        del almacenamiento vivo. Si `expected_status` está definido, la
+        reserva almacenada debe seguir en ese estado (compare-and-set);
+        devuelve None si cambió entretanto y no archiva nada.
+        """
+        raise NotImplementedError
+
+    def archive_terminal(self):
+        """
+        Al arrancar: archiva las reservas terminales que quedaron en el
+        almacenamiento vivo y descarta las que ya estaban archivadas (una
+        caída entre el archivo y la baja). Devuelve cuántas sacó.
+        """
+        raise NotImplementedError
+
+    def iter_holds(self):
+        """Itera (código, vencimiento) de las reservas pendientes de pago."""
+        raise NotImplementedError
+
+    def expire_hold(self, code, now):
+        """
+        Da de baja la reserva si sigue pendiente de pago y su vencimiento
+        (marca "YYYY-MM-DD HH:MM:SS") no es posterior a `now`. Devuelve la
+        reserva eliminada, o None si se pagó, cambió o ya no existe.
+        """
+        raise NotImplementedError
+
+    def room_statuses(self, hotel_name, room_type):
+        """Estado de cada habitación física del tipo: {número: estado}."""
+        raise NotImplementedError
+
+    def assign_room(self, hotel_name, room_type, room_numbers):
+        """
+        Marca como ocupada la primera habitación libre de `room_numbers` y
+        devuelve su número, o None si están todas ocupadas.
+        """
+        raise NotImplementedError
+
+    def release_room(self, hotel_name, room_type, room_number):
+        raise NotImplementedError
+
+    def add_estadia(self, estadia):
+        raise NotImplementedError
+
+    def iter_estadias(self, after_id=0, hotel_name=None, room_type=None, start=None, end=None):
+        """
+        Itera (id, estadía) en orden de alta a partir del id `after_id`,
+        filtrando por hotel, tipo de habitación y estadías que se solapan con
+        los días [start, end] (fechas ISO, ambos extremos inclusive).
+        """
+        raise NotImplementedError
+
+
+def hold_expired(reservation, now):
+    return (
+        reservation is not None
+        and reservation.status == "pendiente_pago"
+        and reservation.expires_at is not None
+        and reservation.expires_at <= now
+    )
+
+
+class MemoryStorage(Storage):
+    """
+    Almacenamiento en memoria del proceso (comportamiento por defecto). Con
+    un `Journal` cada mutación se registra en disco y el estado se
+    reconstruye al crear el almacenamiento.
+
+    Reservas y estadías se guardan en tablas columnares (`columnar`) y se
+    arman como registros solo al leerlas: una reserva devuelta es una copia
+    y los cambios se confirman con `save_reservation`.
+    """
+
+    def __init__(self, journal=None, archive=None):
+        self.archive = archive if archive is not None else ReservationArchive()
+        self.reservations = ReservationTable()
+        self.availability = AvailabilityIndex()
+        self.room_status = {}
+        self.estadias = EstadiaTable()
+        self._room_locks = {}
+        self._room_locks_guard = threading.Lock()
+        self.journal = journal
+        if journal is not None:
+            self._restore()
+
+    def _journaled(self, *event):
+        if self.journal is None:
+            return nullcontext()
+        return self.journal.record(event)
+
+    def _restore(self):
+        state, events = self.journal.recover()
+        if state is not None:
+            self.reservations = state["reservations"]
+            self.room_status = state["room_status"]
+            self.estadias = state["estadias"]
+            # Snapshots anteriores a las tablas columnares guardaban listas
+            if isinstance(self.reservations, list):
+                self.reservations = ReservationTable()
+                for reservation in state["reservations"]:
+                    self.reservations.save(reservation)
+            if isinstance(self.estadias, list):
+                self.estadias = EstadiaTable()
+                self.estadias.extend(state["estadias"])
+        # Solo el último estado de cada reserva llega a la tabla (None: baja)
+        reservations = {}
+        for kind, *payload in events:
+            if kind == "reserva":
+                reservations[payload[0].confirmation_code] = payload[0]
+            elif kind == "baja":
+                reservations[payload[0]] = None
+            elif kind == "habitacion":
+                hotel_name, room_type, room_number, status = payload
+                self.room_status.setdefault((hotel_name, room_type), {})[room_number] = status
+            elif kind == "estadia":
+                self.estadias.append(payload[0])
+        for code, reservation in reservations.items():
+            if reservation is None:
+                self.reservations.remove(code)
+            else:
+                self.reservations.save(reservation)
+        # El índice de disponibilidad se arma una sola vez con el estado final
+        self.availability.rebuild(self.reservations.stays())
+        self.journal.start(self._snapshot_state)
+
+    def _snapshot_state(self):
+        # Copias de las columnas (arrays y listas, sin armar filas): lo que
+        # cambie mientras se serializa el snapshot queda en la generación
+        # nueva del journal y se reaplica.
+        return {
+            "reservations": self.reservations.copy(),
+            "room_status": {key: dict(statuses) for key, statuses in self.room_status.items()},
+            "estadias": self.estadias.copy(),
+        }
+
+    def get_reservation(self, code):
+        return self.reservations.get(code)
+
+    def has_reservation(self, code):
+        return code in self.reservations
+
+    def find_reservation(self, code, email):
+        return self.reservations.find(code, email)
+
+    def save_reservation(self, reservation):
+        with self._room_locks_for(reservation):
+            self._store(reservation)
+        return reservation
+
+    def _store(self, reservation):
+        with self._journaled("reserva", reservation):
+            self.reservations.save(reservation)
+            self.availability.sync(reservation)
+
+    def iter_reservations(self):
+        # La tabla toma una foto de los códigos y arma cada reserva al pedirla
+        return iter(self.reservations)
+
+    def peak_occupancy(self, hotel_name, room_type, start, end, ignore_code=None):
+        return self.availability.peak_occupancy(hotel_name, room_type, start, end, ignore_code)
+
+    def nightly_occupancy(self, hotel_name, room_type, start, end):
+        return self.availability.nightly_occupancy(hotel_name, room_type, start, end)
+
+    def available_units(self, hotel_name, room_type, start, end, units, ignore_code=None):
+        # Con una sola habitación alcanza con saber si alguna estadía se solapa (O(log n))
+        if units == 1:
+            return 0 if self.availability.has_overlap(hotel_name, room_type, start, end, ignore_code) else 1
+        return super().available_units(hotel_name, room_type, start, end, units, ignore_code)
+
+    def _room_lock(self, key):
+        lock = self._room_locks.get(key)
+        if lock is None:
+            with self._room_locks_guard:
+                lock = self._room_locks.setdefault(key, threading.RLock())
+        return lock
+
+    def _room_locks_for(self, reservation):
+        """
+        Bloquea el tipo de habitación destino y el que ocupa hoy la reserva
+        (si cambia de tipo), siempre en el mismo orden.
+        """
+        code = reservation.confirmation_code
+        key = (reservation.hotel, reservation.room_type)
+        while True:
+            current = self.reservations.room_key(code)
+            keys = {key}
+            if current is not None:
+                keys.add(current)
+            stack = ExitStack()
+            for lock_key in sorted(keys):
+                stack.enter_context(self._room_lock(lock_key))
+            current = self.reservations.room_key(code)
+            if current is None or current in keys:
+                return stack
+            stack.close()
+
+    def reserve(self, reservation, units, expected_status=None):
+        code = reservation.confirmation_code
+        with self._room_locks_for(reservation):
+            current = self.reservations.get(code)
+            if expected_status is not None and (current is None or current.status != expected_status):
+                return False
+            if not self.available_units(
+                reservation.hotel, reservation.room_type,
+                reservation.checkin, reservation.checkout, units, ignore_code=code,
+            ):
+                return False
+            self._store(reservation)
+            return True
+
+    def bulk_reserve(self, reservations, units_by_key, all_or_nothing=True):
+        with ExitStack() as stack:
+            for key in sorted({(item.hotel, item.room_type) for item in reservations}):
+                stack.enter_context(self._room_lock(key))
+            existing = [item.confirmation_code for item in reservations if item.confirmation_code in self.reservations]
+            rejected = self._plan_bulk(reservations, units_by_key, existing)
+            if rejected and all_or_nothing:
+                return rejected
+            for index, reservation in enumerate(reservations):
+                if index not in rejected:
+                    self._store(reservation)
+            return rejected
+
+    def _drop(self, code):
+        with self._journaled("baja", code):
+            self.reservations.remove(code)
+            self.availability.remove(code)
+
+    def archive_reservation(self, reservation, expected_status=None):
+        with self._room_locks_for(reservation):
+            current = self.reservations.get(reservation.confirmation_code)
+            if expected_status is not None and (current is None or current.status != expected_status):
+                return None
+            self.archive.append([reservation])
+            self._drop(reservation.confirmation_code)
+        return reservation
+
+    def archive_terminal(self):
+        terminal = [item for item in self.reservations if item.status in TERMINAL_STATUSES]
+        self.archive.append(terminal)
+        archived = self.archive.existing(item.confirmation_code for item in self.reservations)
+        for code in archived:
+            self._drop(code)
+        return len(archived)
+
+    def iter_holds(self):
+        for reservation in self.reservations:
+            if reservation.status == "pendiente_pago":
+                yield reservation.confirmation_code, reservation.expires_at
+
+    def expire_hold(self, code, now):
+        reservation = self.reservations.get(code)
+        if reservation is None:
+            return None
+        with self._room_locks_for(reservation):
+            reservation = self.reservations.get(code)
+            if not hold_expired(reservation, now):
+                return None
+            self._drop(code)
+            return reservation
+
+    def room_statuses(self, hotel_name, room_type):
+        return dict(self.room_status.get((hotel_name, room_type), {}))
+
+    def assign_room(self, hotel_name, room_type, room_numbers):
+        key = (hotel_name, room_type)
+        with self._room_lock(key):
+            statuses = self.room_status.setdefault(key, {})
+            for number in room_numbers:
+                if statuses.get(number) != "Ocupada":
+                    with self._journaled("habitacion", hotel_name, room_type, number, "Ocupada"):
+                        statuses[number] = "Ocupada"
+                    return number
+        return None
+
+    def release_room(self, hotel_name, room_type, room_number):
+        key = (hotel_name, room_type)
+        with self._room_lock(key), self._journaled("habitacion", hotel_name, room_type, room_number, "Disponible"):
+            self.room_status.setdefault(key, {})[room_number] = "Disponible"
+
+    def add_estadia(self, estadia):
+        with self._journaled("estadia", estadia):
+            self.estadias.append(estadia)
+
+    def iter_estadias(self, after_id=0, hotel_name=None, room_type=None, start=None, end=None):
+        # Los ids son la posición (desde 1) en la tabla, que solo crece
+        return self.estadias.iter_matching(after_id, hotel_name, room_type, start, end)
+
+
+_SCHEMA = """
+-- La clave primaria ya indexa confirmation_code
+CREATE TABLE IF NOT EXISTS reservations (
+    confirmation_code TEXT PRIMARY KEY,
+    hotel TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    contact_email TEXT NOT NULL,
+    checkin TEXT NOT NULL,
+    checkout TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_stay
+    ON reservations (hotel, room_type, checkin, checkout);
+-- Reservas retenidas sin pagar, que recorre el vencimiento al arrancar
+CREATE INDEX IF NOT EXISTS idx_reservations_holds
+    ON reservations (confirmation_code) WHERE status = 'pendiente_pago';
+CREATE TABLE IF NOT EXISTS room_status (
+    hotel TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    room_number TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (hotel, room_type, room_number)
+);
+CREATE TABLE IF NOT EXISTS estadias (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hotel TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    checkin TEXT NOT NULL,
+    checkout TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_estadias_room
+    ON estadias (hotel, room_type, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+-- Fila de la ocupación compartida (mmap) asignada a cada tipo de habitación
+CREATE TABLE IF NOT EXISTS occupancy_slots (
+    hotel TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    slot INTEGER NOT NULL UNIQUE,
+    PRIMARY KEY (hotel, room_type)
+);
+"""
+
+# Sentencias fijas: sqlite3 las compila una vez y las reutiliza desde la
+# caché de sentencias preparadas de cada conexión.
+_SELECT_RESERVATION = "SELECT data FROM reservations WHERE confirmation_code = ?"
+_SELECT_RESERVATION_STATUS = "SELECT status FROM reservations WHERE confirmation_code = ?"
+_SELECT_RESERVATION_SPAN = (
+    "SELECT hotel, room_type, checkin, checkout, status FROM reservations WHERE confirmation_code = ?"
+)
+_SELECT_RESERVATIONS = "SELECT data FROM reservations ORDER BY rowid"
+_SELECT_HOLDS = "SELECT data FROM reservations WHERE status = 'pendiente_pago'"
+_SELECT_TERMINAL = "SELECT data FROM reservations WHERE status IN ({})".format(
+    ", ".join("'{}'".format(status) for status in TERMINAL_STATUSES)
+)
+_SELECT_CODES = "SELECT confirmation_code FROM reservations"
+_DELETE_RESERVATION = "DELETE FROM reservations WHERE confirmation_code = ?"
+_DELETE_HOLD = "DELETE FROM reservations WHERE confirmation_code = ? AND status = 'pendiente_pago'"
+_SELECT_EXISTING_CODES = "SELECT confirmation_code FROM reservations WHERE confirmation_code IN ({})"
+# Menor que el límite de parámetros por sentencia de SQLite (999 en versiones viejas)
+_BULK_CHUNK = 500
+# Noches pasadas que conserva la ocupación compartida al reconstruirse
+_OCCUPANCY_PAST_DAYS = 30
+_SELECT_RESERVATION_BY_EMAIL = (
+    "SELECT data FROM reservations WHERE confirmation_code = ? AND contact_email = ?"
+)
+_UPSERT_RESERVATION = """
+INSERT INTO reservations (confirmation_code, hotel, room_type, contact_email, checkin, checkout, status, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (confirmation_code) DO UPDATE SET
+    hotel = excluded.hotel,
+    room_type = excluded.room_type,
+    contact_email = excluded.contact_email,
+    checkin = excluded.checkin,
+    checkout = excluded.checkout,
+    status = excluded.status,
+    data = excluded.data
+"""
+_SELECT_OVERLAPPING_STAYS = (
+    "SELECT checkin, checkout FROM reservations"
+    " WHERE hotel = ? AND room_type = ? AND checkin < ? AND checkout > ?"
+    " AND status IN ({}) AND confirmation_code != ?"
+).format(", ".join("'{}'".format(status) for status in BLOCKING_STATUSES))
+_SELECT_BLOCKING_STAYS = (
+    "SELECT hotel, room_type, checkin, checkout FROM reservations"
+    " WHERE checkout > ? AND status IN ({})"
+).format(", ".join("'{}'".format(status) for status in BLOCKING_STATUSES))
+_SELECT_SLOT = "SELECT slot FROM occupancy_slots WHERE hotel = ? AND room_type = ?"
+_COUNT_SLOTS = "SELECT COUNT(*) FROM occupancy_slots"
+_INSERT_SLOT = "INSERT INTO occupancy_slots (hotel, room_type, slot) VALUES (?, ?, ?)"
+_SELECT_ROOM_STATUSES = (
+    "SELECT room_number, status FROM room_status WHERE hotel = ? AND room_type = ?"
+)
+_UPSERT_ROOM_STATUS = """
+INSERT INTO room_status (hotel, room_type, room_number, status) VALUES (?, ?, ?, ?)
+ON CONFLICT (hotel, room_type, room_number) DO UPDATE SET status = excluded.status
+"""
+_INSERT_ESTADIA = (
+    "INSERT INTO estadias (hotel, room_type, checkin, checkout, data) VALUES (?, ?, ?, ?, ?)"
+)
+
+
+class SQLiteStorage(Storage):
+    """
+    Almacenamiento compartido en un archivo SQLite en modo WAL, apto para
+    varios workers de gunicorn. Cada hilo usa su propia conexión.
+
+    Con `shared_occupancy` la ocupación por noche de las estadías
+    bloqueantes se mantiene además en un archivo mapeado en memoria
+    (`<ruta>-occupancy`) que comparten todos los workers: las consultas de
+    disponibilidad leen de ahí sin tocar la base. Solo se modifica dentro
+    de una transacción `BEGIN IMMEDIATE`, cuyo lock de escritura garantiza
+    un único escritor entre procesos.
+    """
+
+    def __init__(self, path, shared_occupancy=True, archive=None):
+        self.path = path
+        self.archive = archive if archive is not None else ReservationArchive(path + "-archive")
+        self._local = threading.local()
+        self.occupancy = None
+        self._slots = {}
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('occupancy_token', ?)", (os.urandom(8).hex(),)
+            )
+            token = conn.execute("SELECT value FROM meta WHERE key = 'occupancy_token'").fetchone()[0]
+        if shared_occupancy:
+            self.occupancy = SharedOccupancy(path + "-occupancy")
+            self._rebuild_occupancy(token.encode())
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # Tras un fork (gunicorn --preload) el hijo abre su propia conexión
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _begin(self, conn):
+        """BEGIN IMMEDIATE que además abre una escritura de la ocupación compartida."""
+        conn.execute("BEGIN IMMEDIATE")
+        # Cambios aplicados al mmap en esta transacción, para deshacerlos si se revierte
+        self._local.pending = []
+        self._local.new_slots = []
+        if self.occupancy is not None:
+            self._local.sequence = self.occupancy.begin_write()
+
+    def _commit(self, conn):
+        conn.commit()
+        pending, self._local.pending = self._local.pending, None
+        if self.occupancy is not None:
+            # Sin cambios en la matriz la secuencia vuelve a la anterior y no invalida cachés
+            self.occupancy.end_write(None if pending else self._local.sequence)
+
+    def _rollback(self, conn):
+        conn.rollback()
+        pending, self._local.pending = getattr(self._local, "pending", None), None
+        if self.occupancy is not None and pending is not None:
+            for slot, start, end, delta in reversed(pending):
+                self.occupancy.add(slot, start, end, -delta)
+            for key in self._local.new_slots:
+                self._slots.pop(key, None)
+            # Aunque deshacer sea exacto, un lector pudo ver los cambios intermedios:
+            # la secuencia solo se restaura si no se tocó ninguna noche
+            self.occupancy.end_write(None if pending else self._local.sequence)
+
+    def _slot(self, hotel_name, room_type, create=False):
+        """Fila del mmap del tipo de habitación, o None si no tiene (ni hay lugar para una)."""
+        key = (hotel_name, room_type)
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+        conn = self._connection()
+        row = conn.execute(_SELECT_SLOT, key).fetchone()
+        if row is not None:
+            slot = row[0]
+        elif create:
+            slot = conn.execute(_COUNT_SLOTS).fetchone()[0]
+            if slot >= self.occupancy.slots:
+                return None
+            conn.execute(_INSERT_SLOT, (hotel_name, room_type, slot))
+            self._local.new_slots.append(key)
+        else:
+            return None
+        self._slots[key] = slot
+        return slot
+
+    def _shift(self, hotel_name, room_type, start, end, delta):
+        slot = self._slot(hotel_name, room_type, create=True)
+        if slot is not None:
+            self.occupancy.add(slot, start, end, delta)
+            self._local.pending.append((slot, start, end, delta))
+
+    def _track(self, conn, reservation, is_new=False):
+        """Refleja en la ocupación compartida el cambio que produce guardar `reservation`."""
+        row = None if is_new else conn.execute(_SELECT_RESERVATION_SPAN, (reservation.confirmation_code,)).fetchone()
+        if row is not None and row[4] in BLOCKING_STATUSES:
+            self._shift(row[0], row[1], date.fromisoformat(row[2]), date.fromisoformat(row[3]), -1)
+        if reservation.status in BLOCKING_STATUSES:
+            self._shift(reservation.hotel, reservation.room_type, reservation.checkin, reservation.checkout, 1)
+
+    def _rebuild_occupancy(self, token):
+        """Recarga la ocupación compartida desde la base si quedó inconsistente o vieja."""
+        conn = self._connection()
+        today = date.today()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Otro worker pudo haberla reconstruido mientras se esperaba el lock
+            if not self.occupancy.needs_rebuild(token, today):
+                conn.rollback()
+                return
+            self._local.new_slots = []
+            self.occupancy.begin_write()
+            origin = today - timedelta(days=_OCCUPANCY_PAST_DAYS)
+            self.occupancy.reset(origin, token)
+            days = self.occupancy.days
+            deltas = {}
+            for hotel_name, room_type, checkin, checkout in conn.execute(
+                _SELECT_BLOCKING_STAYS, (origin.isoformat(),)
+            ).fetchall():
+                slot = self._slot(hotel_name, room_type, create=True)
+                if slot is None:
+                    continue
+                first = max((date.fromisoformat(checkin) - origin).days, 0)
+                last = min((date.fromisoformat(checkout) - origin).days, days)
+                if first < last:
+                    slot_deltas = deltas.setdefault(slot, [0] * (days + 1))
+                    slot_deltas[first] += 1
+                    slot_deltas[last] -= 1
+            for slot, slot_deltas in deltas.items():
+                nights = []
+                current = 0
+                for delta in slot_deltas[:days]:
+                    current += delta
+                    nights.append(current)
+                self.occupancy.load(slot, nights)
+            conn.commit()
+            self.occupancy.end_write()
+        except BaseException:
+            conn.rollback()
+            for key in self._local.new_slots:
+                self._slots.pop(key, None)
+            raise
+
+    def occupancy_version(self):
+        # Cada worker escribe la ocupación compartida: su secuencia cambia con
+        # cualquier escritura de cualquier proceso. Sin ella no hay marca común.
+        if self.occupancy is None:
+            return None
+        sequence = self.occupancy.sequence
+        return None if sequence % 2 else sequence
+
+    def _shared_nights(self, hotel_name, room_type, start, end):
+        """Ocupación por noche desde el mmap, o None si hay que consultar la base."""
+        if self.occupancy is None:
+            return None
+        slot = self._slot(hotel_name, room_type)
+        if slot is None:
+            return None
+        writer = getattr(self._local, "pending", None) is not None
+        return self.occupancy.read(slot, start, end, writer=writer)
+
+    @staticmethod
+    def _row_to_reservation(row):
+        if row is None:
+            return None
+        return Reservation.from_dict(json.loads(row[0]))
+
+    def get_reservation(self, code):
+        row = self._connection().execute(_SELECT_RESERVATION, (code,)).fetchone()
+        return self._row_to_reservation(row)
+
+    def has_reservation(self, code):
+        return self._connection().execute(_SELECT_RESERVATION_STATUS, (code,)).fetchone() is not None
+
+    def find_reservation(self, code, email):
+        row = self._connection().execute(
+            _SELECT_RESERVATION_BY_EMAIL, (code, normalize_email(email))
+        ).fetchone()
+        return self._row_to_reservation(row)
+
+    @staticmethod
+    def _reservation_row(reservation):
+        return (
+            reservation.confirmation_code,
+            reservation.hotel,
+            reservation.room_type,
+            normalize_email(reservation.contact_email),
+            reservation.checkin.isoformat(),
+            reservation.checkout.isoformat(),
+            reservation.status,
+            json.dumps(reservation.to_dict()),
+        )
+
+    def _upsert(self, conn, reservation):
+        if self.occupancy is not None:
+            self._track(conn, reservation)
+        conn.execute(_UPSERT_RESERVATION, self._reservation_row(reservation))
+
+    def save_reservation(self, reservation):
+        conn = self._connection()
+        self._begin(conn)
+        try:
+            self._upsert(conn, reservation)
+            self._commit(conn)
+        except BaseException:
+            self._rollback(conn)
+            raise
+        return reservation
+
+    def iter_reservations(self):
+        for row in self._connection().execute(_SELECT_RESERVATIONS):
+            yield self._row_to_reservation(row)
+
+    def reserve(self, reservation, units, expected_status=None):
+        conn = self._connection()
+        # BEGIN IMMEDIATE toma el lock de escritura de la base antes de leer,
+        # así ningún otro worker puede insertar entre la verificación y el alta.
+        self._begin(conn)
+        try:
+            code = reservation.confirmation_code
+            if expected_status is not None:
+                row = conn.execute(_SELECT_RESERVATION_STATUS, (code,)).fetchone()
+                if row is None or row[0] != expected_status:
+                    self._rollback(conn)
+                    return False
+            if not self.available_units(
+                reservation.hotel, reservation.room_type,
+                reservation.checkin, reservation.checkout, units, ignore_code=code,
+            ):
+                self._rollback(conn)
+                return False
+            self._upsert(conn, reservation)
+            self._commit(conn)
+            return True
+        except BaseException:
+            self._rollback(conn)
+            raise
+
+    def bulk_reserve(self, reservations, units_by_key, all_or_nothing=True):
+        conn = self._connection()
+        self._begin(conn)
+        try:
+            codes = [item.confirmation_code for item in reservations]
+            existing = []
+            for chunk_start in range(0, len(codes), _BULK_CHUNK):
+                chunk = codes[chunk_start:chunk_start + _BULK_CHUNK]
+                query = _SELECT_EXISTING_CODES.format(",".join("?" * len(chunk)))
+                existing.extend(row[0] for row in conn.execute(query, chunk))
+            rejected = self._plan_bulk(reservations, units_by_key, existing)
+            if rejected and all_or_nothing:
+                self._rollback(conn)
+                return rejected
+            accepted = [reservation for index, reservation in enumerate(reservations) if index not in rejected]
+            if self.occupancy is not None:
+                for reservation in accepted:
+                    self._track(conn, reservation, is_new=True)
+            conn.executemany(_UPSERT_RESERVATION, (self._reservation_row(reservation) for reservation in accepted))
+            self._commit(conn)
+            return rejected
+        except BaseException:
+            self._rollback(conn)
+            raise
+
+    def peak_occupancy(self, hotel_name, room_type, start, end, ignore_code=None):
+        nights = self._shared_nights(hotel_name, room_type, start, end)
+        if nights is not None:
+            if ignore_code:
+                row = self._connection().execute(_SELECT_RESERVATION_SPAN, (ignore_code,)).fetchone()
+                if row is not None and row[4] in BLOCKING_STATUSES and (row[0], row[1]) == (hotel_name, room_type):
+                    first = max((date.fromisoformat(row[2]) - start).days, 0)
+                    last = min((date.fromisoformat(row[3]) - start).days, len(nights))
+                    for night in range(first, last):
+                        nights[night] -= 1
+            return max(nights, default=0)
+        rows = self._connection().execute(
+            _SELECT_OVERLAPPING_STAYS,
+            (hotel_name, room_type, end.isoformat(), start.isoformat(), ignore_code or ""),
+        ).fetchall()
+        record_scan("sqlite", len(rows))
+        stays = [(date.fromisoformat(checkin), date.fromisoformat(checkout)) for checkin, checkout in rows]
+        return peak_occupancy(stays, start, end)
+
+    def nightly_occupancy(self, hotel_name, room_type, start, end):
+        nights = self._shared_nights(hotel_name, room_type, start, end)
+        if nights is not None:
+            return nights
+        rows = self._connection().execute(
+            _SELECT_OVERLAPPING_STAYS,
+            (hotel_name, room_type, end.isoformat(), start.isoformat(), ""),
+        ).fetchall()
+        record_scan("sqlite", len(rows))
+        nights = (end - start).days
+        # Arreglo de diferencias: +1 al entrar, -1 al salir, luego suma acumulada
+        deltas = [0] * (nights + 1)
+        for checkin, checkout in rows:
+            deltas[max((date.fromisoformat(checkin) - start).days, 0)] += 1
+            deltas[min((date.fromisoformat(checkout) - start).days, nights)] -= 1
+        occupancy = []
+        current = 0
+        for delta in deltas[:nights]:
+            current += delta
+            occupancy.append(current)
+        return occupancy
+
+    def _delete(self, conn, reservation):
+        # Con el estado terminal de `reservation`, _track solo descuenta la estadía guardada
+        if self.occupancy is not None:
+            self._track(conn, reservation)
+        conn.execute(_DELETE_RESERVATION, (reservation.confirmation_code,))
+
+    def archive_reservation(self, reservation, expected_status=None):
+        conn = self._connection()
+        self._begin(conn)
+        try:
+            if expected_status is not None:
+                row = conn.execute(_SELECT_RESERVATION_STATUS, (reservation.confirmation_code,)).fetchone()
+                if row is None or row[0] != expected_status:
+                    self._rollback(conn)
+                    return None
+            # Primero el archivo: si el proceso cae antes de la baja, archive_terminal la completa
+            self.archive.append([reservation])
+            self._delete(conn, reservation)
+            self._commit(conn)
+        except BaseException:
+            self._rollback(conn)
+            raise
+        return reservation
+
+    def archive_terminal(self):
+        conn = self._connection()
+        self.archive.append(self._row_to_reservation(row) for row in conn.execute(_SELECT_TERMINAL).fetchall())
+        archived = self.archive.existing(row[0] for row in conn.execute(_SELECT_CODES).fetchall())
+        if not archived:
+            return 0
+        self._begin(conn)
+        try:
+            for code in archived:
+                self._delete(conn, self.archive.get(code))
+            self._commit(conn)
+        except BaseException:
+            self._rollback(conn)
+            raise
+        return len(archived)
+
+    def iter_holds(self):
+        for row in self._connection().execute(_SELECT_HOLDS):
+            reservation = self._row_to_reservation(row)
+            yield reservation.confirmation_code, reservation.expires_at
+
+    def expire_hold(self, code, now):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            reservation = self._row_to_reservation(conn.execute(_SELECT_RESERVATION, (code,)).fetchone())
+            if not hold_expired(reservation, now):
+                conn.rollback()
+                return None
+            # Las reservas pendientes no ocupan lugar: la ocupación compartida no cambia
+            conn.execute(_DELETE_HOLD, (code,))
+            conn.commit()
+            return reservation
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def room_statuses(self, hotel_name, room_type):
+        rows = self._connection().execute(_SELECT_ROOM_STATUSES, (hotel_name, room_type)).fetchall()
+        return dict(rows)
+
+    def assign_room(self, hotel_name, room_type, room_numbers):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            statuses = self.room_statuses(hotel_name, room_type)
+            for number in room_numbers:
+                if statuses.get(number) != "Ocupada":
+                    conn.execute(_UPSERT_ROOM_STATUS, (hotel_name, room_type, number, "Ocupada"))
+                    conn.commit()
+                    return number
+            conn.rollback()
+            return None
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def release_room(self, hotel_name, room_type, room_number):
+        with self._connection() as conn:
+            conn.execute(_UPSERT_ROOM_STATUS, (hotel_name, room_type, room_number, "Disponible"))
+
+    def add_estadia(self, estadia):
+        with self._connection() as conn:
+            conn.execute(
+                _INSERT_ESTADIA,
+                (
+                    estadia["hotel"],
+                    estadia["room_type"],
+                    (estadia.get("checkin") or "")[:10],
+                    (estadia.get("checkout") or "")[:10],
+                    json.dumps(estadia),
+                ),
+            )
+
+    def iter_estadias(self, after_id=0, hotel_name=None, room_type=None, start=None, end=None):
+        clauses = ["id > ?"]
+        params = [after_id]
+        for clause, value in (
+            ("hotel = ?", hotel_name),
+            ("room_type = ?", room_type),
+            ("checkout >= ?", start),
+            ("checkin <= ?", end),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        query = "SELECT id, data FROM estadias WHERE {} ORDER BY id".format(" AND ".join(clauses))
+        # El cursor de sqlite3 trae las filas de a una: la memoria no crece con el historial
+        for estadia_id, data in self._connection().execute(query, params):
+            yield estadia_id, json.loads(data)
+
+
+def _url_path(url, scheme):
+    """
+    Ruta de una URL de almacenamiento "<scheme>://<ruta>": lo que sigue a
+    "//" se toma tal cual, así "sqlite:///tmp/a.db" es la ruta absoluta
+    /tmp/a.db y "sqlite://datos/a.db" es relativa al directorio actual.
+    """
+    path = url[len(scheme) + len("://"):]
+    if not path:
+        raise ValueError(f"Falta la ruta en el almacenamiento: {url}")
+    return path
+
+
+def create_storage(url=None):
+    """
+    Crea el almacenamiento según `DREAMSTAY_STORAGE`: "memory" (por
+    defecto), "journal://<directorio>" (en memoria con journal en disco) o
+    "sqlite://<archivo.db>". En ambos esquemas la ruta es lo que sigue a
+    "//" (ver `_url_path`): con tres barras es absoluta.
+
+    Las reservas terminales van a `DREAMSTAY_ARCHIVE` si está definido; si
+    no, a `archive.db` en el directorio del journal, a `<archivo.db>-archive`
+    junto a la base SQLite o, en memoria, a una base SQLite en memoria.
+    """
+    url = url or os.environ.get("DREAMSTAY_STORAGE", "memory")
+    archive_path = os.environ.get("DREAMSTAY_ARCHIVE")
+    archive = ReservationArchive(archive_path) if archive_path else None
+    if url == "memory":
+        return MemoryStorage(archive=archive)
+    if url.startswith("journal://"):
+        journal = Journal(
+            _url_path(url, "journal"),
+            fsync_interval=float(os.environ.get("DREAMSTAY_JOURNAL_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.environ.get("DREAMSTAY_JOURNAL_SNAPSHOT_EVERY", "100000")),
+        )
+        if archive is None:
+            archive = ReservationArchive(os.path.join(journal.directory, "archive.db"))
+        return MemoryStorage(journal=journal, archive=archive)
+    if url.startswith("sqlite://"):
+        return SQLiteStorage(
+            _url_path(url, "sqlite"),
+            shared_occupancy=os.environ.get("DREAMSTAY_SHARED_OCCUPANCY", "1") != "0",
+            archive=archive,
+        )
+    raise ValueError(f"Almacenamiento no soportado: {url}")
@@ -0,0 +1,38 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Reservation  # noqa: E402
+
+
+@pytest.fixture
+def make_reservation():
+    """Arma una reserva mínima; las fechas son días desde el 1/3/2030."""
+
+    def make(code, checkin=0, nights=1, status="confirmada", hotel="Hotel Central", room_type="Doble", **extra):
+        start = date.fromordinal(date(2030, 3, 1).toordinal() + checkin)
+        end = date.fromordinal(start.toordinal() + nights)
+        return Reservation(
+            confirmation_code=code,
+            hotel=hotel,
+            room_type=room_type,
+            room_name=room_type,
+            contact_email=extra.pop("contact_email", f"{code.lower()}@dreamstay.test"),
+            checkin=start,
+            checkout=end,
+            guests=[{"name": "Ana Perez", "birth": "01/01/1990"}],
+            price_detail={"total": 100.0 * nights},
+            total=100.0 * nights,
+            offer=None,
+            offers=[],
+            counts={"adult": 1, "child": 0, "baby": 0},
+            nights=nights,
+            status=status,
+            **extra,
+        )
+
+    return make
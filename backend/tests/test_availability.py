@@ -0,0 +1,78 @@
+import random
+from datetime import date, timedelta
+
+from availability import AvailabilityIndex, IntervalTree, OccupancyCalendar
+
+ORIGIN = date(2030, 1, 1)
+
+
+def _random_stays(rng, count):
+    stays = []
+    for index in range(count):
+        start = ORIGIN + timedelta(days=rng.randint(0, 120))
+        stays.append((start, start + timedelta(days=rng.randint(1, 14)), f"R{index}"))
+    return stays
+
+
+def _naive_nights(stays, start, end):
+    return [
+        sum(1 for stay_start, stay_end, _ in stays if stay_start <= start + timedelta(days=night) < stay_end)
+        for night in range((end - start).days)
+    ]
+
+
+def test_interval_tree_matches_naive_overlaps():
+    rng = random.Random(1)
+    stays = _random_stays(rng, 300)
+    tree = IntervalTree()
+    for stay in stays:
+        tree.add(*stay)
+    for stay in stays[::3]:
+        tree.remove(*stay)
+    live = [stay for index, stay in enumerate(stays) if index % 3]
+    assert len(tree) == len(live)
+    for _ in range(200):
+        start = ORIGIN + timedelta(days=rng.randint(-5, 140))
+        end = start + timedelta(days=rng.randint(1, 10))
+        expected = sorted(stay for stay in live if stay[0] < end and start < stay[1])
+        assert sorted(tree.overlaps(start, end)) == expected
+        if expected:
+            assert tree.has_overlap(start, end)
+            assert tree.has_overlap(start, end, ignore_code=expected[0][2]) == (len(expected) > 1)
+        else:
+            assert not tree.has_overlap(start, end)
+
+
+def test_calendar_matches_naive_counts():
+    rng = random.Random(2)
+    stays = _random_stays(rng, 200)
+    calendar = OccupancyCalendar()
+    for stay_start, stay_end, _ in stays:
+        calendar.add(stay_start, stay_end, 1)
+    # Una estadía muy lejana obliga a hacer crecer el calendario
+    far = (ORIGIN + timedelta(days=3000), ORIGIN + timedelta(days=3002), "lejana")
+    calendar.add(far[0], far[1], 1)
+    stays.append(far)
+    for _ in range(200):
+        start = ORIGIN + timedelta(days=rng.randint(-10, 3010))
+        end = start + timedelta(days=rng.randint(1, 30))
+        nights = _naive_nights(stays, start, end)
+        assert calendar.nights(start, end) == nights
+        assert calendar.peak(start, end) == max(nights)
+
+
+def test_index_follows_status_changes(make_reservation):
+    index = AvailabilityIndex()
+    first = make_reservation("A", 0, 4)
+    index.sync(first)
+    index.sync(make_reservation("B", 2, 4))
+    index.sync(make_reservation("C", 1, 1, status="pendiente_pago"))
+    start, end = first.checkin, first.checkin + timedelta(days=6)
+    assert index.nightly_occupancy("Hotel Central", "Doble", start, end) == [1, 1, 2, 2, 1, 1]
+    assert index.peak_occupancy("Hotel Central", "Doble", start, end) == 2
+    assert index.peak_occupancy("Hotel Central", "Doble", start, end, ignore_code="B") == 1
+    index.sync(make_reservation("B", 2, 4, status="cancelada"))
+    assert index.peak_occupancy("Hotel Central", "Doble", start, end) == 1
+    index.remove("A")
+    assert not index.has_overlap("Hotel Central", "Doble", start, end)
+    assert index.nightly_occupancy("Hotel Central", "Doble", start, end) == [0] * 6
@@ -0,0 +1,73 @@
+"""
+Nunca se vende una noche de más: muchas reservas concurrentes sobre un
+mismo tipo de habitación, con hilos en un proceso y con varios procesos
+(cada uno con sus hilos) contra una misma base SQLite.
+"""
+import multiprocessing
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from benchmarks.stress_booking import HOTEL, ROOM_TYPE, _run_worker_process, find_oversold_days
+from storage import MemoryStorage, SQLiteStorage
+
+# Habitaciones Doble de Hotel Central en hotels.json
+UNITS = 4
+PROCESSES = 3
+THREADS = 8
+BOOKINGS_PER_PROCESS = 60
+
+
+def test_threads_never_oversell_memory_storage(make_reservation):
+    storage = MemoryStorage()
+    rng = random.Random(7)
+    stays = [(rng.randint(0, 20), rng.randint(1, 5)) for _ in range(400)]
+    barrier = threading.Barrier(THREADS)
+
+    def book(index):
+        if index < THREADS:
+            barrier.wait()
+        checkin, nights = stays[index]
+        return storage.reserve(make_reservation(f"M{index:04d}", checkin, nights, room_type=ROOM_TYPE), UNITS)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        accepted = list(pool.map(book, range(len(stays))))
+
+    oversold, confirmed = find_oversold_days(storage.iter_reservations(), UNITS)
+    assert oversold == []
+    assert confirmed == accepted.count(True)
+    # Con 400 estadías en 25 días tiene que haber rechazos: si no, la prueba no probó nada
+    assert accepted.count(False)
+    start, end = date(2030, 3, 1), date(2030, 3, 31)
+    assert max(storage.nightly_occupancy(HOTEL, ROOM_TYPE, start, end)) == UNITS
+
+
+def test_processes_and_threads_never_oversell_sqlite(tmp_path):
+    db_path = str(tmp_path / "stress.db")
+    # El padre crea la base y la ocupación compartida antes que los workers
+    SQLiteStorage(db_path)
+    seeds = list(range(PROCESSES * BOOKINGS_PER_PROCESS))
+    chunks = [seeds[index::PROCESSES] for index in range(PROCESSES)]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(PROCESSES) as pool:
+        outcomes = pool.starmap(_run_worker_process, [(db_path, chunk, THREADS) for chunk in chunks])
+    results = [item for chunk in outcomes for item in chunk]
+
+    store = SQLiteStorage(db_path)
+    reservations = list(store.iter_reservations())
+    oversold, confirmed = find_oversold_days(reservations, UNITS)
+    assert oversold == []
+    assert confirmed == results.count("confirmed")
+    assert results.count("rejected")
+
+    # La ocupación compartida que leen los workers coincide con la base
+    stays = [item for item in reservations if item.room_type == ROOM_TYPE and item.status == "confirmada"]
+    start = min(item.checkin for item in stays)
+    end = max(item.checkout for item in stays)
+    expected = [
+        sum(1 for item in stays if item.checkin <= date.fromordinal(day) < item.checkout)
+        for day in range(start.toordinal(), end.toordinal())
+    ]
+    assert store._shared_nights(HOTEL, ROOM_TYPE, start, end) == expected
+    assert max(expected) <= UNITS
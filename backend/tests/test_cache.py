@@ -0,0 +1,85 @@
+from datetime import date
+
+from cache import RevisionedMemo, SearchCache
+
+MARCH = (date(2030, 3, 1), date(2030, 3, 5))
+APRIL = (date(2030, 4, 1), date(2030, 4, 5))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = SearchCache(maxsize=2, ttl=60)
+    cache.put("a", 1, ["Hotel Central"], *MARCH)
+    cache.put("b", 2, ["Hotel Central"], *MARCH)
+    assert cache.get("a") == 1
+    cache.put("c", 3, ["Hotel Central"], *MARCH)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = SearchCache(ttl=30, clock=clock)
+    cache.put("a", 1, ["Hotel Central"], *MARCH)
+    clock.now = 29.9
+    assert cache.get("a") == 1
+    clock.now = 30.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate_only_overlapping_searches():
+    cache = SearchCache()
+    cache.put("marzo", 1, ["Hotel Central", "Hotel Playa"], *MARCH)
+    cache.put("abril", 2, ["Hotel Central"], *APRIL)
+    cache.put("otro", 3, ["Hotel Playa"], *MARCH)
+    # El día de salida no se solapa con una estadía que entra ese día
+    cache.invalidate("Hotel Central", date(2030, 3, 5), date(2030, 3, 8))
+    assert cache.get("marzo") == 1
+    cache.invalidate("Hotel Central", date(2030, 3, 4), date(2030, 3, 8))
+    assert cache.get("marzo") is None
+    assert (cache.get("abril"), cache.get("otro")) == (2, 3)
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_occupancy_version_mismatch_drops_entry():
+    cache = SearchCache()
+    cache.put("a", 1, ["Hotel Central"], *MARCH, version=4)
+    assert cache.get("a", version=4) == 1
+    assert cache.get("a", version=6) is None
+    assert cache.get("a", version=4) is None
+    assert cache.stats()["invalidations"] == 1
+    # Sin marca (escritura en curso) no se guarda ni se lee
+    cache.put("b", 2, ["Hotel Central"], *MARCH, version=None)
+    assert len(cache) == 0
+    cache.put("b", 2, ["Hotel Central"], *MARCH, version=8)
+    assert cache.get("b", version=None) is None
+    assert cache.get("b", version=8) == 2
+
+
+def test_revisioned_memo():
+    memo = RevisionedMemo(maxsize=2)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value * 10
+
+    assert memo.get_or_compute(1, "a", lambda: compute(1)) == 10
+    assert memo.get_or_compute(1, "a", lambda: compute(2)) == 10
+    memo.get_or_compute(1, "b", lambda: compute(3))
+    memo.get_or_compute(1, "c", lambda: compute(4))
+    assert len(memo) == 2
+    # Otra revisión del catálogo vacía todo
+    assert memo.get_or_compute(2, "a", lambda: compute(5)) == 50
+    assert len(memo) == 1
+    assert calls == [1, 3, 4, 5]
+    assert memo.stats()["hits"] == 1
@@ -0,0 +1,39 @@
+import random
+from datetime import date, datetime, timedelta
+
+from catalog import OfferIndex
+
+
+def _parse(value):
+    return datetime.strptime(value, "%d/%m/%Y") if value else None
+
+
+def _random_offers(rng, count):
+    offers = []
+    for index in range(count):
+        start = date(2030, 1, 1) + timedelta(days=rng.randint(0, 300))
+        end = start + timedelta(days=rng.randint(0, 60))
+        offers.append({"name": f"O{index}", "start": start.strftime("%d/%m/%Y"), "end": end.strftime("%d/%m/%Y")})
+    # Las ofertas sin fechas válidas nunca están vigentes
+    offers.append({"name": "sin fechas"})
+    return offers
+
+
+def test_active_matches_linear_filter():
+    rng = random.Random(6)
+    offers = _random_offers(rng, 150)
+    index = OfferIndex(offers, _parse)
+    for _ in range(500):
+        start = date(2029, 12, 1) + timedelta(days=rng.randint(0, 420))
+        end = start + timedelta(days=rng.randint(1, 20))
+        expected = [
+            offer for offer in offers
+            if "start" in offer
+            and _parse(offer["start"]).date() < end
+            and start <= _parse(offer["end"]).date()
+        ]
+        assert index.active(start, end) == expected
+
+
+def test_active_without_offers():
+    assert OfferIndex([], _parse).active(date(2030, 1, 1), date(2030, 1, 2)) == []
@@ -0,0 +1,84 @@
+import pickle
+import random
+
+import pytest
+
+import columnar
+from columnar import ReservationTable
+from repository import ReservationRepository
+
+
+@pytest.fixture
+def table(monkeypatch):
+    # Caché chica, así las lecturas alternan entre filas armadas y columnas
+    monkeypatch.setattr(columnar, "_HOT_ROWS", 8)
+    return ReservationTable()
+
+
+def test_table_matches_model(table, make_reservation):
+    rng = random.Random(5)
+    model = {}
+    for step in range(3000):
+        code = f"R{rng.randint(0, 60):03d}"
+        action = rng.random()
+        if action < 0.45:
+            reservation = table.get(code) or make_reservation(code, rng.randint(0, 30), rng.randint(1, 5))
+            reservation.status = rng.choice(["pendiente_pago", "confirmada", "ocupada", "cancelada"])
+            if rng.random() < 0.3:
+                reservation.payment = {"card_last4": str(rng.randint(1000, 9999)), "step": step}
+            if rng.random() < 0.2:
+                reservation.guests = reservation.guests + [{"name": f"Huésped {step}", "birth": "01/01/2010"}]
+            if rng.random() < 0.2:
+                reservation.room_number = str(rng.randint(100, 110))
+            table.save(reservation)
+            model[code] = reservation.to_dict()
+        elif action < 0.6:
+            removed = table.remove(code)
+            assert (removed is None) == (code not in model)
+            model.pop(code, None)
+        elif action < 0.8:
+            reservation = table.get(code)
+            assert (reservation and reservation.to_dict()) == model.get(code)
+        else:
+            email = f"{code.lower()}@dreamstay.test" if rng.random() < 0.8 else "otra@dreamstay.test"
+            reservation = table.find(code, email.upper())
+            expected = model.get(code) if email.startswith(code.lower()) else None
+            assert (reservation and reservation.to_dict()) == expected
+    assert len(table) == len(model)
+    assert {item.confirmation_code: item.to_dict() for item in table} == model
+    assert {stay.confirmation_code for stay in table.stays()} == set(model)
+
+
+def test_reads_are_copies(table, make_reservation):
+    table.save(make_reservation("A"))
+    reservation = table.get("A")
+    reservation.status = "cancelada"
+    assert table.get("A").status == "confirmada"
+
+
+def test_copy_and_pickle_keep_rows(table, make_reservation):
+    for index in range(20):
+        table.save(make_reservation(f"R{index:02d}", index, payment={"card_last4": "1111"} if index % 2 else None))
+    table.remove("R03")
+    expected = {item.confirmation_code: item.to_dict() for item in table}
+    copied = table.copy()
+    restored = pickle.loads(pickle.dumps(table))
+    table.save(make_reservation("R00", status="cancelada"))
+    for other in (copied, restored):
+        assert {item.confirmation_code: item.to_dict() for item in other} == expected
+        assert other.get("R01").payment == {"card_last4": "1111"}
+
+
+def test_repository_capacity_and_email_index(make_reservation):
+    repository = ReservationRepository(capacity=2)
+    repository.save(make_reservation("A", contact_email="x@dreamstay.test"))
+    repository.save(make_reservation("B", contact_email="x@dreamstay.test"))
+    repository.get("A")
+    repository.save(make_reservation("C"))
+    # B era la menos usada
+    assert "B" not in repository and "A" in repository
+    assert [item.confirmation_code for item in repository.find_by_email(" X@dreamstay.test")] == ["A"]
+    assert repository.find("A", "X@DREAMSTAY.TEST").confirmation_code == "A"
+    assert repository.find("C", "x@dreamstay.test") is None
+    repository.save(make_reservation("A", contact_email="y@dreamstay.test"))
+    assert repository.find_by_email("x@dreamstay.test") == []
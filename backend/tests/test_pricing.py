@@ -0,0 +1,83 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import pricing
+from pricing import RateCalendar, calculate_prices, resolve_rates
+
+ROOM = {"rates": {"adult": 120.0, "child": 70.0, "baby": 10.0}}
+OFFERS = [
+    {"name": "Invierno", "adult_discount": 0.2, "start": date(2030, 6, 1), "end": date(2030, 6, 20)},
+    {"name": "Niños", "children_discount": 0.5, "start": date(2030, 6, 10), "end": date(2030, 7, 5)},
+    {"name": "Sin descuento", "start": date(2030, 6, 5), "end": date(2030, 6, 8)},
+]
+
+
+def _entries(offers):
+    # Como las arma OfferIndex: fin exclusivo y posición en el catálogo
+    return [(offer["start"], offer["end"] + timedelta(days=1), position, offer) for position, offer in enumerate(offers)]
+
+
+def _nightly_total(counts, start, end):
+    """Precio noche por noche con `resolve_rates` y las ofertas vigentes en cada noche."""
+    total = 0.0
+    for night in range((end - start).days):
+        day = start + timedelta(days=night)
+        active = [offer for offer in OFFERS if offer["start"] <= day <= offer["end"]]
+        rates, _ = resolve_rates(ROOM, active)
+        total += sum(rate * count for rate, count in zip(rates, counts))
+    return total
+
+
+def _random_stays(rng, count):
+    stays = []
+    for _ in range(count):
+        start = date(2030, 5, 20) + timedelta(days=rng.randint(0, 60))
+        counts = (rng.randint(1, 3), rng.randint(0, 2), rng.randint(0, 1))
+        stays.append((counts, start, start + timedelta(days=rng.randint(1, 12))))
+    return stays
+
+
+def test_quote_matches_nightly_rates():
+    calendar = RateCalendar(ROOM, _entries(OFFERS))
+    for counts, start, end in _random_stays(random.Random(3), 300):
+        detail, applied = calendar.quote(counts, start, end)
+        assert detail["total"] == pytest.approx(round(_nightly_total(counts, start, end), 2), abs=0.011)
+        assert detail["nights"] == (end - start).days
+        expected = [
+            offer["name"] for offer in OFFERS
+            if offer["start"] < end and start <= offer["end"]
+            and (offer.get("adult_discount") or offer.get("children_discount"))
+        ]
+        assert applied == expected
+
+
+def test_quote_without_nights_counts_one():
+    calendar = RateCalendar(ROOM, [])
+    detail, applied = calendar.quote({"adult": 2}, date(2030, 1, 1), date(2030, 1, 1))
+    assert detail["nights"] == 1 and detail["total"] == 240.0 and applied == []
+
+
+@pytest.mark.parametrize("use_numpy", [False, pytest.param(True, marks=pytest.mark.skipif(
+    pricing.np is None, reason="NumPy no está instalado"))])
+def test_calculate_prices_matches_quote(use_numpy):
+    calendars = [RateCalendar(ROOM, _entries(OFFERS)), RateCalendar(ROOM, [])]
+    stays = _random_stays(random.Random(4), 400)
+    # Un calendario con más de NUMPY_MIN_GROUP estadías y otro con menos
+    chosen = [calendars[0] if index % 8 else calendars[1] for index in range(len(stays))]
+    batch = calculate_prices(
+        chosen, [counts for counts, _, _ in stays], [start for _, start, _ in stays],
+        [end for _, _, end in stays], use_numpy=use_numpy,
+    )
+    assert len(batch) == len(stays)
+    totals = batch.totals()
+    for index, (calendar, (counts, start, end)) in enumerate(zip(chosen, stays)):
+        quote = calendar.quote(counts, start, end)
+        assert batch.detail(index) == quote
+        assert totals[index] == quote[0]["total"]
+
+
+def test_calculate_prices_checks_lengths():
+    with pytest.raises(ValueError):
+        calculate_prices([RateCalendar(ROOM, [])], [], [], [])
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+import pytest
+
+from shared_occupancy import SharedOccupancy
+
+ORIGIN = date(2030, 1, 1)
+# Como el que genera SQLiteStorage: 8 bytes en hexadecimal
+TOKEN = b"0123456789abcdef"
+
+
+@pytest.fixture
+def occupancy(tmp_path):
+    occupancy = SharedOccupancy(str(tmp_path / "occupancy"), slots=4, days=30)
+    occupancy.begin_write()
+    occupancy.reset(ORIGIN, TOKEN)
+    occupancy.end_write()
+    return occupancy
+
+
+def _day(offset):
+    return ORIGIN + timedelta(days=offset)
+
+
+def test_add_and_read(occupancy):
+    occupancy.begin_write()
+    occupancy.add(1, _day(2), _day(5), 1)
+    occupancy.add(1, _day(4), _day(6), 1)
+    occupancy.end_write()
+    assert occupancy.read(1, _day(1), _day(7)) == [0, 1, 1, 2, 1, 0]
+    assert occupancy.read(0, _day(1), _day(3)) == [0, 0]
+    # Fuera de la ventana hay que consultar la base
+    assert occupancy.read(1, _day(25), _day(35)) is None
+
+
+def test_underflow_raises_without_changes(occupancy):
+    occupancy.begin_write()
+    occupancy.add(0, _day(0), _day(2), 1)
+    with pytest.raises(ValueError):
+        occupancy.add(0, _day(0), _day(3), -1)
+    occupancy.end_write()
+    assert occupancy.read(0, _day(0), _day(3)) == [1, 1, 0]
+
+
+def test_unchanged_write_restores_sequence(occupancy):
+    before = occupancy.sequence
+    assert before % 2 == 0
+    previous = occupancy.begin_write()
+    assert occupancy.sequence % 2 == 1
+    occupancy.end_write(previous)
+    assert occupancy.sequence == before
+    previous = occupancy.begin_write()
+    occupancy.add(2, _day(0), _day(1), 1)
+    occupancy.end_write()
+    assert occupancy.sequence > before and occupancy.sequence % 2 == 0
+
+
+def test_unfinished_write_needs_rebuild(occupancy, tmp_path):
+    assert not occupancy.needs_rebuild(TOKEN, ORIGIN)
+    assert occupancy.needs_rebuild(b"otra", ORIGIN)
+    occupancy.begin_write()
+    reopened = SharedOccupancy(str(tmp_path / "occupancy"))
+    assert reopened.needs_rebuild(TOKEN, ORIGIN)
@@ -0,0 +1,134 @@
+import os
+from datetime import date
+
+import pytest
+
+from journal import Journal, JournalError
+from storage import MemoryStorage, SQLiteStorage, create_storage
+
+
+@pytest.fixture(params=["memory", "sqlite", "journal"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    if request.param == "sqlite":
+        return SQLiteStorage(str(tmp_path / "dreamstay.db"))
+    return MemoryStorage(journal=Journal(str(tmp_path / "journal"), fsync_interval=0.01))
+
+
+def test_reserve_respects_units(storage, make_reservation):
+    assert storage.reserve(make_reservation("A", 0, 3), 2)
+    assert storage.reserve(make_reservation("B", 1, 3), 2)
+    assert not storage.reserve(make_reservation("C", 2, 1), 2)
+    # Una estadía que solo toca el día de salida de otra no se solapa
+    assert storage.reserve(make_reservation("D", 3, 2), 2)
+    assert storage.nightly_occupancy("Hotel Central", "Doble", date(2030, 3, 1), date(2030, 3, 7)) == [1, 2, 2, 2, 1, 0]
+    assert storage.available_units("Hotel Central", "Doble", date(2030, 3, 3), date(2030, 3, 4), 2) == 0
+    assert storage.available_units("Hotel Central", "Doble", date(2030, 3, 3), date(2030, 3, 4), 2, ignore_code="A") == 1
+
+
+def test_reserve_compare_and_set(storage, make_reservation):
+    assert storage.reserve(make_reservation("A", status="pendiente_pago"), 1)
+    assert not storage.reserve(make_reservation("A"), 1, expected_status="confirmada")
+    assert storage.reserve(make_reservation("A"), 1, expected_status="pendiente_pago")
+    assert storage.get_reservation("A").status == "confirmada"
+    # La reserva se ignora a sí misma al verificar lugar para sus propias fechas
+    assert storage.reserve(make_reservation("A", nights=2), 1, expected_status="confirmada")
+
+
+def test_archive_compare_and_set(storage, make_reservation):
+    storage.reserve(make_reservation("A"), 1)
+    cancelled = make_reservation("A", status="cancelada")
+    assert storage.archive_reservation(cancelled, expected_status="pendiente_pago") is None
+    assert storage.has_reservation("A")
+    assert storage.archive_reservation(cancelled, expected_status="confirmada") is cancelled
+    assert not storage.has_reservation("A")
+    assert storage.archive.get("A").status == "cancelada"
+    assert storage.reserve(make_reservation("B"), 1)
+
+
+def test_expire_hold(storage, make_reservation):
+    storage.reserve(make_reservation("A", status="pendiente_pago", expires_at="2030-01-01 10:00:00"), 1)
+    storage.reserve(make_reservation("B", checkin=5, status="pendiente_pago", expires_at="2030-01-01 12:00:00"), 1)
+    assert sorted(storage.iter_holds()) == [("A", "2030-01-01 10:00:00"), ("B", "2030-01-01 12:00:00")]
+    assert storage.expire_hold("A", "2030-01-01 09:59:59") is None
+    assert storage.expire_hold("A", "2030-01-01 10:00:00").confirmation_code == "A"
+    assert storage.get_reservation("A") is None
+    storage.reserve(make_reservation("B", checkin=5), 1, expected_status="pendiente_pago")
+    assert storage.expire_hold("B", "2030-01-02 00:00:00") is None
+
+
+def test_find_reservation_normalizes_email(storage, make_reservation):
+    storage.reserve(make_reservation("A", contact_email="Ana@DreamStay.test"), 1)
+    assert storage.find_reservation("A", "  ana@dreamstay.TEST ").confirmation_code == "A"
+    assert storage.find_reservation("A", "otra@dreamstay.test") is None
+
+
+def test_bulk_reserve(storage, make_reservation):
+    storage.reserve(make_reservation("A"), 2)
+    batch = [make_reservation("A"), make_reservation("B"), make_reservation("C"), make_reservation("D", checkin=1)]
+    rejected = storage.bulk_reserve(batch, {("Hotel Central", "Doble"): 2})
+    assert rejected == {0: "duplicada", 2: "sin_disponibilidad"}
+    assert not storage.has_reservation("B")
+    rejected = storage.bulk_reserve(batch, {("Hotel Central", "Doble"): 2}, all_or_nothing=False)
+    assert rejected == {0: "duplicada", 2: "sin_disponibilidad"}
+    assert storage.has_reservation("B") and storage.has_reservation("D")
+    assert not storage.has_reservation("C")
+
+
+def test_journal_recovers_after_reopen(tmp_path, make_reservation):
+    directory = str(tmp_path / "journal")
+    storage = MemoryStorage(journal=Journal(directory))
+    storage.reserve(make_reservation("A"), 1)
+    storage.reserve(make_reservation("B", checkin=2), 1)
+    storage.journal.snapshot()
+    storage.archive_reservation(make_reservation("A", status="cancelada"))
+    storage.reserve(make_reservation("C", checkin=4, status="pendiente_pago"), 1)
+    storage.journal.close()
+
+    reopened = MemoryStorage(journal=Journal(directory))
+    assert reopened.get_reservation("A") is None
+    assert reopened.get_reservation("B").checkin == date(2030, 3, 3)
+    assert reopened.get_reservation("C").status == "pendiente_pago"
+    assert not reopened.reserve(make_reservation("D", checkin=2), 1)
+    reopened.journal.close()
+
+
+def test_journal_refuses_second_opener(tmp_path):
+    journal = Journal(str(tmp_path / "journal"))
+    with pytest.raises(JournalError):
+        Journal(str(tmp_path / "journal"))
+    journal.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requiere fork")
+def test_journal_refuses_writes_in_forked_child(tmp_path, make_reservation):
+    storage = MemoryStorage(journal=Journal(str(tmp_path / "journal")))
+    storage.reserve(make_reservation("A"), 1)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            storage.reserve(make_reservation("B", checkin=3), 1)
+        except JournalError:
+            os._exit(0)
+        os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert storage.reserve(make_reservation("B", checkin=3), 1)
+    storage.journal.close()
+
+
+def test_create_storage_urls(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DREAMSTAY_ARCHIVE", raising=False)
+    assert isinstance(create_storage("memory"), MemoryStorage)
+    absolute = create_storage(f"sqlite://{tmp_path / 'absoluta.db'}")
+    assert absolute.path == str(tmp_path / "absoluta.db")
+    relative = create_storage("sqlite://relativa.db")
+    assert relative.path == "relativa.db" and (tmp_path / "relativa.db").exists()
+    journaled = create_storage("journal://datos")
+    assert journaled.journal.directory == "datos" and (tmp_path / "datos").is_dir()
+    journaled.journal.close()
+    for url in ("sqlite://", "journal://", "postgres://db"):
+        with pytest.raises(ValueError):
+            create_storage(url)